@@ -5,7 +5,16 @@ BASE_DIR = Path(__file__).resolve().parent.parent  # 根路径
 RUNTIME_PATH = os.path.join(BASE_DIR, 'runtime')  # 运行环境目录
 LOG_PATH = os.path.join(RUNTIME_PATH, 'log')  # 日志目录
 CURSOR_FILE_PATH = os.path.join(RUNTIME_PATH, 'cursors')  # 游标缓存文件目录
+CURSOR_DB_PATH = os.path.join(CURSOR_FILE_PATH, 'cursors.sqlite3')  # SQLite 游标库（多进程共享，比较并交换）
+SCHEMA_REGISTRY_PATH = os.path.join(RUNTIME_PATH, 'schemas')  # 本地 schema 注册表目录
+SPOOL_PATH = os.path.join(RUNTIME_PATH, 'spool')  # Kafka 不可用时的本地落盘缓冲目录
+TUNING_LOG_PATH = os.path.join(RUNTIME_PATH, 'tuning')  # 自适应调优决策日志目录
+DEDUP_INDEX_PATH = os.path.join(RUNTIME_PATH, 'dedup')  # 内容去重索引目录
+COMPRESSION_DICT_PATH = os.path.join(RUNTIME_PATH, 'compression', 'dictionaries')  # zstd 压缩字典目录
+BLOB_STORE_PATH = os.path.join(RUNTIME_PATH, 'blobs')  # 大字段外置存储目录（按内容 sha256 寻址）
+ID_SNAPSHOT_PATH = os.path.join(RUNTIME_PATH, 'snapshots')  # 删除对账的有序 _id 快照目录
 TEMP_PATH = os.path.join(RUNTIME_PATH, 'temp')  # 临时文件路径
 UPLOAD_PATH = os.path.join(RUNTIME_PATH, 'upload')  # 上传文件路径
 EXTEND_PATH = os.path.join(BASE_DIR, 'extend')  # 依赖文件路径
 ES_MAPPING_PATH = os.path.join(EXTEND_PATH, 'elastic', 'mapping')
+MAPPING_PATH = os.path.join(EXTEND_PATH, 'mapping')  # 声明式字段映射规格目录
@@ -0,0 +1,157 @@
+import time
+from collections import deque
+from threading import Lock
+from typing import Any, Callable, Iterable
+
+from application.cursor_model.base_cursor import CursorManager
+from application.utils.logger import get_logger
+from application.utils.metrics import RunStats
+
+
+class AckCursorTracker:
+    """
+    基于投递确认的游标跟踪器
+
+    每条已发送的消息按发送顺序登记其游标位置，Kafka 投递回调（I/O 线程）标记确认结果。
+    只有当某位置之前的所有消息都已确认时，才推进可提交游标（最高连续确认位置），
+    并按条数/时间间隔定期写入游标管理器，实现不阻塞发送的至少一次（at-least-once）语义。
+
+    :ivar committed_position: 当前可安全提交的游标位置
+    :ivar acked: 已确认的消息条数
+    :ivar failed: 投递失败的消息条数
+    :ivar checkpoints: 写入游标的次数
+    """
+
+    logger = get_logger("ack_tracker")
+
+    def __init__(self,
+                 cursor_manager: CursorManager,
+                 initial_position: Any = None,
+                 checkpoint_interval: int = 10000,
+                 checkpoint_seconds: float = 5.0,
+                 before_commit: Callable[[], None] = None,
+                 stats: RunStats = None):
+        """
+        :param cursor_manager: 游标管理器，用于持久化可提交游标
+        :param initial_position: 初始游标位置（即历史游标）
+        :param checkpoint_interval: 距上次提交至少推进多少条确认后写一次游标
+        :param checkpoint_seconds: 距上次提交至少间隔多少秒后写一次游标
+        :param before_commit: 写游标之前的钩子，如把落盘缓冲 fsync 到磁盘
+        :param stats: 运行统计，记录检查点次数（checkpoints）与耗时（checkpoint_seconds，含 before_commit）
+        """
+        self.cursor_manager = cursor_manager
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_seconds = checkpoint_seconds
+        self.before_commit = before_commit
+        self.stats = stats
+
+        self._lock = Lock()
+        # 待确认队列，元素为 [游标位置, 状态]，状态：None 待确认 / True 成功 / False 失败
+        self._pending = deque()
+        self.committed_position = initial_position
+        self.acked = 0
+        self.failed = 0
+        self.errors = []
+        self.checkpoints = 0
+
+        self._saved_position = initial_position
+        self._acked_at_save = 0
+        self._saved_at = time.monotonic()
+
+    # ---------------- 登记与回调 ----------------
+    def track(self, position: Any, future) -> None:
+        """
+        登记一条已发送消息
+
+        :param position: 该消息对应的游标位置（如文档 `_id`）
+        :param future: producer.send() 返回的 Future
+        """
+        entry = [position, None]
+        with self._lock:
+            self._pending.append(entry)
+        # 已完成的 Future 会立即执行回调，因此必须先入队再注册
+        future.add_callback(self._on_ack, entry)
+        future.add_errback(self._on_error, entry)
+
+    def track_batch(self, positions: Iterable[Any], futures: Iterable[Any]) -> None:
+        """
+        批量登记，positions 与 futures 需一一对应
+        """
+        for position, future in zip(positions, futures):
+            self.track(position, future)
+
+    def _on_ack(self, entry, _record_metadata=None) -> None:
+        with self._lock:
+            entry[1] = True
+            self.acked += 1
+            self._advance()
+
+    def _on_error(self, entry, exception=None) -> None:
+        with self._lock:
+            entry[1] = False
+            self.failed += 1
+            self.errors.append(exception)
+        self.logger.error(f"[Kafka] 消息投递失败，游标停止推进于 {self.committed_position}：{exception}")
+
+    def _advance(self) -> None:
+        """
+        弹出队首所有已成功确认的消息，推进可提交游标（调用方需持有锁）
+        """
+        pending = self._pending
+        while pending and pending[0][1] is True:
+            self.committed_position = pending.popleft()[0]
+
+    # ---------------- 提交 ----------------
+    @property
+    def in_flight(self) -> int:
+        """
+        尚未推进游标的消息条数（包含未确认与失败的消息）
+        """
+        return len(self._pending)
+
+    def maybe_checkpoint(self) -> bool:
+        """
+        满足条数或时间间隔时提交游标（由主线程在每批发送后调用）
+
+        :return: 是否执行了提交
+        """
+        if (self.acked - self._acked_at_save >= self.checkpoint_interval
+                or time.monotonic() - self._saved_at >= self.checkpoint_seconds):
+            return self.checkpoint()
+        return False
+
+    def checkpoint(self, final: bool = False) -> bool:
+        """
+        立即提交当前可提交游标（游标未变化时跳过写入）
+
+        :param final: 同步结束时的最终提交：写入后把游标管理器中尚未落盘的检查点 fsync 到磁盘
+        :return: 是否执行了写入
+        """
+        with self._lock:
+            position = self.committed_position
+            acked = self.acked
+        self._saved_at = time.monotonic()
+        self._acked_at_save = acked
+        changed = position is not None and position != self._saved_position
+        if not changed and not final:
+            return False
+        started = time.perf_counter()
+        if changed:
+            if self.before_commit is not None:
+                self.before_commit()
+            self.cursor_manager.save(position)
+            self._saved_position = position
+            self.checkpoints += 1
+        if final:
+            self.cursor_manager.flush()
+        if self.stats is not None:
+            self.stats.add_time('checkpoint', time.perf_counter() - started)
+            self.stats.incr('checkpoints', int(changed))
+        return changed
+
+    def raise_for_failures(self) -> None:
+        """
+        存在投递失败的消息时抛出首个异常（游标已停在失败位置之前）
+        """
+        if self.errors:
+            raise self.errors[0]
@@ -0,0 +1,43 @@
+"""
+游标存储后端注册表
+
+- file：本地追加写游标日志（CursorLogManager，支持回退），默认
+- sqlite：SQLite 库，行级比较并交换，供同一主机上的多个工作进程共享进度
+- kafka：Kafka 压缩主题，供多台主机共享进度
+"""
+from datetime import datetime
+from typing import Dict, Optional, Type
+
+from application.cursor_model.base_cursor import CursorManager
+from application.cursor_model.cursor_log import CursorLogManager
+from application.cursor_model.kafka_cursor import KafkaCursorManager
+from application.cursor_model.sqlite_cursor import SqliteCursorManager
+
+CURSOR_BACKENDS: Dict[str, Type[CursorManager]] = {
+    'file': CursorLogManager,
+    'sqlite': SqliteCursorManager,
+    'kafka': KafkaCursorManager,
+}
+
+
+def create_cursor_manager(backend: str, collection: str, topic: str, **options) -> CursorManager:
+    """
+    按后端名创建游标管理器
+
+    :param backend: 后端名，见 CURSOR_BACKENDS
+    :param options: 游标管理器的其他参数，如 full_amount、shard、name
+    """
+    if backend not in CURSOR_BACKENDS:
+        raise ValueError(f'不支持的游标存储：{backend}，可选：{list(CURSOR_BACKENDS)}')
+    return CURSOR_BACKENDS[backend](collection, topic, **options)
+
+
+def window_cursor_name(since: Optional[datetime], until: Optional[datetime]) -> str:
+    """
+    时间窗口同步的游标名：window.<起点>-<终点>（如 window.20240923T140000-end），
+    同一窗口重复执行时从该游标续传，不影响主游标
+    """
+    def stamp(value: Optional[datetime], default: str) -> str:
+        return value.strftime('%Y%m%dT%H%M%S') if value is not None else default
+
+    return f'window.{stamp(since, "start")}-{stamp(until, "end")}'
@@ -1,3 +1,4 @@
+import time
 from abc import ABC, abstractmethod
 
 
@@ -12,3 +13,49 @@ class CursorManager(ABC):
     @abstractmethod
     def save(self, cursor):
         pass
+
+    def flush(self) -> None:
+        """
+        把已保存但尚未落盘的游标 fsync 到磁盘（同步结束时调用，默认无操作）
+        """
+
+
+class BatchedCursorManager(CursorManager):
+    """
+    合并写入的游标管理器：save() 只记录最新位置，距上次写入超过 write_seconds 时才真正写入存储（_write），
+    flush() 立即写入尚未写入的位置。游标单调推进，被合并掉的中间位置无需持久化，
+    因此检查点再频繁，对远端存储的写入频率也不超过 1 / write_seconds。
+
+    :cvar write_seconds: 两次写入存储的最小间隔（秒），0 表示每次 save() 都写入
+    :ivar writes: 实际写入存储的次数
+    """
+    write_seconds = 1.0
+
+    def __init__(self):
+        self.writes = 0
+        self._pending = None
+        self._has_pending = False
+        self._written_at = float('-inf')
+
+    def save(self, cursor) -> None:
+        self._pending = cursor
+        self._has_pending = True
+        if time.monotonic() - self._written_at >= self.write_seconds:
+            self._write_pending()
+
+    def flush(self) -> None:
+        if self._has_pending:
+            self._write_pending()
+
+    def _write_pending(self) -> None:
+        self._write(self._pending)
+        self._has_pending = False
+        self._written_at = time.monotonic()
+        self.writes += 1
+
+    @abstractmethod
+    def _write(self, cursor) -> None:
+        """
+        把游标写入存储
+        """
+        raise NotImplementedError
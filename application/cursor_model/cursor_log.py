@@ -0,0 +1,202 @@
+"""
+追加写的游标日志
+
+每个检查点追加一条定长记录到 <name>.log，而不是覆盖写游标文件，保留游标的历史：
+
+    record  b'CL' + 保存时间（>d，Unix 时间戳）+ CRC32（>I）+ 位置长度（>H）+ 位置（bson.json_util 编码）+ 补零
+            固定 RECORD_SIZE 字节
+
+- 读取最新游标只需按文件大小定位最后一条记录（O(1)），不读取整个文件；
+  崩溃时写了一半的末尾记录长度不足或校验失败，读取时跳过、下次追加前截掉
+- rewind() 把游标回退到"N 个检查点之前"或"某个时刻的游标"，并作为新记录追加，
+  回退后的同步会重新发送这段窗口内的文档，不需要全量同步
+- 记录数达到 max_records 时压缩为最近 retain_records 条（写临时文件后原子替换）
+"""
+import os
+import struct
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Iterator, List, Optional, Tuple
+
+from application.cursor_model.file_cursor import FileCursorManager
+from application.cursor_model.positions import decode_position, encode_position
+
+RECORD_SIZE = 256
+_MAGIC = b'CL'
+_HEADER = struct.Struct('>2sdIH')
+_TIME = struct.Struct('>d')
+# 倒序读取时每次读取的记录数
+_READ_RECORDS = 4096
+
+
+def _checksum(saved_at: float, payload: bytes) -> int:
+    return zlib.crc32(payload, zlib.crc32(_TIME.pack(saved_at)))
+
+
+def _parse(record: bytes) -> Optional[Tuple[float, str]]:
+    """
+    解析一条记录，不完整或校验失败时返回 None
+    """
+    magic, saved_at, crc, length = _HEADER.unpack_from(record)
+    payload = record[_HEADER.size:_HEADER.size + length]
+    if magic != _MAGIC or len(payload) != length or _checksum(saved_at, payload) != crc:
+        return None
+    return saved_at, payload.decode('utf-8')
+
+
+class CursorLogManager(FileCursorManager):
+    """
+    基于追加写日志的游标管理器（日志为空时读取 FileCursorManager 的 <name>.db 检查点，兼容旧版游标）
+
+    :cvar max_records: 记录数达到该值时自动压缩
+    :cvar retain_records: 压缩后保留的最近记录数
+    """
+    max_records = 100000
+    retain_records = 10000
+
+    def __init__(self, collection, topic, full_amount=False, root_file_path: str = None, shard: int = None,
+                 name: str = 'cursor'):
+        super().__init__(collection, topic, full_amount=full_amount, root_file_path=root_file_path, shard=shard,
+                         name=name)
+        self.log_path = f'{os.path.splitext(self.file_path)[0]}.log'
+
+    # ---------------- 读取 ----------------
+    def load(self):
+        """
+        读取最新的有效记录；日志为空时回退到 <name>.db 检查点
+        """
+        if self.full_amount:
+            return None
+        for _, _, text in self._records_backward():
+            return decode_position(text)
+        return super().load()
+
+    def history(self, limit: int = None) -> List[Tuple[datetime, Any]]:
+        """
+        游标历史（新的在前）
+
+        :param limit: 最多返回的记录数
+        :return: [(保存时间, 游标位置), ...]
+        """
+        result = []
+        for _, saved_at, text in self._records_backward():
+            if limit is not None and len(result) >= limit:
+                break
+            result.append((datetime.fromtimestamp(saved_at), decode_position(text)))
+        return result
+
+    def position_at(self, checkpoints: int = None, until: datetime = None) -> Any:
+        """
+        查找历史游标
+
+        :param checkpoints: N 个检查点之前的游标（0 为最新）
+        :param until: 该时刻的游标，即保存时间不晚于 until 的最后一条记录（naive 时间按本地时间）
+        :return: 游标位置；历史中没有满足条件的记录时返回 None
+        """
+        if (checkpoints is None) == (until is None):
+            raise ValueError('checkpoints 与 until 需要且只能指定一个')
+        deadline = until.timestamp() if until is not None else None
+        for n, (_, saved_at, text) in enumerate(self._records_backward()):
+            if (deadline is None and n == checkpoints) or (deadline is not None and saved_at <= deadline):
+                return decode_position(text)
+        return None
+
+    def _records_backward(self) -> Iterator[Tuple[int, float, str]]:
+        """
+        从末尾倒序读取有效记录：(记录序号, 保存时间, 编码后的位置)；末尾不完整的记录被忽略
+        """
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb') as f:
+            end = os.fstat(f.fileno()).st_size // RECORD_SIZE
+            while end > 0:
+                start = max(0, end - _READ_RECORDS)
+                f.seek(start * RECORD_SIZE)
+                chunk = f.read((end - start) * RECORD_SIZE)
+                for index in range(end - 1, start - 1, -1):
+                    parsed = _parse(chunk[(index - start) * RECORD_SIZE:(index - start + 1) * RECORD_SIZE])
+                    if parsed is not None:
+                        yield index, parsed[0], parsed[1]
+                end = start
+
+    # ---------------- 写入 ----------------
+    def save(self, cursor) -> None:
+        """
+        追加一条检查点记录（fsync 按 fsync_seconds 批量执行，见 FileCursorManager）
+        """
+        payload = encode_position(cursor).encode('utf-8')
+        if len(payload) > RECORD_SIZE - _HEADER.size:
+            raise ValueError(f'游标位置编码后超过 {RECORD_SIZE - _HEADER.size} 字节，无法写入游标日志：{cursor!r}')
+        saved_at = time.time()
+        record = _HEADER.pack(_MAGIC, saved_at, _checksum(saved_at, payload), len(payload)) + payload
+        record = record.ljust(RECORD_SIZE, b'\x00')
+
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        durable = time.monotonic() - self._synced_at >= self.fsync_seconds
+        with open(self.log_path, 'r+b' if size else 'wb') as f:
+            # 截掉崩溃时写了一半的记录，保证记录按 RECORD_SIZE 对齐
+            size -= size % RECORD_SIZE
+            f.truncate(size)
+            f.seek(size)
+            f.write(record)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        if durable:
+            self._sync_directory()
+        else:
+            self._dirty = True
+
+        if (size + RECORD_SIZE) // RECORD_SIZE >= self.max_records:
+            self.compact()
+
+    def flush(self) -> None:
+        """
+        fsync 尚未落盘的记录
+        """
+        if not self._dirty:
+            return
+        with open(self.log_path, 'rb') as f:
+            os.fsync(f.fileno())
+        self._sync_directory()
+
+    def rewind(self, checkpoints: int = None, until: datetime = None) -> Any:
+        """
+        回退游标：把历史游标（见 position_at）作为新记录追加并落盘，之后的同步从该位置开始
+
+        :return: 回退后的游标位置；历史中没有满足条件的记录时抛出 ValueError
+        """
+        position = self.position_at(checkpoints=checkpoints, until=until)
+        if position is None:
+            raise ValueError(f'游标日志 {self.log_path} 中没有满足条件的记录'
+                             f'（checkpoints={checkpoints}, until={until}）')
+        self.save(position)
+        self.flush()
+        self.logger.info(f"[Cursor] 游标回退到 {position}（checkpoints={checkpoints}, until={until}）")
+        return position
+
+    def compact(self, keep: int = None) -> int:
+        """
+        压缩日志，只保留最近 keep 条有效记录（默认 retain_records），写临时文件后原子替换
+
+        :return: 保留的记录数
+        """
+        keep = self.retain_records if keep is None else keep
+        records = []
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'rb') as f:
+                for index, _, _ in self._records_backward():
+                    if len(records) >= keep:
+                        break
+                    f.seek(index * RECORD_SIZE)
+                    records.append(f.read(RECORD_SIZE))
+        tmp_path = f'{self.log_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(reversed(records)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.log_path)
+        self._sync_directory()
+        return len(records)
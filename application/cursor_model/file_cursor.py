@@ -1,40 +1,128 @@
 import os
+import time
+import zlib
 from os.path import join
 
 from application.config import CURSOR_FILE_PATH
 from application.cursor_model.base_cursor import CursorManager
+from application.cursor_model.positions import decode_position, encode_position
+from application.utils.logger import get_logger
 
 
 class FileCursorManager(CursorManager):
-    """基于文件的游标管理器"""
-    def __init__(self, collection, topic, full_amount=False, root_file_path: str = None, ):
+    """
+    基于文件的游标管理器
+
+    每个检查点先写入临时文件再原子替换（os.replace），进程在写入中途崩溃不会留下空文件或半条记录；
+    被替换的上一个检查点保留为 <name>.db.prev。每条记录为"编码后的位置 + 制表符 + CRC32（8 位十六进制）"：
+
+        {"$oid": "66f1c2a0e4b0a1b2c3d4e5f6"}<TAB>1a2b3c4d
+
+    load() 在当前文件缺失、为空或校验失败时回退到上一个检查点（至少一次语义下回退只会重复发送）。
+    fsync 按 fsync_seconds 间隔批量执行，flush() 强制落盘；断电时最多丢失最近一个间隔内的检查点。
+
+    :cvar fsync_seconds: 两次 fsync 的最小间隔（秒），0 表示每个检查点都 fsync
+    """
+    logger = get_logger("file_cursor")
+    fsync_seconds = 1.0
+
+    def __init__(self, collection, topic, full_amount=False, root_file_path: str = None, shard: int = None,
+                 name: str = 'cursor'):
+        """
+        :param shard: 分片编号，分片同步时每个分片使用独立的游标文件 cursor.shard<编号>.db
+        :param name: 游标文件名（不含扩展名），如 change stream 的 resume token 保存在 resume_token.db
+        """
         root_file_path = root_file_path or CURSOR_FILE_PATH
 
         base_dir = join(root_file_path, topic, collection)
-        self.file_path = join(base_dir, f'cursor.db')
+        self.file_path = join(base_dir, f'{name}.db' if shard is None else f'{name}.shard{shard:03d}.db')
+        self.prev_path = f'{self.file_path}.prev'
         self.full_amount = full_amount
+        self.fsyncs = 0
+        self._synced_at = float('-inf')
+        self._dirty = False
 
     def load(self):
         """
-        从文件加载游标
+        从文件加载游标（解码为 ObjectId、元组等原始类型，见 positions 模块）；
+        当前检查点损坏时回退到上一个检查点，两者都损坏时抛出 ValueError，不再静默地从头同步
         """
-        if not os.path.exists(self.file_path) or self.full_amount:
+        if self.full_amount:
             return None
-        with open(self.file_path) as f:
+        found = False
+        for path in (self.file_path, self.prev_path):
+            if not os.path.exists(path):
+                continue
+            found = True
             try:
-                cursor_str = f.read().strip().splitlines()[-1].strip()
-                if not cursor_str:
-                    raise ValueError
-                return cursor_str
-            except (IndexError, ValueError):
-                # 文件内容异常也退回默认游标
-                return None
+                position = self._read(path)
+            except ValueError as e:
+                self.logger.warning(f"[Cursor] 游标检查点损坏：{path}（{e}）")
+                continue
+            if path == self.prev_path:
+                self.logger.warning(f"[Cursor] 回退到上一个检查点：{path} -> {position}")
+            return position
+        if found:
+            raise ValueError(f'游标文件 {self.file_path} 及上一个检查点均已损坏，'
+                             f'请手动修复或全量同步（full_amount）')
+        return None
+
+    @staticmethod
+    def _read(path: str):
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().strip().splitlines()
+        if not lines or not lines[-1].strip():
+            raise ValueError('文件为空')
+        line = lines[-1].strip()
+        if '\t' in line:
+            text, checksum = line.rsplit('\t', 1)
+            if f'{zlib.crc32(text.encode("utf-8")):08x}' != checksum:
+                raise ValueError('CRC 校验失败')
+        else:
+            # 旧版游标文件没有校验值
+            text = line
+        return decode_position(text)
 
     def save(self, cursor) -> None:
         """
-        将游标保存到文件
+        将游标保存到文件（bson.json_util 编码，保留 BSON 类型）：写临时文件 -> 当前检查点改名为 .prev -> 临时文件改名
         """
         # 确保目录存在
         os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
-        with open(self.file_path, "w") as f:
-            f.write(str(cursor))
+        text = encode_position(cursor)
+        durable = time.monotonic() - self._synced_at >= self.fsync_seconds
+        tmp_path = f'{self.file_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(f'{text}\t{zlib.crc32(text.encode("utf-8")):08x}\n')
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        if os.path.exists(self.file_path):
+            os.replace(self.file_path, self.prev_path)
+        os.replace(tmp_path, self.file_path)
+        if durable:
+            self._sync_directory()
+        else:
+            self._dirty = True
+
+    def flush(self) -> None:
+        """
+        fsync 尚未落盘的检查点
+        """
+        if not self._dirty:
+            return
+        with open(self.file_path, 'rb') as f:
+            os.fsync(f.fileno())
+        self._sync_directory()
+
+    def _sync_directory(self) -> None:
+        # 改名是目录项的修改，目录也需要 fsync 才能在断电后保留
+        if os.name == 'posix':
+            fd = os.open(os.path.dirname(self.file_path), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self.fsyncs += 1
+        self._synced_at = time.monotonic()
+        self._dirty = False
@@ -0,0 +1,128 @@
+"""
+Kafka 压缩主题游标存储
+
+游标作为消息写入 cleanup.policy=compact 的主题（settings.CURSOR_TOPIC），key 为 <topic>/<collection>/<游标名>，
+value 为 {"position": 编码后的位置, "saved_at": 保存时间}。主题压缩后每个 key 只保留最新值，
+任何能访问 Kafka 的主机都能读取同一份进度：
+
+- save()：经 BatchedCursorManager 合并后异步发送，不等待确认
+- flush()：发送尚未写入的位置并等待确认（同步结束时调用）
+- load()：从头读取主题到当前末尾，取该 key 的最后一个值（压缩主题只有每个游标一条左右的记录）
+"""
+import json
+import time
+from typing import Any, Dict
+
+from kafka import KafkaConsumer, KafkaProducer
+from kafka.errors import KafkaTimeoutError
+from kafka.structs import TopicPartition
+
+from application.cursor_model.base_cursor import BatchedCursorManager
+from application.cursor_model.positions import decode_position, encode_position
+from application.producers.producer_pool import KafkaProducerPool
+from application.settings import CURSOR_PRODUCER_CONFIG, CURSOR_TOPIC
+
+
+class KafkaCursorManager(BatchedCursorManager):
+    """
+    基于 Kafka 压缩主题的游标管理器
+
+    :cvar producer_factory: 生产者工厂（测试时可替换为本地替身）
+    :cvar consumer_factory: 消费者工厂（测试时可替换为本地替身）
+    :cvar flush_timeout: flush() 等待确认的超时时间（秒）
+    :cvar poll_timeout_ms: load() 每次拉取的超时时间（毫秒）
+    :cvar load_timeout: load() 读到主题末尾的总超时时间（秒）
+    """
+    producer_factory = KafkaProducer
+    consumer_factory = KafkaConsumer
+    flush_timeout = 30.0
+    poll_timeout_ms = 500
+    load_timeout = 60.0
+
+    def __init__(self, collection, topic, full_amount=False, shard: int = None, name: str = 'cursor',
+                 cursor_topic: str = None, producer_config: Dict[str, Any] = None):
+        """
+        :param shard: 分片编号，分片同步时每个分片使用独立的游标 key <name>.shard<编号>
+        :param name: 游标名，如 change stream 的 resume token 使用 resume_token
+        :param cursor_topic: 保存游标的压缩主题，默认 settings.CURSOR_TOPIC
+        :param producer_config: 生产者配置，默认 settings.CURSOR_PRODUCER_CONFIG（acks=all）
+        """
+        super().__init__()
+        self.full_amount = full_amount
+        self.cursor_topic = cursor_topic or CURSOR_TOPIC
+        self.producer_config = producer_config or CURSOR_PRODUCER_CONFIG
+        name = name if shard is None else f'{name}.shard{shard:03d}'
+        self.key = f'{topic}/{collection}/{name}'.encode('utf-8')
+        self._producer = None
+        self._errors = []
+
+    def __getstate__(self):
+        # 生产者无法 pickle
+        state = self.__dict__.copy()
+        state['_producer'] = None
+        state['_errors'] = []
+        return state
+
+    def load(self):
+        """
+        读取压缩主题到当前末尾，返回该游标 key 的最新位置（最后一条为 tombstone 时返回 None）
+        """
+        if self.full_amount:
+            return None
+        consumer = self.consumer_factory(
+            bootstrap_servers=self.producer_config['bootstrap_servers'],
+            group_id=None,
+            enable_auto_commit=False,
+        )
+        try:
+            partitions = [TopicPartition(self.cursor_topic, partition)
+                          for partition in sorted(consumer.partitions_for_topic(self.cursor_topic) or ())]
+            if not partitions:
+                return None
+            consumer.assign(partitions)
+            consumer.seek_to_beginning(*partitions)
+            end_offsets = consumer.end_offsets(partitions)
+            value = None
+            remaining = {tp for tp in partitions if end_offsets[tp] > consumer.position(tp)}
+            deadline = time.monotonic() + self.load_timeout
+            while remaining:
+                if time.monotonic() > deadline:
+                    raise KafkaTimeoutError(f'读取游标主题 {self.cursor_topic} 超时（{self.load_timeout} 秒）')
+                for tp, records in consumer.poll(timeout_ms=self.poll_timeout_ms).items():
+                    for record in records:
+                        if record.key == self.key:
+                            value = record.value
+                    if consumer.position(tp) >= end_offsets[tp]:
+                        remaining.discard(tp)
+        finally:
+            consumer.close()
+        if value is None:
+            return None
+        return decode_position(json.loads(value)['position'])
+
+    @property
+    def producer(self):
+        if self._producer is None:
+            self._producer = KafkaProducerPool.acquire(self.producer_config, factory=self.producer_factory)
+        return self._producer
+
+    def _write(self, cursor) -> None:
+        value = json.dumps({'position': encode_position(cursor), 'saved_at': time.time()}).encode('utf-8')
+        future = self.producer.send(self.cursor_topic, value=value, key=self.key)
+        future.add_errback(self._errors.append)
+
+    def flush(self) -> None:
+        """
+        发送尚未写入的位置并等待全部确认，之后释放生产者；写入失败时抛出异常
+        """
+        super().flush()
+        if self._producer is None:
+            return
+        try:
+            self._producer.flush(timeout=self.flush_timeout)
+        finally:
+            KafkaProducerPool.release(self._producer)
+            self._producer = None
+        if self._errors:
+            errors, self._errors = self._errors, []
+            raise errors[0]
@@ -0,0 +1,36 @@
+"""
+游标位置的编码
+
+游标位置可以是单个排序键的值（ObjectId、int、str、datetime 等），也可以是复合排序键的元组，
+如 (update_time, _id)。写入游标文件时使用 bson.json_util 编码，保留 BSON 类型：
+
+    {"$oid": "66f1c2a0e4b0a1b2c3d4e5f6"}
+    [{"$date": "2024-09-23T10:30:00Z"}, {"$oid": "66f1c2a0e4b0a1b2c3d4e5f6"}]
+
+兼容旧版游标文件：内容为 24 位十六进制字符串时解析为 ObjectId。
+"""
+from typing import Any, Optional
+
+from bson import ObjectId, json_util
+
+
+def encode_position(position: Any) -> str:
+    """
+    游标位置 -> 字符串（元组按 JSON 数组保存）
+    """
+    if isinstance(position, tuple):
+        position = list(position)
+    return json_util.dumps(position)
+
+
+def decode_position(text: Optional[str]) -> Any:
+    """
+    字符串 -> 游标位置（JSON 数组还原为元组）；空字符串返回 None
+    """
+    if not text:
+        return None
+    if ObjectId.is_valid(text):
+        # 旧版游标文件直接保存 str(ObjectId)
+        return ObjectId(text)
+    position = json_util.loads(text)
+    return tuple(position) if isinstance(position, list) else position
@@ -0,0 +1,134 @@
+"""
+SQLite 游标存储
+
+多个工作进程（或同一主机上的多个同步任务）共享一个 SQLite 库，每个游标一行：
+
+    cursors(topic, collection, name, position, version, updated_at)
+
+写入按行做比较并交换（compare-and-set）：UPDATE ... WHERE version = 读取时的版本号，
+其他进程在此期间推进过同一游标时更新不到任何行，抛出 CursorConflictError，避免两个工作进程互相覆盖进度。
+库使用 WAL 模式，读写互不阻塞；写入经 BatchedCursorManager 合并。
+"""
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import Any, Optional
+
+from application.config import CURSOR_DB_PATH
+from application.cursor_model.base_cursor import BatchedCursorManager
+from application.cursor_model.positions import decode_position, encode_position
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cursors (
+    topic TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    name TEXT NOT NULL,
+    position TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (topic, collection, name)
+)
+'''
+
+
+class CursorConflictError(RuntimeError):
+    """
+    比较并交换失败：游标已被其他进程修改
+    """
+
+
+class SqliteCursorManager(BatchedCursorManager):
+    """
+    基于 SQLite 的游标管理器（行级比较并交换）
+
+    :ivar version: 最近一次读取或写入时的行版本号，0 表示行不存在，None 表示尚未读取
+    """
+
+    def __init__(self, collection, topic, full_amount=False, shard: int = None, name: str = 'cursor',
+                 db_path: str = None):
+        """
+        :param shard: 分片编号，分片同步时每个分片使用独立的游标行 cursor.shard<编号>
+        :param name: 游标名，如 change stream 的 resume token 使用 resume_token
+        :param db_path: SQLite 库路径，默认 runtime/cursors/cursors.sqlite3
+        """
+        super().__init__()
+        self.collection = collection
+        self.topic = topic
+        self.full_amount = full_amount
+        self.name = name if shard is None else f'{name}.shard{shard:03d}'
+        self.db_path = db_path or CURSOR_DB_PATH
+        self.version: Optional[int] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = Lock()
+
+    def __getstate__(self):
+        # 数据库连接无法 pickle，在使用时重新打开
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            # 自动提交模式；同步结束时的最终提交可能在其他线程执行
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def load(self):
+        """
+        读取游标并记录行版本号（full_amount 时同样记录版本号，但返回 None）
+        """
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT position, version FROM cursors WHERE topic = ? AND collection = ? AND name = ?',
+                (self.topic, self.collection, self.name),
+            ).fetchone()
+        self.version = row[1] if row else 0
+        if row is None or self.full_amount:
+            return None
+        return decode_position(row[0])
+
+    def compare_and_set(self, cursor: Any, expected_version: int) -> bool:
+        """
+        行版本号等于 expected_version 时写入游标并递增版本号（0 表示插入新行）
+
+        :return: 是否写入成功
+        """
+        text = encode_position(cursor)
+        key = (self.topic, self.collection, self.name)
+        with self._lock:
+            if expected_version == 0:
+                result = self.conn.execute(
+                    'INSERT INTO cursors (topic, collection, name, position, version, updated_at) '
+                    'VALUES (?, ?, ?, ?, 1, ?) ON CONFLICT DO NOTHING',
+                    (*key, text, time.time()),
+                )
+            else:
+                result = self.conn.execute(
+                    'UPDATE cursors SET position = ?, version = version + 1, updated_at = ? '
+                    'WHERE topic = ? AND collection = ? AND name = ? AND version = ?',
+                    (text, time.time(), *key, expected_version),
+                )
+        if result.rowcount != 1:
+            return False
+        self.version = expected_version + 1
+        return True
+
+    def _write(self, cursor) -> None:
+        if self.version is None:
+            # 未读取过（如分片同步结束时写主游标）：以当前版本为基准
+            self.load()
+        if not self.compare_and_set(cursor, self.version):
+            raise CursorConflictError(f'游标 {self.topic}/{self.collection}/{self.name} 已被其他进程修改'
+                                      f'（读取时版本 {self.version}），停止写入以免覆盖其进度')
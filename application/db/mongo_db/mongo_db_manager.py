@@ -5,10 +5,17 @@
 # @User  : Mabin
 # @Description  :MongoDB数据库操作工具类（单例、连接池）
 """
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import bson
 from bson import ObjectId
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 from threading import Lock
 
+from application.utils.lazy_bson import lazy_codec_options
 from application.settings import MONGODB_DATABASES
 
 
@@ -77,35 +84,149 @@ class MongoDBManager:
         self.db = self.client[connect_config["database"]]  # 切换至指定数据库
 
 
+def seek_query(sort_keys: Sequence[str], position: Tuple[Any, ...]) -> Dict[str, Any]:
+    """
+    构造"排序键元组大于 position"的查询条件（按字典序）
+
+    单键：{k: {'$gt': v}}
+    复合键 (a, b)：{a: {'$gte': va}, '$or': [{a: {'$gt': va}}, {a: va, b: {'$gt': vb}}]}
+    其中首键的 $gte 条件让查询计划直接在复合索引 (a, b) 上做有界范围扫描，$or 再排除已同步的等值部分。
+
+    null（含字段缺失）在升序中排在所有值之前，但 {'$gt': None} 什么也匹配不到（比较运算只在同类型间进行），
+    游标停在 null 上会让同步停滞：位置分量为 None 时"大于"改写为 {'$ne': None}，首键为 None 时不加 $gte 前缀。
+    """
+    first = sort_keys[0]
+    if len(sort_keys) == 1:
+        return {first: _greater(position[0])}
+    branches = []
+    for i, key in enumerate(sort_keys):
+        branch = {sort_keys[j]: position[j] for j in range(i)}
+        branch[key] = _greater(position[i])
+        branches.append(branch)
+    if position[0] is None:
+        return {'$or': branches}
+    return {first: {'$gte': position[0]}, '$or': branches}
+
+
+def _greater(value: Any) -> Dict[str, Any]:
+    return {'$ne': None} if value is None else {'$gt': value}
+
+
+def build_projection(fields: Iterable[str]) -> Dict[str, int]:
+    """
+    字段列表 -> find() 投影：去重，并去掉已被父路径覆盖的子路径（同时投影 a 与 a.b 会报路径冲突）
+    """
+    fields = sorted(set(fields))
+    kept: List[str] = []
+    for field in fields:
+        if not any(field.startswith(f'{parent}.') for parent in kept):
+            kept.append(field)
+    return {field: 1 for field in kept}
+
+
+def object_id_at(value: datetime, round_up: bool = False) -> ObjectId:
+    """
+    时间 -> 该时刻的 ObjectId 边界（ObjectId 前 4 字节为秒级创建时间，其余字节为 0），naive 时间按本地时间
+
+    :param round_up: 不足整秒时向上取整（用作 $lt 上界时不漏掉该秒内已过的部分）
+    """
+    value = value.astimezone(timezone.utc)
+    if round_up and value.microsecond:
+        value += timedelta(seconds=1)
+    return ObjectId.from_datetime(value)
+
+
+def document_position(doc: Dict[str, Any], sort_key: Union[str, Sequence[str]]) -> Any:
+    """
+    文档的游标位置：单键为字段值，复合键为字段值元组
+    """
+    if isinstance(sort_key, str):
+        return doc.get(sort_key)
+    return tuple(doc.get(key) for key in sort_key)
+
+
 class MongoDBDataStream:
     """
     MongoDB 数据流迭代器类
     --------------------
     该类用于从 MongoDB 中按批次顺序读取数据，支持增量同步（基于历史游标位置）。
+
+    排序键可以是单个字段（如 `_id`），也可以是复合水位线（如 ('update_time', '_id')）：
+    按复合键排序并从上次的位置继续，修改过的文档（update_time 变大）会被再次读取，
+    增量同步的读取量与变更量成正比（需要对应的复合索引，如 {update_time: 1, _id: 1}）。
+
+    raw 模式下文档以 LazyBSONDocument 返回（见 utils.lazy_bson）：只解码被访问的字段，未访问的大字段不产生 Python 对象。
     """
 
     # 共享的 MongoDB 管理器实例（类属性，可减少重复连接开销）
     mongodb_manager = MongoDBManager()
 
-    def __init__(self, collection: str, batch_size: int, sort_key: str, historical_cursor_position: str):
+    # 每读取多少条文档抽样一次，估算读取字节数（见 read_report）；抽样数上限保证内存占用有界
+    sample_every = 100
+    max_samples = 10000
+
+    def __init__(self, collection: str, batch_size: int, sort_key: Union[str, Sequence[str]],
+                 historical_cursor_position: Any, lower_bound: ObjectId = None, upper_bound: ObjectId = None,
+                 projection: Iterable[str] = None, raw: bool = False,
+                 since: datetime = None, until: datetime = None):
         """
         初始化 MongoDB 数据流读取器
 
         :param collection: 目标 MongoDB 集合名称
         :param batch_size: 每次批量读取的文档数量
-        :param sort_key: 排序字段（一般是 `_id`）
-        :param historical_cursor_position: 历史游标位置（用于增量同步，通常为上次同步的 `_id` 字符串）
+        :param sort_key: 排序字段（一般是 `_id`），或复合排序键如 ('update_time', '_id')
+        :param historical_cursor_position: 历史游标位置（用于增量同步）：单键为上次同步的字段值
+                                           （`_id` 兼容 ObjectId 字符串），复合键为字段值元组
+        :param lower_bound: `_id` 读取范围下界（包含），用于分片同步
+        :param upper_bound: `_id` 读取范围上界（不包含），用于分片同步
+        :param projection: 需要读取的字段（投影下推，只传输并解码这些字段），排序键会自动加入；None 表示读取整篇文档
+        :param raw: 是否返回按需解码的 LazyBSONDocument（只读视图，赋值写入覆盖层），默认返回完整解码的 dict
+        :param since: 只读取该时刻及之后创建的文档：换算为 `_id` 下界 ObjectId.from_datetime(since)，与 lower_bound 取交集
+        :param until: 只读取该时刻之前创建的文档：换算为 `_id` 上界，与 upper_bound 取交集，读到上界即结束
         """
+        # 时间窗口按 ObjectId 内嵌的创建时间换算为 _id 区间，查询是 _id 索引上的有界范围扫描
+        if since is not None:
+            since_id = object_id_at(since)
+            lower_bound = since_id if lower_bound is None else max(lower_bound, since_id)
+        if until is not None:
+            until_id = object_id_at(until, round_up=True)
+            upper_bound = until_id if upper_bound is None else min(upper_bound, until_id)
+
         self.collection = collection
         self.batch_size = batch_size
         self.sort_key = sort_key
         self.historical_cursor_position = historical_cursor_position
+        self.lower_bound = lower_bound
+        self.upper_bound = upper_bound
+        self.raw = raw
+
+        self.sort_keys = (sort_key,) if isinstance(sort_key, str) else tuple(sort_key)
+        self.projection = build_projection([*projection, *self.sort_keys]) if projection else None
+        # 读取统计：文档数与抽样文档（投影后）的 BSON 字节数
+        self.docs_read = 0
+        self._sample_ids: List[Any] = []
+        self._sample_bytes = 0
 
-        # 如果存在历史游标，则构造增量条件（大于上次同步的 _id）
-        # 否则返回空条件（表示从头读取）
-        self.cursor_query = {
-            sort_key: {"$gt": ObjectId(historical_cursor_position)}
-        } if historical_cursor_position else {}
+        # 如果存在历史游标，则构造增量条件（排序键大于上次同步的位置），否则从下界（或从头）读取；
+        # 有分片范围（或时间窗口）时追加 _id 的 $gte / $lt 条件
+        self.cursor_query = {}
+        position = historical_cursor_position
+        if position is not None and position != '':
+            if isinstance(sort_key, str):
+                if sort_key == '_id' and isinstance(position, str) and ObjectId.is_valid(position):
+                    position = ObjectId(position)
+                position = (position,)
+            elif not isinstance(position, tuple) or len(position) != len(self.sort_keys):
+                raise ValueError(f'历史游标 {historical_cursor_position!r} 与排序键 {self.sort_keys} 不匹配，'
+                                 f'更换排序键后请全量同步')
+            self.cursor_query = seek_query(self.sort_keys, position)
+        id_range = {}
+        if lower_bound is not None and not (self.cursor_query and self.sort_keys == ('_id',)):
+            id_range["$gte"] = lower_bound
+        if upper_bound is not None:
+            id_range["$lt"] = upper_bound
+        if id_range:
+            self.cursor_query.setdefault('_id', {}).update(id_range)
 
     def get_all(self, query: dict = None):
         """
@@ -120,21 +241,78 @@ class MongoDBDataStream:
         3. 使用 `.batch_size()` 控制单次从服务器拉取的文档数，避免内存压力。
         4. 通过 `yield` 逐条返回文档，适合大规模数据流式处理。
         """
-        # 构造最终查询条件：query OR 游标条件
-        final_filter = (query or {}) | self.cursor_query
+        # 构造最终查询条件：合并 query 与游标条件（存在同名条件时用 $and 组合，避免覆盖）
+        query = query or {}
+        if query.keys() & self.cursor_query.keys():
+            final_filter = {'$and': [query, self.cursor_query]}
+        else:
+            final_filter = query | self.cursor_query
 
-        # MongoDB 游标对象（按 sort_key 升序，批量读取）
+        collection = self.mongodb_manager.db[self.collection]
+        if self.raw:
+            collection = collection.with_options(codec_options=lazy_codec_options(collection.codec_options))
+
+        # MongoDB 游标对象（按排序键升序，批量读取）
         cursor = (
-            self.mongodb_manager.db[self.collection]
-            .find(filter=final_filter)
-            .sort(self.sort_key, 1)   # 升序排序
+            collection
+            .find(filter=final_filter, projection=self.projection)
+            .sort([(key, 1) for key in self.sort_keys])   # 升序排序
             .batch_size(self.batch_size)  # 设置批量大小
         )
 
-        # 流式返回文档
+        # 流式返回文档，每 sample_every 条抽样一条记录投影后的大小
+        sample_every, raw = self.sample_every, self.raw
         for doc in cursor:
+            if self.docs_read % sample_every == 0 and len(self._sample_ids) < self.max_samples:
+                self._sample_ids.append(doc['_id'])
+                self._sample_bytes += len(doc.raw) if raw else len(bson.encode(doc))
+            self.docs_read += 1
             yield doc
 
+    def read_report(self) -> Dict[str, Any]:
+        """
+        读取量报告：按抽样文档估算实际读取的字节数（bytes_read），并用 $bsonSize 查询抽样文档的完整大小，
+        估算不做投影时的字节数（full_bytes，需要 MongoDB 4.4+，不支持时省略）
+
+        :return: {'docs_read', 'bytes_read', 'full_bytes', 'projection_saving'}
+        """
+        report: Dict[str, Any] = {'docs_read': self.docs_read}
+        if not self._sample_ids:
+            return report
+        scale = self.docs_read / len(self._sample_ids)
+        report['bytes_read'] = int(self._sample_bytes * scale)
+        full_bytes = self._full_sample_bytes()
+        if full_bytes is not None:
+            report['full_bytes'] = int(full_bytes * scale)
+            report['projection_saving'] = round(1 - self._sample_bytes / full_bytes, 4) if full_bytes else 0.0
+        return report
+
+    def _full_sample_bytes(self) -> Optional[int]:
+        if self.projection is None:
+            return self._sample_bytes
+        try:
+            result = list(self.mongodb_manager.db[self.collection].aggregate([
+                {'$match': {'_id': {'$in': self._sample_ids}}},
+                {'$group': {'_id': None, 'bytes': {'$sum': {'$bsonSize': '$$ROOT'}}}},
+            ]))
+        except PyMongoError:
+            return None
+        return result[0]['bytes'] if result else 0
+
+    def get_batches(self, query: dict = None):
+        """
+        按批次获取 MongoDB 文档，每批最多 `batch_size` 条
+
+        :param query: 额外的 MongoDB 查询条件（与游标条件合并）
+        :return: 生成器，逐批返回文档列表
+        """
+        docs = self.get_all(query=query)
+        while True:
+            batch = list(islice(docs, self.batch_size))
+            if not batch:
+                break
+            yield batch
+
 
 if __name__ == '__main__':
     test_model = MongoDBDataStream(collection='raw_information_list', batch_size=1000, sort_key='_id',
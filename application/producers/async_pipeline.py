@@ -0,0 +1,120 @@
+"""
+asyncio 同步流水线
+
+把"读取 MongoDB -> transform/序列化/发送 -> 等待确认"拆成三个并发阶段，用有界队列连接：
+
+    fetch   在专用线程中预取下一批文档（getMore 网络等待与发送重叠），最多预取 prefetch_batches 批
+    send    在专用线程中执行 producer.send_batch()（复用 transform / value_serialize 钩子，
+            缓冲区满时的阻塞不占用事件循环），登记游标后把整批投递结果放入在途队列
+    ack     按发送顺序 await 每批的投递结果并定期提交游标；在途批次达到 max_in_flight_batches 时
+            send 阶段等待，形成背压
+
+Kafka Future 的回调在 I/O 线程触发，通过 loop.call_soon_threadsafe 转换为 asyncio.Future。
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, List, Sequence, Union
+
+from application.cursor_model.ack_tracker import AckCursorTracker
+from application.db.mongo_db.mongo_db_manager import document_position
+
+
+def _resolve(waiter: asyncio.Future, value: Any = None, exception: BaseException = None) -> None:
+    if waiter.done():
+        return
+    if exception is not None:
+        waiter.set_exception(exception)
+    else:
+        waiter.set_result(value)
+
+
+def wrap_future(future, loop: asyncio.AbstractEventLoop) -> asyncio.Future:
+    """
+    把 Kafka Future（或 DeliveryFuture）包装为可 await 的 asyncio.Future（线程安全）
+    """
+    waiter = loop.create_future()
+    future.add_callback(lambda value: loop.call_soon_threadsafe(_resolve, waiter, value))
+    future.add_errback(lambda exception: loop.call_soon_threadsafe(_resolve, waiter, None, exception))
+    return waiter
+
+
+class AsyncPipeline:
+    """
+    asyncio 同步流水线
+    """
+
+    def __init__(self, producer, prefetch_batches: int = 2, max_in_flight_batches: int = 8):
+        """
+        :param producer: BaseKafkaProducer 子类实例
+        :param prefetch_batches: 预取的 MongoDB 批次数上限
+        :param max_in_flight_batches: 已发送未确认的批次数上限（背压）
+        """
+        self.producer = producer
+        self.prefetch_batches = prefetch_batches
+        self.max_in_flight_batches = max_in_flight_batches
+
+    async def run(self, batches: Iterator[List[dict]], tracker: AckCursorTracker,
+                  sort_key: Union[str, Sequence[str]] = '_id') -> None:
+        """
+        执行流水线直到 batches 耗尽；任一阶段出错时取消其余阶段并抛出异常
+
+        :param batches: 文档批次迭代器（如 MongoDBDataStream.get_batches()）
+        :param tracker: 游标跟踪器
+        :param sort_key: 游标字段，复合水位线为字段元组（如 ('update_time', '_id')）
+        """
+        loop = asyncio.get_running_loop()
+        stats = self.producer.stats
+        fetched = asyncio.Queue(maxsize=self.prefetch_batches)
+        in_flight = asyncio.Queue(maxsize=self.max_in_flight_batches)
+        # 单线程执行器：游标迭代器与生产者状态始终只在各自的一个线程中访问
+        fetch_executor = ThreadPoolExecutor(1, thread_name_prefix='mongo-fetch')
+        send_executor = ThreadPoolExecutor(1, thread_name_prefix='kafka-send')
+
+        async def fetch():
+            while True:
+                docs = await loop.run_in_executor(fetch_executor, next, batches, None)
+                await fetched.put(docs)
+                if docs is None:
+                    return
+
+        async def send():
+            while True:
+                started = time.perf_counter()
+                docs = await fetched.get()
+                stats.add_time('fetch_wait', time.perf_counter() - started)
+                if docs is None:
+                    await in_flight.put(None)
+                    return
+                # 发送前记录游标位置，transform 可能会修改文档
+                positions = [document_position(doc, sort_key) for doc in docs]
+                result = await loop.run_in_executor(send_executor, self.producer.send_batch, docs)
+                tracker.track_batch(positions, result.futures)
+                waiter = asyncio.gather(*(wrap_future(future, loop) for future in result.futures),
+                                        return_exceptions=True)
+                started = time.perf_counter()
+                await in_flight.put(waiter)
+                stats.add_time('backpressure', time.perf_counter() - started)
+
+        async def ack():
+            while True:
+                waiter = await in_flight.get()
+                if waiter is None:
+                    return
+                # 投递失败由 tracker 记录，这里只等待整批完成
+                await waiter
+                # 提交游标会调用 before_commit（落盘缓冲、去重索引），与发送放在同一线程执行
+                await loop.run_in_executor(send_executor, tracker.maybe_checkpoint)
+
+        tasks = [asyncio.create_task(stage(), name=stage.__name__) for stage in (fetch, send, ack)]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in pending:
+                task.cancel()
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            fetch_executor.shutdown(wait=False)
+            send_executor.shutdown(wait=True)
@@ -1,31 +1,190 @@
+import json
+import os
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Sequence, Union
 
-from kafka import KafkaProducer
+from kafka.errors import KafkaError
 
-from application.settings import PRODUCER_CONFIG
+from application.producers.claim_check import BLOB_STORES, CLAIM_CHECK_HEADER, ClaimCheck
+from application.producers.compression import resolve_compression
+from application.producers.field_mapping import compile_mapping, load_mapping, mapping_sources
+from application.producers.parallel_serializer import ProcessPoolSerializer
+from application.producers.partitioners import PARTITIONERS, get_key_strategy
+from application.producers.producer_pool import KafkaProducerPool
+from application.producers.serializers import get_serializer
+from application.producers.spool import SPOOLED, DeliveryFuture, DiskSpool
+from application.producers.tuning import AdaptiveTuner
+from application.settings import PRODUCER_CONFIG, TOPIC_COMPRESSION, TOPIC_RATE_LIMITS
+from application.utils.dedup_index import SKIPPED, DedupIndex, content_hash
 from application.utils.logger import get_logger
+from application.utils.metrics import RunStats
+from application.utils.rate_limiter import TopicRateLimiter
+
+
+class BatchSendResult:
+    """
+    send_batch() 返回的聚合投递句柄：持有整批消息的 Future，并记录条数与字节数
+
+    :ivar futures: 每条消息对应的 Future 对象（与输入顺序一致）
+    :ivar count: 本批次发送的消息条数
+    :ivar bytes: 本批次消息体（value）的总字节数
+    """
+
+    def __init__(self, futures: List[Any], count: int, size: int):
+        self.futures = futures
+        self.count = count
+        self.bytes = size
+
+    def is_done(self) -> bool:
+        """
+        整批消息是否都已得到 broker 响应（成功或失败）
+        """
+        return all(future.is_done for future in self.futures)
+
+    def get(self, timeout: float = None) -> List[Any]:
+        """
+        同步等待整批消息的投递结果
+
+        :param timeout: 每条消息的等待超时时间（秒）
+        :return: RecordMetadata 列表；任一消息失败时抛出对应异常
+        """
+        return [future.get(timeout=timeout) for future in self.futures]
 
 
 class BaseKafkaProducer(ABC):
     """
     抽象基类，负责：
-    1) 创建并维护一个全局 KafkaProducer 实例（所有子类共用，避免重复建连）。
+    1) 从进程级连接池获取 KafkaProducer 实例（相同配置的生产者共用，避免重复建连）。
     2) 定义子类必须实现的两个钩子：transform() 和 value_serialize()。
-    3) 提供 send_message() 与 flush_and_close() 两个公共方法，子类可直接复用。
+    3) 提供 send_message()、send_batch() 与 flush_and_close() 公共方法，子类可直接复用。
+    4) 提供批量钩子 transform_batch() 与 serialize_batch()，子类可重写以摊薄单条处理开销。
+    5) 可选的多进程序列化：serialize_workers > 1 时，serialize_batch() 把分片分发到进程池执行。
+    6) 按 serializer_mode 从序列化器注册表创建 self.serializer（需子类声明 data_structure 模型）。
+    7) 可选的 key 策略与分区器（见 partitioners 模块），并按分区统计发送条数。
+    8) 可选的自适应调优：按观测指标调整 batch_size / linger_ms 并轮换底层 KafkaProducer。
+    9) 按 topic 限流（条数/秒、字节/秒令牌桶），限流等待时间与发送耗时分开统计。
+    10) 可选的本地落盘缓冲：发送/投递失败的消息写入 runtime/spool，熔断结束后先按顺序重放再恢复直接发送。
+    11) 可选的内容去重：按 dedup_key() 记录已投递消息的内容指纹，内容未变化的消息直接跳过发送。
+    12) 按 topic 选择压缩方式：KafkaProducer 整批压缩，或应用层 zstd 字典压缩（见 compression 模块）。
+    13) 可选的大字段外置：序列化后超过阈值的消息把 offload_fields 写入 blob 存储，header 携带引用；
+        消息大小分布以直方图形式计入运行统计。
+    14) send_tombstone() 发送删除标记（value 为空），供 change stream 实时同步传播删除。
+    15) 可选的声明式字段映射：按映射规格编译出的函数代替 transform()，直接生成消息体（见 field_mapping 模块）。
+
+    :cvar data_structure: 消息对应的数据结构模型类，供序列化器使用
+    :cvar producer_factory: 创建 KafkaProducer 的工厂，默认 KafkaProducer（测试时可替换为本地替身）
+    :cvar offload_fields: 可外置的大字段：消息字段名 -> 消息体中的路径，如 {'info_section': 'data.info_section'}
+    :cvar source_fields: transform / value_serialize 读取的源文档字段，用于读取时的投影下推；None 表示读取整篇文档
     """
 
     logger = get_logger("producer")
+    data_structure = None
+    producer_factory = None
+    offload_fields = {}
+    source_fields = None
+    # pickle 到序列化工作进程时需剔除的运行时资源
+    _transient_attrs = ('producer', 'stats', '_pool_serializer', 'key_strategy', 'partitioner', 'rate_limiter',
+                        'spool', 'dedup', 'codec', 'mapper')
+    # 发送失败后，多少秒内直接落盘而不再尝试发送（避免每条消息都阻塞 max_block_ms）
+    spool_retry_seconds = 30.0
+    # 轮换生产者时等待旧实例中已发送消息确认的最长时间（秒）
+    rotate_timeout = 10.0
 
-    def __init__(self, topic: str, producer_config: dict = None, debug: bool = False):
+    def __init__(self,
+                 topic: str,
+                 producer_config: dict = None,
+                 debug: bool = False,
+                 serialize_workers: int = 0,
+                 serialize_chunk_size: int = 200,
+                 serializer_mode: str = 'validated',
+                 serializer_options: dict = None,
+                 key_strategy: str = None,
+                 partitioner: str = None,
+                 tuning: dict = None,
+                 rate_limit: dict = None,
+                 spool: bool = False,
+                 dedup: Union[bool, Dict[str, Any]] = False,
+                 compression: dict = None,
+                 claim_check: dict = None,
+                 field_mapping: Union[str, Dict[str, Any]] = None):
         """
         传入 topic 名称，后续 send_message() 均发到该 topic
+
+        :param serialize_workers: 序列化工作进程数，<= 1 表示在主进程中序列化
+        :param serialize_chunk_size: 多进程序列化时每个分片的消息条数
+        :param serializer_mode: 序列化模式：validated / sampled / trusted / avro
+        :param serializer_options: 序列化器参数，如 {'sample_rate': 100}
+        :param key_strategy: 消息 key 策略，如 'uid'、'hash:info_source,data_type'，默认不设置 key
+        :param partitioner: 分区器名称：default / sticky，默认使用 KafkaProducer 自带分区器
+        :param tuning: 自适应调优参数（见 AdaptiveTuner），如 {'objective': 'latency', 'target_latency_ms': 200}
+        :param rate_limit: 限流参数，如 {'messages_per_sec': 5000, 'bytes_per_sec': 10485760}，
+                           默认取 settings.TOPIC_RATE_LIMITS 中该 topic 的配置
+        :param spool: 是否开启本地落盘缓冲（Kafka 不可用时消息写入 runtime/spool）
+        :param dedup: 是否开启内容去重（索引位于 runtime/dedup/<topic>/<collection>），
+                      或 DedupIndex 参数，如 {'verify': True}（布隆过滤器命中后查询 SQLite 确认）
+        :param compression: 压缩方式，如 {'codec': 'lz4'}、{'codec': 'zstd_dict', 'dict_id': 123, 'level': 3}，
+                            默认取 settings.TOPIC_COMPRESSION 中该 topic 的配置，均未配置时沿用 PRODUCER_CONFIG
+        :param claim_check: 大字段外置参数，如 {'threshold': 262144, 'store': 'file'}，默认不开启
+        :param field_mapping: 声明式字段映射规格（文件路径或 dict，见 field_mapping 模块），
+                              设置后由编译出的映射函数代替 transform()，消息即为消息体
         """
         self.topic = topic
-        # 允许传入特定的生产者配置，如果未提供则使用默认配置
-        config = producer_config or PRODUCER_CONFIG
-        self.producer = KafkaProducer(**config)
+        # 允许传入特定的生产者配置，如果未提供则使用默认配置（复制一份，避免修改全局配置）
+        config = dict(producer_config or PRODUCER_CONFIG)
+        if partitioner:
+            if partitioner not in PARTITIONERS:
+                raise ValueError(f'不支持的分区器：{partitioner}，可选：{list(PARTITIONERS)}')
+            config['partitioner'] = PARTITIONERS[partitioner]()
+        # 应用层压缩器（zstd_dict 模式），整批压缩由 KafkaProducer 的 compression_type 完成
+        self.codec = None
+        compression = compression or TOPIC_COMPRESSION.get(topic)
+        if compression:
+            config['compression_type'], self.codec = resolve_compression(compression)
+        self.key_strategy = get_key_strategy(key_strategy)
+        self.producer_config = config
+        self.producer = KafkaProducerPool.acquire(config, factory=type(self).producer_factory)
+        # 共享实例上实际生效的分区器（可能由先创建该实例的生产者提供）
+        self.partitioner = getattr(self.producer, 'config', config).get('partitioner')
+        self.tuner = AdaptiveTuner(topic, **tuning) if tuning else None
+        self.rate_limiter = TopicRateLimiter.for_topic(topic, rate_limit or TOPIC_RATE_LIMITS.get(topic))
+        self.spool = DiskSpool(topic) if spool else None
+        self._spool_until = 0.0
+        # 落盘缓冲中是否还有待重放的记录（None 表示尚未检查磁盘）
+        self._spool_pending = None
+        self.dedup = DedupIndex(
+            topic, getattr(self, 'collection', 'default'), **(dedup if isinstance(dedup, dict) else {})
+        ) if dedup else None
+        # 映射规格只在这里编译一次；规格本身保留在实例上（可 pickle），生成的函数不随实例传给工作进程
+        self.field_mapping = load_mapping(field_mapping) if field_mapping else None
+        self.mapper = compile_mapping(
+            self.field_mapping,
+            context={'topic': topic, 'data_type': getattr(self, 'data_type', None)},
+            name=os.path.splitext(os.path.basename(field_mapping))[0] if isinstance(field_mapping, str) else topic,
+        ) if field_mapping else None
+        self.claim_check = ClaimCheck(
+            # 映射模式下消息即消息体，按消息体路径外置
+            {path: path for path in self.offload_fields.values()} if self.mapper else self.offload_fields,
+            threshold=claim_check.get('threshold', 256 * 1024),
+            store=BLOB_STORES[claim_check.get('store', 'file')](),
+        ) if claim_check else None
         self.debug = debug
+        # 运行统计（发送条数、字节数、批次数等）
+        self.stats = RunStats()
+        self.serialize_workers = serialize_workers
+        self.serialize_chunk_size = serialize_chunk_size
+        # 进程池在首次使用时创建，确保子类 __init__ 已完成
+        self._pool_serializer = None
+        # 消息序列化器（validated / sampled / trusted）
+        self.serializer = get_serializer(
+            serializer_mode, self.data_structure, **(serializer_options or {})
+        ) if self.data_structure is not None else None
+
+    def __getstate__(self):
+        """
+        pickle 时剔除 KafkaProducer、进程池等不可序列化的运行时资源
+        """
+        return {k: v for k, v in self.__dict__.items() if k not in self._transient_attrs}
 
     # ---------------- 公共方法 ----------------
     def send_message(self,
@@ -36,17 +195,31 @@ class BaseKafkaProducer(ABC):
         :param message: 经过 transform 后的 dict
         :param key:     可选的 Kafka 消息 key，用于分区路由；通常放业务主键
         """
-        # 数据转换
-        transform_message = self.transform(message)
+        # 数据转换（配置了字段映射时使用编译出的映射函数）
+        transform_message = (self.mapper or self.transform)(message)
         # 序列化成字节
         value = self.value_serialize(transform_message)
+        if key is None and self.key_strategy is not None:
+            key = self.key_strategy(self, transform_message)
+        headers = self.message_headers()
+        self.stats.observe('message_bytes', [len(value)])
+        if self.claim_check is not None and len(value) > self.claim_check.threshold:
+            value, headers = self._offload(transform_message, value, headers)
+        if self.codec is not None:
+            value = self.codec.compress(value)
+
+        if self.rate_limiter is not None:
+            self.stats.add_time('throttled', self.rate_limiter.acquire(1, len(value)))
 
         # 异步发送到 Kafka，返回一个 Future 对象
-        future = self.producer.send(
+        send = self._send_or_spool if self.spool is not None else self.producer.send
+        future = send(
             self.topic,
             value=value,
             key=key.encode('utf-8') if key else None,
+            headers=headers,
         )
+        future.add_callback(self._on_delivered)
 
         if self.debug:
             # 同步阻塞 （不需要可注释）
@@ -55,12 +228,324 @@ class BaseKafkaProducer(ABC):
             # 注意：这里并未调用 future.get() 同步等待结果，追求高吞吐
             # 如果想每条都同步确认，可改成 future.get(timeout=10)
 
+    def send_batch(self,
+                   docs: Sequence[Dict[str, Any]],
+                   keys: Optional[Sequence[Optional[str]]] = None) -> BatchSendResult:
+        """
+        批量发送消息：整批执行 transform_batch -> serialize_batch -> producer.send
+
+        :param docs: 原始文档列表
+        :param keys: 可选的 Kafka 消息 key 列表，需与 docs 一一对应；未提供时按 key 策略生成
+        :return: 聚合投递句柄，可通过 get() 等待整批结果
+        """
+        # 粘滞分区器：每个批次切换一次分区
+        if hasattr(self.partitioner, 'next_batch'):
+            self.partitioner.next_batch()
+
+        messages = self.transform_batch(docs)
+        if keys is None and self.key_strategy is not None:
+            key_strategy = self.key_strategy
+            keys = [key_strategy(self, message) for message in messages]
+        values = self.serialize_batch(messages)
+        headers = self.message_headers()
+        self.stats.observe('message_bytes', map(len, values))
+
+        # 内容去重：按外置、压缩前的消息体判断，与上次投递内容一致的消息不再发送，以已完成的 SKIPPED 结果占位
+        dedup = self.dedup
+        if dedup is not None:
+            dedup_key = self.dedup_key
+            uids = [dedup_key(message) for message in messages]
+            digests = [content_hash(value) for value in values]
+            with self.stats.timer('dedup'):
+                unchanged = dedup.unchanged(uids, digests)
+            # 外置与压缩只处理需要发送的消息（跳过的消息不写入 blob 仓库）
+            pending = [index for index, skip in enumerate(unchanged) if not skip]
+        else:
+            pending = range(len(values))
+
+        # 超过阈值的消息外置大字段：index -> 该消息的 headers（带 claim_check 引用）
+        offloaded = {}
+        if self.claim_check is not None:
+            threshold = self.claim_check.threshold
+            for index in pending:
+                if len(values[index]) > threshold:
+                    values[index], offloaded[index] = self._offload(messages[index], values[index], headers)
+        if self.codec is not None:
+            with self.stats.timer('compress'):
+                if dedup is None:
+                    values = self.codec.compress_batch(values)
+                else:
+                    for index, value in zip(pending, self.codec.compress_batch([values[i] for i in pending])):
+                        values[index] = value
+
+        # 局部变量缓存，减少循环内的属性查找
+        send = self._send_or_spool if self.spool is not None else self.producer.send
+        topic = self.topic
+        on_delivered = self._on_delivered
+        rate_limiter = self.rate_limiter
+        futures = []
+        total_bytes = 0
+        throttled = 0.0
+        started = time.perf_counter()
+        skipped = 0
+        for index, value in enumerate(values):
+            if dedup is not None:
+                if unchanged[index]:
+                    futures.append(DeliveryFuture().success(SKIPPED))
+                    skipped += 1
+                    continue
+                uid, digest = uids[index], digests[index]
+            if rate_limiter is not None:
+                throttled += rate_limiter.acquire(1, len(value))
+            key = keys[index] if keys else None
+            future = send(topic, value=value, key=key.encode('utf-8') if key else None,
+                          headers=offloaded.get(index, headers) if offloaded else headers)
+            future.add_callback(on_delivered)
+            if dedup is not None:
+                future.add_callback(lambda _, uid=uid, digest=digest: dedup.record(uid, digest))
+            futures.append(future)
+            total_bytes += len(value)
+        # 限流等待单独统计，send 耗时不含限流等待，便于区分限流与真实瓶颈
+        self.stats.add_time('send', time.perf_counter() - started - throttled)
+        if throttled:
+            self.stats.add_time('throttled', throttled)
+
+        result = BatchSendResult(futures, len(futures) - skipped, total_bytes)
+        if skipped:
+            self.stats.incr('dedup_skipped', skipped)
+        self.stats.incr('batches')
+        self.stats.incr('messages', result.count)
+        self.stats.incr('bytes', result.bytes)
+
+        if self.debug:
+            # 同步阻塞等待整批确认
+            result.get(timeout=10)
+            self.logger.info(f"[Kafka] 批次发送完成：{result.count} 条，{result.bytes} 字节")
+
+        if self.tuner is not None and self.tuner.due():
+            changes = self.tuner.observe(self.producer.metrics(), self.producer_config)
+            if changes:
+                self._rotate_producer(changes)
+        return result
+
+    def send_tombstone(self, key: str):
+        """
+        发送删除标记（tombstone）：value 为空、key 为文档标识，压缩主题据此清除该 key 的历史消息
+
+        :param key: 被删除文档的标识（与 upsert 消息的 key 一致）
+        :return: 投递 Future
+        """
+        if self.rate_limiter is not None:
+            self.stats.add_time('throttled', self.rate_limiter.acquire(1, 0))
+        send = self._send_or_spool if self.spool is not None else self.producer.send
+        future = send(self.topic, value=None, key=key.encode('utf-8'))
+        future.add_callback(self._on_delivered)
+        if self.dedup is not None:
+            # 删除后以空指纹占位，文档以相同内容重新写入时不会被误判为未变化
+            future.add_callback(lambda _: self.dedup.record(key, b''))
+        self.stats.incr('tombstones')
+        return future
+
+    def _rotate_producer(self, changes: Dict[str, Any]) -> None:
+        """
+        用新配置轮换底层 KafkaProducer：先从连接池获取新配置的实例，再释放本实例对旧实例的引用。
+
+        旧实例可能仍被其他生产者共享，不对它 flush（会阻塞等待其他生产者的消息）；最后一个引用释放时
+        连接池关闭旧实例，最多等待 rotate_timeout 秒，超时未确认的消息以投递失败回调，由游标跟踪器或落盘缓冲处理。
+        获取新实例失败时保留旧实例与旧配置。
+        """
+        config = dict(self.producer_config, **changes)
+        try:
+            producer = KafkaProducerPool.acquire(config, factory=type(self).producer_factory)
+        except KafkaError as e:
+            self.logger.warning(f"[Kafka] 按新配置 {changes} 创建生产者失败，继续使用当前生产者：{e}")
+            return
+        old, self.producer, self.producer_config = self.producer, producer, config
+        self.partitioner = getattr(producer, 'config', config).get('partitioner')
+        try:
+            KafkaProducerPool.release(old, timeout=self.rotate_timeout)
+        except Exception as e:
+            self.logger.warning(f"[Kafka] 释放轮换前的生产者失败：{e}")
+        self.stats.incr('producer_rotations')
+
+    def _offload(self, message: Dict[str, Any], value: bytes, headers: Optional[List[tuple]]):
+        """
+        外置超大消息的大字段并重新序列化
+
+        :return: (新的消息体, 追加了 claim_check 引用的 headers)；没有可外置字段时原样返回
+        """
+        with self.stats.timer('offload'):
+            message, refs = self.claim_check.offload(message, len(value))
+            if not refs:
+                return value, headers
+            value = self.value_serialize(message)
+        self.stats.incr('offloaded_messages')
+        self.stats.observe('offloaded_bytes', [ref['size'] for ref in refs])
+        return value, (headers or []) + [(CLAIM_CHECK_HEADER, json.dumps(refs).encode('utf-8'))]
+
+    def _on_delivered(self, record_metadata) -> None:
+        """
+        投递成功回调（I/O 线程）：按分区统计发送条数（落盘的消息不计入）
+        """
+        if record_metadata is not SPOOLED:
+            self.stats.incr(f'partition_{record_metadata.partition}')
+
+    def read_fields(self) -> Optional[List[str]]:
+        """
+        需要从数据源读取的字段：配置了字段映射时由映射规格的 source 推导，否则取 source_fields 声明；
+        再并入 key 策略读取的字段（未声明 fields 的自定义策略无法推导，读取整篇文档）
+        """
+        if self.field_mapping is not None:
+            fields = mapping_sources(self.field_mapping)
+        elif self.source_fields:
+            fields = list(self.source_fields)
+        else:
+            return None
+        if self.key_strategy is not None:
+            key_fields = getattr(self.key_strategy, 'fields', None)
+            if key_fields is None:
+                return None
+            fields += [field for field in key_fields if field not in fields]
+        return fields
+
+    # ---------------- 内容去重 ----------------
+    def dedup_key(self, message: Dict[str, Any]) -> Optional[str]:
+        """
+        内容去重使用的文档标识，默认取 transform 后消息的 uid；返回 None 的消息总是发送
+        """
+        uid = message.get('uid')
+        return None if uid is None else str(uid)
+
+    def before_cursor_commit(self) -> None:
+        """
+        游标提交前的持久化：落盘缓冲 fsync，去重索引写入已确认消息的指纹
+        （两者都保证游标越过的消息在下次运行时不会丢失或被错误跳过）
+        """
+        if self.spool is not None:
+            self.spool.sync()
+        if self.dedup is not None:
+            self.dedup.commit()
+
+    # ---------------- 本地落盘缓冲 ----------------
+    def _send_or_spool(self, topic: str, value: bytes = None, key: bytes = None, headers: list = None):
+        """
+        与 producer.send 签名一致的发送方法：发送失败（如 broker 不可达、缓冲区满导致阻塞超时）
+        或最终投递失败时把消息写入落盘缓冲，并以 SPOOLED 作为投递结果返回，
+        游标可以越过已落盘的消息（提交游标前需调用 spool.sync()）。
+        """
+        outer = DeliveryFuture()
+        if not self.drain_spool():
+            # 熔断期间，或落盘缓冲尚未重放完：新消息继续追加到落盘缓冲之后，不越过旧消息
+            return self._spool_record(outer, value, key, headers)
+        try:
+            future = self.producer.send(topic, value=value, key=key, headers=headers)
+        except KafkaError as e:
+            self.logger.warning(f"[Kafka] 发送失败，{self.spool_retry_seconds} 秒内消息写入本地落盘缓冲：{e}")
+            self._spool_until = time.monotonic() + self.spool_retry_seconds
+            return self._spool_record(outer, value, key, headers)
+
+        def on_error(exception):
+            self._spool_until = time.monotonic() + self.spool_retry_seconds
+            self._spool_record(outer, value, key, headers)
+
+        future.add_callback(outer.success)
+        future.add_errback(on_error)
+        return outer
+
+    def _spool_record(self, outer: DeliveryFuture, value: bytes, key: bytes, headers: list) -> DeliveryFuture:
+        self.spool.append(value, key, headers)
+        self._spool_pending = True
+        self.stats.incr('spooled')
+        outer.success(SPOOLED)
+        return outer
+
+    def replay_spool(self, timeout: float = 60.0) -> int:
+        """
+        把落盘缓冲中的消息全速重放到 Kafka（在发送新数据之前调用，保证顺序）
+
+        :return: 重放的消息条数；broker 仍不可用时记录日志、重新进入熔断并返回 0，落盘数据保留到下次重放
+        """
+        if self.spool is None:
+            return 0
+        if self._spool_pending is None:
+            self._spool_pending = self.spool.pending()
+        if not self._spool_pending:
+            return 0
+        # 先清除标记：重放期间投递失败回调追加的记录会重新设置
+        self._spool_pending = False
+        try:
+            replayed = self.spool.drain(self.producer, timeout=timeout)
+        except KafkaError as e:
+            self._spool_pending = True
+            self._spool_until = time.monotonic() + self.spool_retry_seconds
+            self.logger.warning(f"[Kafka] 落盘缓冲重放失败，保留到下次重放：{e}")
+            return 0
+        self.stats.incr('replayed', replayed)
+        return replayed
+
+    def drain_spool(self) -> bool:
+        """
+        熔断结束后先按顺序重放落盘缓冲，之后才恢复直接发送，保证新消息不会先于落盘的旧消息到达 broker
+        （_send_or_spool 每次发送前调用，实时同步在每轮监听中调用）
+
+        :return: 是否可以直接发送：未开启落盘缓冲，或不在熔断期间且落盘缓冲已清空
+        """
+        if self.spool is None:
+            return True
+        if time.monotonic() < self._spool_until:
+            return False
+        self.replay_spool()
+        return not self._spool_pending
+
+    def message_headers(self) -> Optional[List[tuple]]:
+        """
+        随消息发送的 Kafka headers：序列化器声明的 headers（如 avro 模式的 schema_id）
+        与应用层压缩器的 headers（如 zstd_dict_id）
+        """
+        headers = []
+        if self.serializer is not None and self.serializer.headers:
+            headers.extend(self.serializer.headers)
+        if self.codec is not None:
+            headers.extend(self.codec.headers)
+        return headers or None
+
+    def transform_batch(self, docs: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        批量数据转换，默认逐条调用 transform()（配置了字段映射时调用映射函数）；子类可重写为整批处理
+        """
+        transform = self.mapper or self.transform
+        return [transform(doc) for doc in docs]
+
+    def serialize_batch(self, messages: Sequence[Any]) -> List[bytes]:
+        """
+        批量序列化，默认逐条调用 value_serialize()；子类可重写为整批处理。
+        开启多进程序列化且批次大于一个分片时，交由进程池并行执行。
+        """
+        if self.serialize_workers > 1 and len(messages) > self.serialize_chunk_size:
+            if self._pool_serializer is None:
+                self._pool_serializer = ProcessPoolSerializer(
+                    self, self.serialize_workers, self.serialize_chunk_size
+                )
+            with self.stats.timer('serialize'):
+                return self._pool_serializer.serialize(messages)
+
+        value_serialize = self.value_serialize
+        with self.stats.timer('serialize'):
+            return [value_serialize(message) for message in messages]
+
     def flush_and_close(self, timeout: float = 30.0):
         """
-        刷新并关闭生产者连接
+        刷新并释放生产者连接（共享实例在最后一个使用者释放时才真正关闭）
         """
         self.producer.flush(timeout=timeout)
-        self.producer.close()
+        KafkaProducerPool.release(self.producer, timeout=timeout)
+        if self.spool is not None:
+            self.spool.close()
+        if self.dedup is not None:
+            self.dedup.close()
+        if self._pool_serializer is not None:
+            self._pool_serializer.close()
+            self._pool_serializer = None
 
     # ---------------- 抽象方法（子类必须实现） ----------------
     @abstractmethod
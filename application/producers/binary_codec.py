@@ -0,0 +1,308 @@
+"""
+紧凑二进制编码（Avro 二进制格式）
+
+- model_to_schema()：由 Pydantic 数据结构模型推导 Avro schema
+- compile_encoder() / compile_decoder()：把 schema 预编译成编码/解码函数，避免逐条解释 schema
+- decode_message()：供消费端使用，按 Kafka header 中的 schema id 解码消息
+
+类型映射：str -> string，int -> long，float -> double，bool -> boolean，Optional[T] -> ["null", T]，
+List[T] -> array，Dict[str, T] -> map，嵌套模型 -> record；Any 无法用 Avro 表达，
+编码为带 logicalType=json 的 string（JSON 文本）。
+"""
+import json
+import struct
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel
+
+from application.producers.compression import decompress_value
+from application.producers.schema_registry import FileSchemaRegistry
+from application.utils.lazy_bson import json_default
+
+# 携带 schema id 的 Kafka header 名
+SCHEMA_ID_HEADER = 'schema_id'
+
+_JSON_STRING = {'type': 'string', 'logicalType': 'json'}
+_PRIMITIVES = {str: 'string', int: 'long', float: 'double', bool: 'boolean', bytes: 'bytes'}
+_DOUBLE = struct.Struct('<d')
+
+_json_encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=json_default).encode
+
+
+# ---------------- schema 推导 ----------------
+def _annotation_to_schema(annotation, named: Dict[str, dict]):
+    if annotation in _PRIMITIVES:
+        return _PRIMITIVES[annotation]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return model_to_schema(annotation, named)
+
+    origin, args = get_origin(annotation), get_args(annotation)
+    if origin is Union:
+        members = [arg for arg in args if arg is not type(None)]
+        if len(members) == 1:
+            inner = _annotation_to_schema(members[0], named)
+            return ['null', inner] if type(None) in args else inner
+    if origin in (list, List) and args:
+        return {'type': 'array', 'items': _annotation_to_schema(args[0], named)}
+    if origin in (dict, Dict) and len(args) == 2 and args[0] is str:
+        return {'type': 'map', 'values': _annotation_to_schema(args[1], named)}
+    # Any 以及无法映射的类型统一按 JSON 文本处理
+    return dict(_JSON_STRING)
+
+
+def model_to_schema(model: Type[BaseModel], named: Dict[str, dict] = None):
+    """
+    由 Pydantic 模型推导 Avro record schema（字段顺序与模型一致）
+
+    :param model: 数据结构模型类
+    :param named: 已定义的具名类型（同名 record 只定义一次，再次出现时按名称引用）
+    """
+    named = {} if named is None else named
+    if model.__name__ in named:
+        return model.__name__
+
+    schema = {'type': 'record', 'name': model.__name__, 'fields': []}
+    named[model.__name__] = schema
+    for name, field in model.model_fields.items():
+        item = {'name': name, 'type': _annotation_to_schema(field.annotation, named)}
+        if not field.is_required():
+            default = field.default_factory() if field.default_factory is not None else field.default
+            try:
+                json.dumps(default)
+                item['default'] = default
+            except TypeError:
+                pass
+        schema['fields'].append(item)
+    return schema
+
+
+# ---------------- 编码 ----------------
+def _write_long(out: bytearray, n: int) -> None:
+    """
+    zigzag + 变长整数编码
+    """
+    n = (n << 1) ^ (n >> 63)
+    while n & ~0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _build_encoder(schema, named: Dict[str, Any]) -> Callable[[bytearray, Any], None]:
+    if isinstance(schema, str) and schema in named:
+        # 具名类型引用：延迟取值，支持递归结构
+        return lambda out, value: named[schema](out, value)
+
+    if isinstance(schema, list):
+        branches = [_build_encoder(branch, named) for branch in schema]
+        if len(schema) == 2 and schema[0] == 'null':
+            encode_value = branches[1]
+
+            def encode_nullable(out, value):
+                if value is None:
+                    out.append(0)
+                else:
+                    out.append(2)
+                    encode_value(out, value)
+            return encode_nullable
+        raise ValueError(f'仅支持 ["null", T] 形式的 union：{schema}')
+
+    kind = schema['type'] if isinstance(schema, dict) else schema
+    if kind == 'string':
+        if isinstance(schema, dict) and schema.get('logicalType') == 'json':
+            def encode_json(out, value):
+                data = _json_encode(value).encode('utf-8')
+                _write_long(out, len(data))
+                out += data
+            return encode_json
+
+        def encode_string(out, value):
+            data = value.encode('utf-8')
+            _write_long(out, len(data))
+            out += data
+        return encode_string
+    if kind == 'bytes':
+        def encode_bytes(out, value):
+            _write_long(out, len(value))
+            out += value
+        return encode_bytes
+    if kind == 'long':
+        return _write_long
+    if kind == 'double':
+        return lambda out, value: out.extend(_DOUBLE.pack(value))
+    if kind == 'boolean':
+        return lambda out, value: out.append(1 if value else 0)
+    if kind == 'null':
+        return lambda out, value: None
+    if kind == 'array':
+        encode_item = _build_encoder(schema['items'], named)
+
+        def encode_array(out, value):
+            if value:
+                _write_long(out, len(value))
+                for item in value:
+                    encode_item(out, item)
+            out.append(0)
+        return encode_array
+    if kind == 'map':
+        encode_item = _build_encoder(schema['values'], named)
+
+        def encode_map(out, value):
+            if value:
+                _write_long(out, len(value))
+                for key, item in value.items():
+                    data = key.encode('utf-8')
+                    _write_long(out, len(data))
+                    out += data
+                    encode_item(out, item)
+            out.append(0)
+        return encode_map
+    if kind == 'record':
+        fields = []
+        named[schema['name']] = None
+        for field in schema['fields']:
+            fields.append((field['name'], _build_encoder(field['type'], named)))
+
+        def encode_record(out, value):
+            for name, encode_field in fields:
+                encode_field(out, value[name])
+        named[schema['name']] = encode_record
+        return encode_record
+    raise ValueError(f'不支持的 Avro 类型：{schema}')
+
+
+def compile_encoder(schema) -> Callable[[Dict[str, Any]], bytes]:
+    """
+    预编译编码函数：dict -> Avro 二进制字节
+    """
+    encode_root = _build_encoder(schema, {})
+
+    def encode(value) -> bytes:
+        out = bytearray()
+        encode_root(out, value)
+        return bytes(out)
+    return encode
+
+
+# ---------------- 解码 ----------------
+def _read_long(buf, pos: int) -> Tuple[int, int]:
+    shift = 0
+    result = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    return (result >> 1) ^ -(result & 1), pos
+
+
+def _build_decoder(schema, named: Dict[str, Any]):
+    if isinstance(schema, str) and schema in named:
+        return lambda buf, pos: named[schema](buf, pos)
+
+    if isinstance(schema, list):
+        branches = [_build_decoder(branch, named) for branch in schema]
+
+        def decode_union(buf, pos):
+            index, pos = _read_long(buf, pos)
+            return branches[index](buf, pos)
+        return decode_union
+
+    kind = schema['type'] if isinstance(schema, dict) else schema
+    if kind in ('string', 'bytes'):
+        as_json = isinstance(schema, dict) and schema.get('logicalType') == 'json'
+
+        def decode_string(buf, pos):
+            size, pos = _read_long(buf, pos)
+            data = bytes(buf[pos:pos + size])
+            if kind == 'bytes':
+                return data, pos + size
+            text = data.decode('utf-8')
+            return (json.loads(text) if as_json else text), pos + size
+        return decode_string
+    if kind == 'long':
+        return _read_long
+    if kind == 'double':
+        return lambda buf, pos: (_DOUBLE.unpack_from(buf, pos)[0], pos + 8)
+    if kind == 'boolean':
+        return lambda buf, pos: (buf[pos] == 1, pos + 1)
+    if kind == 'null':
+        return lambda buf, pos: (None, pos)
+    if kind in ('array', 'map'):
+        decode_item = _build_decoder(schema['items' if kind == 'array' else 'values'], named)
+        decode_key = _build_decoder('string', named)
+
+        def decode_blocks(buf, pos):
+            items = [] if kind == 'array' else {}
+            while True:
+                count, pos = _read_long(buf, pos)
+                if count == 0:
+                    return items, pos
+                if count < 0:
+                    # 负数块长度后跟块字节数
+                    count = -count
+                    _, pos = _read_long(buf, pos)
+                for _ in range(count):
+                    if kind == 'array':
+                        item, pos = decode_item(buf, pos)
+                        items.append(item)
+                    else:
+                        key, pos = decode_key(buf, pos)
+                        items[key], pos = decode_item(buf, pos)
+        return decode_blocks
+    if kind == 'record':
+        named[schema['name']] = None
+        fields = [(field['name'], _build_decoder(field['type'], named)) for field in schema['fields']]
+
+        def decode_record(buf, pos):
+            record = {}
+            for name, decode_field in fields:
+                record[name], pos = decode_field(buf, pos)
+            return record, pos
+        named[schema['name']] = decode_record
+        return decode_record
+    raise ValueError(f'不支持的 Avro 类型：{schema}')
+
+
+def compile_decoder(schema) -> Callable[[bytes], Dict[str, Any]]:
+    """
+    预编译解码函数：Avro 二进制字节 -> dict
+    """
+    decode_root = _build_decoder(schema, {})
+
+    def decode(data: bytes):
+        value, _ = decode_root(memoryview(data), 0)
+        return value
+    return decode
+
+
+# ---------------- 消费端辅助 ----------------
+_decoders: Dict[int, Callable[[bytes], Dict[str, Any]]] = {}
+
+
+def decode_message(value: bytes, headers: Optional[List[tuple]] = None, registry=None) -> Any:
+    """
+    解码一条 Kafka 消息：带 zstd_dict_id header 的先按字典解压；
+    带 schema_id header 的按二进制格式解码，否则按 JSON 解析
+
+    :param value: 消息 value，tombstone（删除标记）为 None
+    :param headers: 消息 headers，形如 [('schema_id', b'1')]
+    :param registry: schema 注册表，默认使用本地文件注册表
+    :return: 解码后的消息；tombstone 返回 None
+    """
+    if value is None:
+        return None
+    value = decompress_value(value, headers)
+    schema_id = None
+    for key, header_value in headers or []:
+        if key == SCHEMA_ID_HEADER:
+            schema_id = int(header_value)
+            break
+    if schema_id is None:
+        return json.loads(value)
+
+    if schema_id not in _decoders:
+        _decoders[schema_id] = compile_decoder((registry or FileSchemaRegistry()).get(schema_id))
+    return _decoders[schema_id](value)
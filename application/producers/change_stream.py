@@ -0,0 +1,179 @@
+"""
+MongoDB change stream 实时同步
+
+持续监听集合的 change stream（需要副本集），把变更转换为 Kafka 消息：
+
+    insert / update / replace   upsert：fullDocument（update 通过 updateLookup 取回整篇文档）
+                                经 transform / value_serialize 发送
+    delete                      tombstone：value 为空的消息（见 BaseKafkaProducer.send_tombstone）
+
+消息 key 固定为文档 `_id`，upsert 与 tombstone 一致，压缩主题（cleanup.policy=compact）据此保留每个文档的最新状态。
+
+开启落盘缓冲时，broker 中断期间的变更写入落盘缓冲；监听循环每轮先按顺序重放落盘缓冲（熔断到期后），
+再发送新变更，保证同一文档的变更在主题中保持顺序。
+
+resume token 作为游标位置交给 AckCursorTracker，只有此前的变更全部确认后才提交（bson.json_util 编码后
+保存到游标管理器），进程重启后从该 token 续传（at-least-once）。
+
+延迟：try_next() 的服务端等待 max_await_ms 与每批聚合时间 max_batch_ms 都很短，配合低 linger_ms 的
+settings.STREAM_PRODUCER_CONFIG，Mongo 写入到 Kafka 确认在 1 秒以内；实际延迟以直方图 ack_latency_ms 计入运行统计。
+"""
+import threading
+import time
+from datetime import timezone
+from typing import Any, Dict, List, Optional
+
+from bson import json_util
+
+from application.cursor_model.ack_tracker import AckCursorTracker
+from application.utils.logger import get_logger
+
+UPSERT_OPERATIONS = ('insert', 'update', 'replace')
+DELETE_OPERATIONS = ('delete',)
+
+
+def encode_resume_token(token: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    resume token -> 可写入游标文件的字符串
+    """
+    return None if token is None else json_util.dumps(token)
+
+
+def decode_resume_token(value: Optional[str]) -> Optional[Dict[str, Any]]:
+    return json_util.loads(value) if value else None
+
+
+def _event_time(event: Dict[str, Any]) -> Optional[float]:
+    """
+    变更发生时间（秒）：优先 wallTime（MongoDB 6.0+，毫秒精度），否则取 clusterTime（秒精度）
+    """
+    wall_time = event.get('wallTime')
+    if wall_time is not None:
+        # pymongo 默认返回不带时区的 UTC 时间
+        return (wall_time if wall_time.tzinfo else wall_time.replace(tzinfo=timezone.utc)).timestamp()
+    cluster_time = event.get('clusterTime')
+    return None if cluster_time is None else float(cluster_time.time)
+
+
+class ChangeStreamTailer:
+    """
+    change stream 监听循环：按小批次聚合变更并发送，投递确认后推进 resume token
+    """
+
+    logger = get_logger("change_stream")
+
+    def __init__(self,
+                 producer,
+                 collection,
+                 pipeline: List[dict] = None,
+                 batch_size: int = 500,
+                 max_await_ms: int = 200,
+                 max_batch_ms: int = 50):
+        """
+        :param producer: BaseKafkaProducer 子类实例（复用 transform / value_serialize 钩子）
+        :param collection: pymongo Collection（或提供 watch() 的替身）
+        :param pipeline: 追加到变更过滤条件之后的聚合管道，如 [{'$match': {'fullDocument.marc_code': 'zh'}}]
+        :param batch_size: 每批最多聚合的变更条数
+        :param max_await_ms: 没有新变更时 getMore 在服务端等待的毫秒数
+        :param max_batch_ms: 收到第一条变更后最多再聚合多少毫秒（控制延迟）
+        """
+        self.producer = producer
+        self.collection = collection
+        self.pipeline = pipeline or []
+        self.batch_size = batch_size
+        self.max_await_ms = max_await_ms
+        self.max_batch_ms = max_batch_ms
+
+    def watch(self, resume_token: Optional[Dict[str, Any]]):
+        """
+        打开 change stream：只关注增删改事件，update 事件取回整篇文档
+        """
+        operations = list(UPSERT_OPERATIONS + DELETE_OPERATIONS)
+        return self.collection.watch(
+            pipeline=[{'$match': {'operationType': {'$in': operations}}}] + self.pipeline,
+            full_document='updateLookup',
+            resume_after=resume_token,
+            max_await_time_ms=self.max_await_ms,
+        )
+
+    def run(self, tracker: AckCursorTracker, stop: threading.Event = None, max_events: int = None) -> int:
+        """
+        从 tracker 的已提交位置（resume token）开始监听，直到 stop 被设置、达到 max_events 或 stream 失效
+
+        :param tracker: 游标跟踪器，位置为编码后的 resume token
+        :param stop: 停止信号（其他线程 set() 后在当前批次结束时退出）
+        :param max_events: 最多处理的变更条数，None 表示不限（测试与一次性追赶使用）
+        :return: 处理的变更条数
+        """
+        resume_token = decode_resume_token(tracker.committed_position)
+        self.logger.info(f"[ChangeStream] 开始监听 {self.collection.name}，resume token：{resume_token}")
+        handled = 0
+        with self.watch(resume_token) as stream:
+            while stream.alive and not (stop is not None and stop.is_set()):
+                events = self._poll(stream)
+                # broker 恢复后先按顺序重放中断期间落盘的变更，再发送新变更（没有新变更时同样重放），
+                # 避免旧的 upsert / tombstone 在压缩主题中排到新变更之后
+                self.producer.drain_spool()
+                if events:
+                    self._send(events, tracker)
+                    handled += len(events)
+                tracker.maybe_checkpoint()
+                if max_events is not None and handled >= max_events:
+                    break
+        return handled
+
+    def _poll(self, stream) -> List[Dict[str, Any]]:
+        """
+        聚合一批变更：第一条最多等待 max_await_ms，之后最多再聚合 max_batch_ms 或 batch_size 条
+        """
+        events = []
+        deadline = None
+        while len(events) < self.batch_size:
+            event = stream.try_next()
+            if event is None:
+                break
+            events.append(event)
+            if deadline is None:
+                deadline = time.monotonic() + self.max_batch_ms / 1000
+            elif time.monotonic() >= deadline:
+                break
+        return events
+
+    def _send(self, events: List[Dict[str, Any]], tracker: AckCursorTracker) -> None:
+        """
+        按变更顺序发送：连续的 upsert 整批走 send_batch()，delete 发送 tombstone
+        """
+        producer = self.producer
+        stats = producer.stats
+        docs, keys, positions, origins = [], [], [], []
+
+        def track(position: str, future, origin: Optional[float]) -> None:
+            tracker.track(position, future)
+            if origin is not None:
+                future.add_callback(
+                    lambda _: stats.observe('ack_latency_ms', [max(int((time.time() - origin) * 1000), 0)]))
+
+        def flush_upserts() -> None:
+            if not docs:
+                return
+            result = producer.send_batch(docs, keys=keys)
+            for position, future, origin in zip(positions, result.futures, origins):
+                track(position, future, origin)
+            for items in (docs, keys, positions, origins):
+                items.clear()
+
+        for event in events:
+            position = encode_resume_token(event['_id'])
+            key = str(event['documentKey']['_id'])
+            document = event.get('fullDocument')
+            if event['operationType'] in DELETE_OPERATIONS or document is None:
+                # updateLookup 时文档已被删除同样发送 tombstone（随后的 delete 事件会再发送一次，幂等）
+                flush_upserts()
+                track(position, producer.send_tombstone(key), _event_time(event))
+            else:
+                docs.append(document)
+                keys.append(key)
+                positions.append(position)
+                origins.append(_event_time(event))
+        flush_upserts()
+        stats.incr('change_events', len(events))
@@ -0,0 +1,178 @@
+"""
+大字段外置（claim check）
+
+消息序列化后超过阈值时，把声明的大字段（如 info_section、link_data）写入按内容 sha256 寻址的
+blob 存储，消息中该字段置为空值，并通过 claim_check header 携带引用：
+
+    [{"path": "data.info_section", "store": "file", "sha256": "<hex>", "size": 123456}]
+
+消息体仍符合原数据结构（各序列化模式均可用），消费端用 rehydrate() 取回字段并校验哈希。
+blob 存储可插拔：实现 BaseBlobStore 并注册到 BLOB_STORES。
+"""
+import hashlib
+import json
+import os
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+from typing import Any, Dict, List, Optional, Tuple
+
+from application.config import BLOB_STORE_PATH
+
+# 外置字段引用的消息 header
+CLAIM_CHECK_HEADER = 'claim_check'
+
+
+class BaseBlobStore(ABC):
+    """
+    按内容寻址的 blob 存储：同一内容只保存一份
+    """
+
+    name = None
+
+    @abstractmethod
+    def put(self, digest: str, data: bytes) -> None:
+        """
+        保存内容（digest 为 data 的 sha256 十六进制串，已存在时可直接跳过）
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, digest: str) -> bytes:
+        raise NotImplementedError
+
+
+class FileBlobStore(BaseBlobStore):
+    """
+    本地文件 blob 存储：`runtime/blobs/<sha256 前两位>/<sha256>`
+    """
+
+    name = 'file'
+
+    def __init__(self, root_path: str = None):
+        self.root_path = root_path or BLOB_STORE_PATH
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root_path, digest[:2], digest)
+
+    def put(self, digest: str, data: bytes) -> None:
+        path = self._path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再改名，读取方不会看到写了一半的内容
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, digest: str) -> bytes:
+        with open(self._path(digest), 'rb') as f:
+            return f.read()
+
+
+# blob 存储注册表：名称 -> 类
+BLOB_STORES = {
+    FileBlobStore.name: FileBlobStore,
+}
+
+
+def _lookup(message: Dict[str, Any], field: str) -> Any:
+    value = message
+    for name in field.split('.'):
+        if not isinstance(value, Mapping):
+            return None
+        value = value.get(name)
+    return value
+
+
+def _encode_field(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=_field_default).encode('utf-8')
+
+
+def _field_default(value: Any) -> Any:
+    # raw 模式的 LazyBSONDocument 子文档展开为 dict，其余类型（datetime 等）转为字符串
+    return dict(value.items()) if isinstance(value, Mapping) else str(value)
+
+
+class ClaimCheck:
+    """
+    按大小外置消息字段
+    """
+
+    def __init__(self, fields: Dict[str, str], threshold: int = 256 * 1024, store: BaseBlobStore = None):
+        """
+        :param fields: 可外置的字段：消息字段名（可用 . 表示嵌套）-> 消息体中的路径（如 {'info_section': 'data.info_section'}）
+        :param threshold: 序列化后超过该字节数的消息才外置字段
+        :param store: blob 存储，默认本地文件存储
+        """
+        self.fields = fields
+        self.threshold = threshold
+        self.store = store or FileBlobStore()
+
+    def offload(self, message: Dict[str, Any], size: int) -> Tuple[Dict[str, Any], List[dict]]:
+        """
+        按字段大小从大到小外置，直到预计大小不超过阈值
+
+        :param message: transform 后的消息（不会被修改）
+        :param size: 消息序列化后的字节数
+        :return: (外置后的消息副本, 引用列表)；没有可外置字段时引用列表为空
+        """
+        candidates = []
+        for field, path in self.fields.items():
+            value = _lookup(message, field)
+            if value:
+                candidates.append((field, path, value, _encode_field(value)))
+        candidates.sort(key=lambda item: len(item[3]), reverse=True)
+
+        message = dict(message)
+        refs = []
+        for field, path, value, data in candidates:
+            if size <= self.threshold:
+                break
+            digest = hashlib.sha256(data).hexdigest()
+            self.store.put(digest, data)
+            *parents, leaf = field.split('.')
+            target = message
+            for name in parents:
+                # 嵌套字段逐层复制，不修改原消息
+                target[name] = dict(target[name])
+                target = target[name]
+            target[leaf] = {} if isinstance(value, Mapping) else type(value)()
+            refs.append({'path': path, 'store': self.store.name, 'sha256': digest, 'size': len(data)})
+            size -= len(data)
+        return message, refs
+
+
+def rehydrate(payload: Dict[str, Any],
+              headers: Optional[List[tuple]] = None,
+              stores: Dict[str, BaseBlobStore] = None) -> Dict[str, Any]:
+    """
+    消费端还原外置字段：按 claim_check header 从 blob 存储取回内容、校验 sha256 并写回原路径
+
+    :param payload: 解码后的消息体（如 decode_message() 的返回值），原地修改
+    :param headers: 消息 headers
+    :param stores: blob 存储实例，默认按注册表创建
+    :return: 还原后的消息体
+    """
+    refs = None
+    for key, header_value in headers or []:
+        if key == CLAIM_CHECK_HEADER:
+            refs = json.loads(header_value)
+            break
+    if not refs:
+        return payload
+
+    stores = stores or {}
+    for ref in refs:
+        store = stores.get(ref['store'])
+        if store is None:
+            store = stores[ref['store']] = BLOB_STORES[ref['store']]()
+        data = store.get(ref['sha256'])
+        if hashlib.sha256(data).hexdigest() != ref['sha256']:
+            raise ValueError(f"外置字段 {ref['path']} 内容校验失败：{ref['sha256']}")
+        *parents, leaf = ref['path'].split('.')
+        target = payload
+        for name in parents:
+            target = target[name]
+        target[leaf] = json.loads(data)
+    return payload
@@ -0,0 +1,146 @@
+"""
+消息压缩
+
+两种方式（按 topic 在 settings.TOPIC_COMPRESSION 中选择）：
+    gzip / snappy / lz4 / zstd   KafkaProducer 的 compression_type，对整个 record batch 压缩
+    zstd_dict                    应用层压缩：用采样消息训练的 zstd 字典逐条压缩 value，
+                                 header 携带字典 id；小而重复的中文 JSON 单条即可获得高压缩率，
+                                 此时关闭 KafkaProducer 的压缩，避免重复压缩
+
+字典保存在 runtime/compression/dictionaries/<dict_id>.dict，生产端与消费端按 id 加载。
+zstandard 为可选依赖，仅在使用 zstd / zstd_dict 时需要安装。
+"""
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+from application.config import COMPRESSION_DICT_PATH
+
+# 应用层字典压缩的消息 header，值为字典 id
+ZSTD_DICT_HEADER = 'zstd_dict_id'
+# KafkaProducer 支持的整批压缩方式
+PRODUCER_CODECS = ('gzip', 'snappy', 'lz4', 'zstd')
+
+
+def _require_zstandard() -> None:
+    if zstandard is None:
+        raise ImportError('zstd 字典压缩需要安装 zstandard：pip install zstandard')
+
+
+class FileDictionaryStore:
+    """
+    本地文件字典仓库：每个字典一个 `<dict_id>.dict` 文件
+    """
+
+    def __init__(self, root_path: str = None):
+        """
+        :param root_path: 字典目录，默认 runtime/compression/dictionaries
+        """
+        self.root_path = root_path or COMPRESSION_DICT_PATH
+
+    def save(self, dictionary: bytes) -> int:
+        """
+        保存字典，返回 zstd 字典 id（由字典内容决定，重复保存同一字典得到同一 id）
+        """
+        _require_zstandard()
+        dict_id = zstandard.ZstdCompressionDict(dictionary).dict_id()
+        os.makedirs(self.root_path, exist_ok=True)
+        path = os.path.join(self.root_path, f'{dict_id}.dict')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(dictionary)
+        os.replace(tmp_path, path)
+        return dict_id
+
+    def load(self, dict_id: int) -> bytes:
+        path = os.path.join(self.root_path, f'{dict_id}.dict')
+        if not os.path.exists(path):
+            raise KeyError(f'未找到 zstd 字典：{dict_id}（{path}）')
+        with open(path, 'rb') as f:
+            return f.read()
+
+
+def train_dictionary(samples: List[bytes], dict_size: int = 112640) -> bytes:
+    """
+    用采样消息训练 zstd 字典
+
+    :param samples: 已序列化的消息样本（建议数千条）
+    :param dict_size: 字典大小上限（字节）
+    """
+    _require_zstandard()
+    return zstandard.train_dictionary(dict_size, samples).as_bytes()
+
+
+class ZstdDictCodec:
+    """
+    应用层 zstd 字典压缩（非线程安全，在发送线程中使用）
+    """
+
+    def __init__(self, dict_id: int, level: int = 3, store: FileDictionaryStore = None):
+        """
+        :param dict_id: 字典 id（见 FileDictionaryStore.save）
+        :param level: zstd 压缩级别
+        :param store: 字典仓库，默认本地文件仓库
+        """
+        _require_zstandard()
+        self.dict_id = int(dict_id)
+        self.level = level
+        dictionary = zstandard.ZstdCompressionDict((store or FileDictionaryStore()).load(self.dict_id))
+        dictionary.precompute_compress(level=level)
+        # 字典 id 已由 header 携带，帧内不再重复写入
+        self._compressor = zstandard.ZstdCompressor(level=level, dict_data=dictionary, write_dict_id=False)
+        self.headers = [(ZSTD_DICT_HEADER, str(self.dict_id).encode('utf-8'))]
+
+    def compress(self, value: bytes) -> bytes:
+        return self._compressor.compress(value)
+
+    def compress_batch(self, values: Iterable[bytes]) -> List[bytes]:
+        compress = self._compressor.compress
+        return [compress(value) for value in values]
+
+
+def resolve_compression(options: Dict[str, Any]) -> Tuple[Optional[str], Optional[ZstdDictCodec]]:
+    """
+    解析 topic 的压缩配置
+
+    :param options: 如 {'codec': 'lz4'}、{'codec': 'zstd_dict', 'dict_id': 123, 'level': 3}、{'codec': 'none'}
+    :return: (KafkaProducer 的 compression_type, 应用层压缩器)
+    """
+    codec = options.get('codec')
+    if codec == 'zstd_dict':
+        return None, ZstdDictCodec(options['dict_id'], level=options.get('level', 3))
+    if codec in (None, 'none'):
+        return None, None
+    if codec not in PRODUCER_CODECS:
+        raise ValueError(f'不支持的压缩方式：{codec}，可选：{PRODUCER_CODECS + ("zstd_dict", "none")}')
+    return codec, None
+
+
+_decompressors: Dict[int, Any] = {}
+
+
+def decompress_value(value: bytes, headers: Optional[List[tuple]] = None, store: FileDictionaryStore = None) -> bytes:
+    """
+    消费端解压：带 zstd_dict_id header 的消息按对应字典解压，否则原样返回
+
+    :param value: 消息 value
+    :param headers: 消息 headers
+    :param store: 字典仓库，默认本地文件仓库
+    """
+    dict_id = None
+    for key, header_value in headers or []:
+        if key == ZSTD_DICT_HEADER:
+            dict_id = int(header_value)
+            break
+    if dict_id is None:
+        return value
+
+    _require_zstandard()
+    if dict_id not in _decompressors:
+        dictionary = zstandard.ZstdCompressionDict((store or FileDictionaryStore()).load(dict_id))
+        _decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+    return _decompressors[dict_id].decompress(value)
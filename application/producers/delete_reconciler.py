@@ -0,0 +1,149 @@
+"""
+删除对账
+
+批量同步只能发现新增（和修改）的文档，无法发现删除。对账任务一次顺序扫描完成：
+
+1. 按 `_id` 升序只读取 `_id`（投影只含 `_id` 并 hint `_id_` 索引，为覆盖查询，不读取文档）
+2. 与上次对账保存的有序 `_id` 快照（见 utils.id_snapshot），以及此后投递过的 id（投递日志）做归并比较：
+   只在快照或投递日志中出现的 id 即已删除的文档，发送 tombstone（BaseKafkaProducer.send_tombstone）。
+   只比较快照时，两次对账之间写入、同步后又删除的文档不在任何一次快照中，永远收不到 tombstone
+3. 扫描到的 id 同时写入新快照；全部 tombstone 确认后原子替换旧快照并删除已合并的投递日志，
+   任一 tombstone 投递失败时保留旧快照与投递日志，下次对账重新发送（tombstone 幂等）
+
+输入都是升序流，内存占用与集合大小无关。
+
+tombstone 的 key 为 str(_id)，只有 upsert 消息同样以 uid（即 str(_id)）为 key 时，压缩主题才能按 key 清除
+被删除文档的历史消息，因此生产者必须使用 key_strategy='uid'（change stream 模式的 upsert 固定以 _id 为 key）。
+"""
+import glob
+import heapq
+import os
+import time
+from threading import Lock
+from typing import Dict, Iterator, List
+
+from bson import ObjectId
+
+from application.config import ID_SNAPSHOT_PATH
+from application.producers.partitioners import KEY_STRATEGIES
+from application.utils.id_snapshot import IdSnapshotWriter, read_journal, read_snapshot
+from application.utils.logger import get_logger
+
+
+def scan_ids(collection, batch_size: int = 10000) -> Iterator[ObjectId]:
+    """
+    按升序流式读取集合的全部 `_id`（覆盖索引扫描）
+    """
+    cursor = collection.find({}, {'_id': 1}).sort('_id', 1).hint([('_id', 1)]).batch_size(batch_size)
+    for doc in cursor:
+        yield doc['_id']
+
+
+def snapshot_path_for(topic: str, collection: str) -> str:
+    """
+    默认快照路径 runtime/snapshots/<topic>/<collection>/ids.snap，投递日志 ids.journal 位于同一目录
+    """
+    return os.path.join(ID_SNAPSHOT_PATH, topic, collection, 'ids.snap')
+
+
+def journal_path_for(snapshot_path: str) -> str:
+    return os.path.join(os.path.dirname(snapshot_path), 'ids.journal')
+
+
+def _unique(ids: Iterator[ObjectId]) -> Iterator[ObjectId]:
+    previous = None
+    for oid in ids:
+        if oid != previous:
+            previous = oid
+            yield oid
+
+
+class DeleteReconciler:
+    """
+    按 `_id` 快照归并比较，发现已删除的文档并发送 tombstone
+    """
+
+    logger = get_logger("delete_reconciler")
+
+    def __init__(self, producer, collection, snapshot_path: str = None, journal_path: str = None):
+        """
+        :param producer: BaseKafkaProducer 子类实例（发送 tombstone）
+        :param collection: pymongo Collection（或提供 find() 的替身）
+        :param snapshot_path: 快照文件路径，默认 runtime/snapshots/<topic>/<collection>/ids.snap
+        :param journal_path: 投递日志路径，默认与快照同目录的 ids.journal
+        :raises ValueError: 生产者的 key 策略不是 uid（tombstone 的 key 与 upsert 消息的 key 不一致）
+        """
+        if producer.key_strategy is not KEY_STRATEGIES['uid']:
+            raise ValueError('删除对账发送的 tombstone 以 str(_id) 为 key，生产者需使用 key_strategy=uid，'
+                             '否则 upsert 消息与 tombstone 的 key 不一致，压缩主题无法清除已删除的文档')
+        self.producer = producer
+        self.collection = collection
+        self.snapshot_path = snapshot_path or snapshot_path_for(producer.topic, collection.name)
+        self.journal_path = journal_path or journal_path_for(self.snapshot_path)
+        self._lock = Lock()
+        self._failed = 0
+
+    def _on_error(self, exception) -> None:
+        with self._lock:
+            self._failed += 1
+
+    def run(self, flush_timeout: float = 60.0) -> Dict[str, int]:
+        """
+        执行一次对账
+
+        :return: {'scanned': 本次扫描的 id 数, 'previous': 快照与投递日志中的 id 数, 'deleted': 发送的 tombstone 数}；
+                 tombstone 投递失败时抛出 RuntimeError 且不更新快照
+        """
+        producer = self.producer
+        journals = self._take_journals()
+        writer = IdSnapshotWriter(self.snapshot_path)
+        previous_ids = _unique(heapq.merge(read_snapshot(self.snapshot_path), read_journal(journals)))
+        scanned = previous = deleted = 0
+        try:
+            with producer.stats.timer('reconcile'):
+                old = next(previous_ids, None)
+                for oid in scan_ids(self.collection):
+                    writer.append(oid)
+                    scanned += 1
+                    # 快照中小于当前 id 的都已不在集合中
+                    while old is not None and old < oid:
+                        self._tombstone(old)
+                        previous += 1
+                        deleted += 1
+                        old = next(previous_ids, None)
+                    if old == oid:
+                        previous += 1
+                        old = next(previous_ids, None)
+                while old is not None:
+                    self._tombstone(old)
+                    previous += 1
+                    deleted += 1
+                    old = next(previous_ids, None)
+                producer.producer.flush(timeout=flush_timeout)
+            if self._failed:
+                raise RuntimeError(f'{self._failed} 条 tombstone 投递失败，保留旧快照，下次对账重新发送')
+        except BaseException:
+            writer.abort()
+            raise
+        producer.before_cursor_commit()
+        writer.commit()
+        # 投递日志中的 id 已并入新快照（或已发送 tombstone）
+        for path in journals:
+            os.remove(path)
+
+        summary = {'scanned': scanned, 'previous': previous, 'deleted': deleted}
+        producer.stats.incr('reconcile_deleted', deleted)
+        self.logger.info(f"[Reconcile] 对账完成：{summary}")
+        return summary
+
+    def _take_journals(self) -> List[str]:
+        """
+        把投递日志改名取走（生产者之后的记录写入新日志），连同上次失败遗留的待合并日志一起返回
+        """
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, f'{self.journal_path}.{time.time_ns()}.merging')
+        return sorted(glob.glob(f'{glob.escape(self.journal_path)}.*.merging'))
+
+    def _tombstone(self, oid: ObjectId) -> None:
+        future = self.producer.send_tombstone(str(oid))
+        future.add_errback(self._on_error)
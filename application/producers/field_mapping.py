@@ -0,0 +1,262 @@
+"""
+声明式字段映射
+
+用一份映射规格（YAML 文件或 dict）描述 MongoDB 文档 -> 消息体的转换，代替手写的 transform / build_payload：
+
+    fields:
+      - {target: topic, context: topic}                     # 取生产者上下文（topic / data_type）
+      - {target: uid, source: _id, cleaners: [str]}
+      - {target: name, source: info_name, default: ''}
+      - {target: tag_values, source: column_info, default: '[]', cleaners: [json]}
+      - {target: link_data, source: link_data, default: [], default_when: empty}
+      - target: data.info_date                             # 目标路径用 . 表示嵌套
+        source: info_date                                  # 源路径同样支持 a.b.c
+        default: ''
+        cleaners: [str, {remove: ['来源：', '日期', ' ']}]
+
+字段规则：
+    target              消息体中的路径（必填）
+    source / context / value
+                        取值方式三选一：文档路径 / 生产者上下文 / 常量
+    cleaners            清洗步骤，按顺序执行，见 CLEANERS；值为 None（或缺失）时不执行
+    clean_none          为 true 时值为 None 也执行 cleaners（如 json 把 None 编码为 'null'），
+                        配合 default_when: missing 使用（缺失仍取默认值）
+    default             使用默认值时的取值（不经过 cleaners），未声明时为 None
+    default_when        何时使用默认值：none（缺失或为 None，默认）/ missing（仅缺失，None 原样保留）/
+                        empty（缺失或为空值 ''、[]、0 等）
+
+规格在创建生产者时由 compile_mapping() 编译一次，生成专用函数（取值、清洗、默认值全部展开为内联代码），
+运行时不再逐字段解释规格。生成的代码形如：
+
+    def _map_information(d):
+        v0 = d.get('_id')
+        if v0 is not None:
+            v0 = str(v0)
+        v1 = d.get('info_date')
+        if v1 is None:
+            v1 = ''
+        else:
+            v1 = str(v1).replace('来源：', '').replace('日期', '').replace(' ', '')
+        ...
+        return {'uid': v0, 'data': {'info_date': v1, ...}, ...}
+"""
+import ast
+import json
+import os
+from collections.abc import Mapping
+from functools import partial
+from typing import Any, Callable, Dict, List, Union
+
+from application.config import MAPPING_PATH
+from application.utils.lazy_bson import json_default
+
+# 清洗步骤注册表：名称 -> 代码模板（{v} 为当前值表达式，{arg} 为规格中的参数）或 callable
+CLEANERS: Dict[str, Union[str, Callable]] = {
+    'str': 'str({v})',
+    'int': 'int({v})',
+    'float': 'float({v})',
+    'strip': '{v}.strip()',
+    'lower': '{v}.lower()',
+    'upper': '{v}.upper()',
+    'json': '_json_dumps({v})',
+}
+
+
+def register_cleaner(name: str):
+    """
+    注册自定义清洗函数（接收当前值与规格参数，返回清洗后的值），用法：
+
+        @register_cleaner('digits')
+        def digits(value, arg=None):
+            return ''.join(ch for ch in value if ch.isdigit())
+    """
+
+    def decorator(func: Callable) -> Callable:
+        CLEANERS[name] = func
+        return func
+
+    return decorator
+
+
+def _literal(value: Any) -> str:
+    """
+    常量 -> 源码字面量（每次调用都生成新对象，可变默认值不会在消息间共享）
+    """
+    source = repr(value)
+    try:
+        if ast.literal_eval(source) == value:
+            return source
+    except (ValueError, SyntaxError):
+        pass
+    raise ValueError(f'映射规格中的常量只能是基础类型：{value!r}')
+
+
+def _cleaner_expr(cleaner: Union[str, dict], expr: str, namespace: Dict[str, Any]) -> str:
+    if isinstance(cleaner, dict):
+        if len(cleaner) != 1:
+            raise ValueError(f'清洗步骤格式错误：{cleaner!r}，应为 名称 或 {{名称: 参数}}')
+        (name, arg), = cleaner.items()
+    else:
+        name, arg = cleaner, None
+
+    if name == 'remove':
+        # 删除子串：展开为链式 replace
+        substrings = [arg] if isinstance(arg, str) else list(arg or [])
+        return expr + ''.join(f'.replace({_literal(s)}, \'\')' for s in substrings)
+    if name == 'replace':
+        # 替换子串：{'replace': {'旧': '新'}}
+        return expr + ''.join(f'.replace({_literal(old)}, {_literal(new)})' for old, new in arg.items())
+
+    if name not in CLEANERS:
+        raise ValueError(f'未知的清洗步骤：{name}，可选：{sorted(CLEANERS) + ["remove", "replace"]}')
+    cleaner_impl = CLEANERS[name]
+    if callable(cleaner_impl):
+        func_name = f'_cleaner_{len(namespace)}'
+        namespace[func_name] = cleaner_impl
+        if arg is None:
+            return f'{func_name}({expr})'
+        arg_name = f'_arg_{len(namespace)}'
+        namespace[arg_name] = arg
+        return f'{func_name}({expr}, {arg_name})'
+    return cleaner_impl.format(v=expr, arg=arg)
+
+
+# default_when: missing 时表示"字段缺失"的哨兵
+_MISSING = object()
+DEFAULT_WHEN = ('none', 'missing', 'empty')
+
+
+def _source_expr(path: str, missing: str = 'None') -> str:
+    """
+    文档路径 -> 取值表达式；字段或嵌套路径中间层缺失（不是 dict）时取值为 missing
+    """
+    first, *rest = path.split('.')
+    suffix = '' if missing == 'None' else f', {missing}'
+    expr = f'd.get({first!r}{suffix})'
+    for name in rest:
+        expr = f'_get({expr}, {name!r}{suffix})'
+    return expr
+
+
+def _get(value: Any, name: str, missing: Any = None) -> Any:
+    return value.get(name, missing) if isinstance(value, Mapping) else missing
+
+
+def _assign(tree: Dict[str, Any], target: str, var: str) -> None:
+    *parents, leaf = target.split('.')
+    node = tree
+    for name in parents:
+        node = node.setdefault(name, {})
+        if not isinstance(node, dict):
+            raise ValueError(f'目标路径冲突：{target}')
+    if leaf in node:
+        raise ValueError(f'目标路径重复：{target}')
+    node[leaf] = var
+
+
+def _tree_expr(tree: Dict[str, Any]) -> str:
+    items = (f'{name!r}: {_tree_expr(node) if isinstance(node, dict) else node}' for name, node in tree.items())
+    return '{' + ', '.join(items) + '}'
+
+
+def compile_mapping(spec: Dict[str, Any],
+                    context: Dict[str, Any] = None,
+                    name: str = 'mapping') -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    把映射规格编译为专用函数：文档 dict -> 消息体 dict
+
+    :param spec: 映射规格（见模块说明），{'fields': [...]}
+    :param context: 生产者上下文，字段规则中 context 引用的值，如 {'topic': 'temp4', 'data_type': '...'}
+    :param name: 规格名称，用于生成函数名与报错信息
+    :return: 生成的函数；规格错误时抛出 ValueError
+    """
+    context = context or {}
+    namespace: Dict[str, Any] = {'_json_dumps': partial(json.dumps, default=json_default), '_get': _get, '_MISSING': _MISSING}
+    lines: List[str] = []
+    tree: Dict[str, Any] = {}
+
+    for index, field in enumerate(spec.get('fields') or []):
+        target = field.get('target')
+        if not target:
+            raise ValueError(f'映射 {name} 第 {index} 个字段缺少 target')
+        var = f'v{index}'
+        if 'value' in field:
+            _assign(tree, target, _literal(field['value']))
+            continue
+        if 'context' in field:
+            if field['context'] not in context:
+                raise ValueError(f"映射 {name} 字段 {target} 引用了未提供的上下文：{field['context']}")
+            const = f'_context_{index}'
+            namespace[const] = context[field['context']]
+            _assign(tree, target, const)
+            continue
+        if not field.get('source'):
+            raise ValueError(f'映射 {name} 字段 {target} 需要 source / context / value 之一')
+
+        cleaned = var
+        for cleaner in field.get('cleaners') or []:
+            cleaned = _cleaner_expr(cleaner, cleaned, namespace)
+        default_when = field.get('default_when', 'none')
+        if default_when not in DEFAULT_WHEN:
+            raise ValueError(f'映射 {name} 字段 {target} 的 default_when 只能是 {DEFAULT_WHEN}')
+        clean_none = bool(field.get('clean_none'))
+
+        if 'default' in field and default_when == 'missing':
+            lines.append(f'    {var} = {_source_expr(field["source"], "_MISSING")}')
+            lines.append(f'    if {var} is _MISSING:')
+            lines.append(f'        {var} = {_literal(field["default"])}')
+            if cleaned != var:
+                lines.append('    else:' if clean_none else f'    elif {var} is not None:')
+                lines.append(f'        {var} = {cleaned}')
+        elif 'default' in field:
+            lines.append(f'    {var} = {_source_expr(field["source"])}')
+            lines.append(f'    if {"not " + var if default_when == "empty" else var + " is None"}:')
+            lines.append(f'        {var} = {_literal(field["default"])}')
+            if cleaned != var:
+                lines.append('    else:')
+                lines.append(f'        {var} = {cleaned}')
+        else:
+            lines.append(f'    {var} = {_source_expr(field["source"])}')
+            if cleaned != var and clean_none:
+                lines.append(f'    {var} = {cleaned}')
+            elif cleaned != var:
+                lines.append(f'    if {var} is not None:')
+                lines.append(f'        {var} = {cleaned}')
+        _assign(tree, target, var)
+
+    func_name = f'_map_{"".join(ch if ch.isalnum() else "_" for ch in name)}'
+    source = f'def {func_name}(d):\n' + ''.join(f'{line}\n' for line in lines) + f'    return {_tree_expr(tree)}\n'
+    exec(compile(source, f'<mapping:{name}>', 'exec'), namespace)
+    mapper = namespace[func_name]
+    mapper.source = source
+    return mapper
+
+
+def mapping_sources(spec: Dict[str, Any]) -> List[str]:
+    """
+    映射规格读取的文档路径（按出现顺序去重），可作为 MongoDB 查询的投影
+    """
+    sources = []
+    for field in spec.get('fields') or []:
+        source = field.get('source')
+        if source and source not in sources:
+            sources.append(source)
+    return sources
+
+
+def load_mapping(spec: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    加载映射规格：dict 原样返回；字符串为文件路径（相对路径在 extend/mapping 下查找），
+    .yaml / .yml 需要安装 PyYAML，其余按 JSON 解析
+    """
+    if isinstance(spec, dict):
+        return spec
+    path = spec if os.path.isabs(spec) or os.path.exists(spec) else os.path.join(MAPPING_PATH, spec)
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ImportError('YAML 映射规格需要安装 PyYAML：pip install pyyaml') from e
+            return yaml.safe_load(f)
+        return json.load(f)
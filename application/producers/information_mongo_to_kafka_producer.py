@@ -1,11 +1,26 @@
+import asyncio
 import json
-from typing import Dict, Any
+import os
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Sequence, Union
 from bson import ObjectId
 
+from application.config import DEDUP_INDEX_PATH, SPOOL_PATH
+from application.cursor_model.ack_tracker import AckCursorTracker
+from application.cursor_model.backends import create_cursor_manager, window_cursor_name
+from application.cursor_model.cursor_log import CursorLogManager
 from application.cursor_model.file_cursor import FileCursorManager
-from application.db.mongo_db.mongo_db_manager import MongoDBManager, MongoDBDataStream
+from application.db.mongo_db.mongo_db_manager import MongoDBManager, MongoDBDataStream, document_position
 from application.models.kafka_models.information_data_structure import InformationDataStructure
-from application.producers.base_producer import BaseKafkaProducer
+from application.producers.async_pipeline import AsyncPipeline
+from application.producers.base_producer import BaseKafkaProducer, BatchSendResult
+from application.producers.change_stream import ChangeStreamTailer
+from application.producers.delete_reconciler import DeleteReconciler, journal_path_for, snapshot_path_for
+from application.producers.producer_pool import KafkaProducerPool
+from application.producers.spool import DiskSpool
+from application.utils.id_snapshot import IdJournal
+from application.utils.lazy_bson import json_default
 
 
 class InformationtoKafkaProducer(BaseKafkaProducer):
@@ -14,21 +29,58 @@ class InformationtoKafkaProducer(BaseKafkaProducer):
 
     :ivar mongodb_manager: MongoDB 管理实例
     :ivar collection: MongoDB 集合名
-    :ivar sort_key: 排序键（通常用于增量同步）
+    :ivar sort_key: 排序键（通常用于增量同步），复合水位线如 ('update_time', '_id') 可捕获修改过的文档
     :ivar batch_size: 批量读取大小
     :ivar data_type: 数据类型标识
+    :ivar flush_timeout: 同步结束时等待未确认消息的超时时间（秒）
+    :ivar data_structure: 消息数据结构模型
+    :ivar offload_fields: 消息过大时可外置到 blob 存储的字段（消息字段名 -> 消息体路径）
+    :ivar source_fields: transform / build_payload 读取的字段，读取时作为投影下推（新增字段时需同步维护）
+    :ivar checkpoint_interval: 每确认多少条消息写一次游标检查点
+    :ivar checkpoint_seconds: 每隔多少秒写一次游标检查点
+    :ivar id_journal: 已投递 `_id` 的投递日志（执行过删除对账后才记录，见 DeleteReconciler）
     """
     mongodb_manager = MongoDBManager()
     collection = 'raw_information_list_temp'
     sort_key = '_id'
     batch_size = 1000
     data_type = "information_nsfc"
+    flush_timeout = 60.0
+    data_structure = InformationDataStructure
+    offload_fields = {'info_section': 'data.info_section', 'link_data': 'link_data'}
+    source_fields = ('_id', 'info_name', 'create_time', 'info_date', 'info_source', 'info_section', 'info_author',
+                     'description', 'column_info', 'link_data', 'page_url', 'marc_code')
+    checkpoint_interval = 10000
+    checkpoint_seconds = 5.0
+    _transient_attrs = BaseKafkaProducer._transient_attrs + ('id_journal',)
 
     def __init__(self,
                  topic: str,
                  full_amount: bool = False,
                  debug: bool = False,
-                 producer_config: dict = None):
+                 producer_config: dict = None,
+                 serialize_workers: int = 0,
+                 serialize_chunk_size: int = 200,
+                 serializer_mode: str = 'validated',
+                 serializer_options: dict = None,
+                 key_strategy: str = None,
+                 partitioner: str = None,
+                 tuning: dict = None,
+                 rate_limit: dict = None,
+                 spool: bool = False,
+                 dedup: Union[bool, dict] = False,
+                 compression: dict = None,
+                 claim_check: dict = None,
+                 field_mapping: str = None,
+                 sort_key: Union[str, Sequence[str]] = None,
+                 projection: bool = True,
+                 raw_documents: bool = False,
+                 checkpoint: dict = None,
+                 rewind: Union[int, datetime] = None,
+                 cursor_backend: str = 'file',
+                 since: datetime = None,
+                 until: datetime = None,
+                 shard: dict = None):
         """
         初始化生产者
 
@@ -36,39 +88,265 @@ class InformationtoKafkaProducer(BaseKafkaProducer):
         :param full_amount: 是否全量同步，True 表示从头开始
         :param debug: 调试模式
         :param producer_config: Kafka 生产者配置
+        :param serialize_workers: 序列化工作进程数，<= 1 表示不启用多进程序列化
+        :param serialize_chunk_size: 多进程序列化时每个分片的消息条数
+        :param serializer_mode: 序列化模式：validated / sampled / trusted / avro
+        :param serializer_options: 序列化器参数，如 {'sample_rate': 100}
+        :param key_strategy: 消息 key 策略：uid / info_source / data_type / hash:<f1>,<f2>
+        :param partitioner: 分区器名称：default / sticky
+        :param tuning: 自适应调优参数，如 {'objective': 'latency', 'target_latency_ms': 200}
+        :param rate_limit: 限流参数，如 {'messages_per_sec': 5000, 'bytes_per_sec': 10485760}
+        :param spool: 是否开启本地落盘缓冲
+        :param dedup: 是否开启内容去重（内容未变化的文档跳过发送），或去重参数如 {'verify': True}
+        :param compression: 压缩方式，如 {'codec': 'zstd_dict', 'dict_id': 123, 'level': 3}
+        :param claim_check: 大字段外置参数，如 {'threshold': 262144}
+        :param field_mapping: 声明式字段映射规格，如 'information.yaml'（extend/mapping 下），
+                              设置后代替 transform / build_payload
+        :param sort_key: 覆盖类属性 sort_key，如 ('update_time', '_id')：按 (update_time, _id) 复合水位线增量同步，
+                         游标保存为元组（更换排序键后需全量同步一次）
+        :param projection: 是否按 source_fields（或字段映射规格）做投影下推，只读取用到的字段
+                           （key 策略读取的字段一并读取）
+        :param raw_documents: 是否按需解码文档（LazyBSONDocument）：只解码 transform / build_payload 访问的字段，
+                              info_section 等子文档在编码时才展开
+        :param checkpoint: 游标检查点间隔，如 {'interval': 10000, 'seconds': 5.0}（满足其一即写入），默认取类属性
+        :param rewind: 回退游标后再同步：int 表示回退 N 个检查点，datetime 表示回退到该时刻的游标（见 CursorLogManager），
+                       用于重放一段窗口而不全量同步（仅 file 游标存储支持）
+        :param cursor_backend: 游标存储：file（本地游标日志）/ sqlite（多进程共享，比较并交换）/ kafka（压缩主题，多主机共享）
+        :param since: 时间窗口起点：只同步该时刻及之后创建的文档（按 `_id` 内嵌的创建时间换算为 ObjectId 下界）
+        :param until: 时间窗口终点：只同步该时刻之前创建的文档，读到上界即结束（窗口回填）。
+                      指定 since / until 时使用窗口专用游标 window.<起点>-<终点>，不读写主游标：
+                      重复执行同一命令从窗口游标续传，full_amount 时从窗口起点重新开始
+        :param shard: 分片同步时的分片范围 {'index': 编号, 'lower': 下界 ObjectId, 'upper': 上界 ObjectId}，
+                      每个分片使用独立游标、落盘缓冲与去重索引，只读取 [lower, upper) 范围内的文档
         """
-        super().__init__(topic, producer_config, debug)
+        shard = shard or {}
+        if shard and dedup:
+            # 各分片进程并发运行，去重索引按分片隔离：共用一个索引时各进程加载并删除同一个 bloom.bin，
+            # 结束时又经同一个临时文件原子替换，最后保存的分片会覆盖其他分片的记录
+            dedup = dict(dedup if isinstance(dedup, dict) else {},
+                         root_path=os.path.join(DEDUP_INDEX_PATH, f"shard{shard['index']:03d}"))
+        super().__init__(topic, producer_config, debug,
+                         serialize_workers=serialize_workers,
+                         serialize_chunk_size=serialize_chunk_size,
+                         serializer_mode=serializer_mode,
+                         serializer_options=serializer_options,
+                         key_strategy=key_strategy,
+                         partitioner=partitioner,
+                         tuning=tuning,
+                         rate_limit=rate_limit,
+                         spool=spool,
+                         dedup=dedup,
+                         compression=compression,
+                         claim_check=claim_check,
+                         field_mapping=field_mapping)
 
-        # 创建游标管理器（用于记录增量同步位置）
-        self.cursor = FileCursorManager(
+        if shard and self.spool is not None:
+            # 各分片进程并发运行，落盘缓冲按分片隔离，避免多个进程写同一分段
+            self.spool = DiskSpool(topic, root_path=os.path.join(SPOOL_PATH, f"shard{shard['index']:03d}"))
+        # 已有 id 快照（执行过删除对账）时记录投递过的 _id，下次对账据此发现两次对账之间写入又删除的文档
+        snapshot_path = snapshot_path_for(topic, self.collection)
+        self.id_journal = IdJournal(journal_path_for(snapshot_path)) if os.path.exists(snapshot_path) else None
+        self.full_amount = full_amount
+        checkpoint = checkpoint or {}
+        self.checkpoint_interval = checkpoint.get('interval') or self.checkpoint_interval
+        self.checkpoint_seconds = checkpoint.get('seconds') or self.checkpoint_seconds
+        if sort_key:
+            self.sort_key = sort_key if isinstance(sort_key, str) else tuple(sort_key)
+        # 创建游标管理器（默认为追加写的游标日志，用于记录增量同步位置）
+        self.cursor_backend = cursor_backend
+        self.window = (since, until) if since is not None or until is not None else None
+        self.cursor = create_cursor_manager(
+            cursor_backend,
             collection=self.collection,
             topic=topic,
-            full_amount=full_amount
+            full_amount=full_amount,
+            shard=shard.get('index'),
+            name=window_cursor_name(since, until) if self.window else 'cursor',
         )
+        if rewind is not None and self.window:
+            raise ValueError('rewind 与 since / until 不能同时使用：时间窗口使用独立的窗口游标')
+        if rewind is not None and not isinstance(self.cursor, CursorLogManager):
+            raise ValueError(f'游标存储 {cursor_backend} 不支持回退，请使用 file 游标存储')
+        if rewind is None:
+            historical_cursor_position = self.cursor.load()
+        elif isinstance(rewind, datetime):
+            historical_cursor_position = self.cursor.rewind(until=rewind)
+        else:
+            historical_cursor_position = self.cursor.rewind(checkpoints=rewind)
 
         # 创建 MongoDB 数据流管理器
         self.mongodb_stream = MongoDBDataStream(
             collection=self.collection,
             batch_size=self.batch_size,
             sort_key=self.sort_key,
-            historical_cursor_position=self.cursor.load()  # 加载历史游标位置
+            historical_cursor_position=historical_cursor_position,  # 历史游标位置
+            lower_bound=shard.get('lower'),
+            upper_bound=shard.get('upper'),
+            projection=self.read_fields() if projection else None,
+            raw=raw_documents,
+            since=since,
+            until=until,
         )
 
-    def sync(self, query: Dict[str, Any] = None) -> None:
+    def sync(self, query: Dict[str, Any] = None, progress: Callable[[Dict[str, Any]], None] = None) -> None:
         """
-        同步数据：从 MongoDB 按批读取并发送到 Kafka
+        同步数据：从 MongoDB 按批读取并整批发送到 Kafka（批大小即 `batch_size`）
 
         :param query: MongoDB 查询条件
+        :param progress: 进度回调，每批发送后以 {'messages', 'acked', 'position'} 调用（分片同步用于汇总进度）
         """
+        # 先重放上次因 Kafka 不可用而落盘的消息，保证顺序
+        self.replay_spool()
+
+        tracker = self._create_tracker()
+        sort_key = self.sort_key
         try:
-            for doc in self.mongodb_stream.get_all(query=query):
-                self.send_message(doc)
-                # 更新游标位置
-                self.mongodb_stream.historical_cursor_position = doc.get(self.sort_key)
+            for docs in self.mongodb_stream.get_batches(query=query):
+                # 发送前记录游标位置，transform 可能会修改文档
+                positions = [document_position(doc, sort_key) for doc in docs]
+                result = self.send_batch(docs)
+                tracker.track_batch(positions, result.futures)
+                tracker.maybe_checkpoint()
+                if progress is not None:
+                    progress({'messages': self.stats.counters['messages'], 'acked': tracker.acked,
+                              'position': tracker.committed_position})
         except Exception as e:
             raise e
         finally:
-            self.cursor.save(self.mongodb_stream.historical_cursor_position)
+            self._finish_sync(tracker)
+            self.mongodb_stream.historical_cursor_position = tracker.committed_position
+        tracker.raise_for_failures()
+
+    async def sync_async(self,
+                         query: Dict[str, Any] = None,
+                         prefetch_batches: int = 2,
+                         max_in_flight_batches: int = 8) -> None:
+        """
+        asyncio 同步：MongoDB 预取、发送与投递确认并发执行（见 AsyncPipeline），游标语义与 sync() 相同
+
+        :param query: MongoDB 查询条件
+        :param prefetch_batches: 预取的 MongoDB 批次数上限
+        :param max_in_flight_batches: 已发送未确认的批次数上限
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.replay_spool)
+
+        tracker = self._create_tracker()
+        pipeline = AsyncPipeline(self, prefetch_batches=prefetch_batches, max_in_flight_batches=max_in_flight_batches)
+        try:
+            await pipeline.run(self.mongodb_stream.get_batches(query=query), tracker, self.sort_key)
+        finally:
+            await loop.run_in_executor(None, self._finish_sync, tracker)
+            self.mongodb_stream.historical_cursor_position = tracker.committed_position
+        tracker.raise_for_failures()
+
+    def tail(self, pipeline: List[dict] = None, stop: threading.Event = None, max_events: int = None) -> None:
+        """
+        实时同步：监听集合的 change stream，发送 upsert 与 tombstone 消息（见 ChangeStreamTailer），
+        resume token 保存在游标目录的 resume_token.db，重启后从该位置续传；full_amount 时从当前时刻开始监听。
+        建议使用 settings.STREAM_PRODUCER_CONFIG（低 linger_ms）创建生产者。
+
+        :param pipeline: 追加的 change stream 聚合管道
+        :param stop: 停止信号
+        :param max_events: 最多处理的变更条数，None 表示持续运行
+        """
+        self.replay_spool()
+
+        if self.cursor_backend == 'file':
+            resume_cursor = FileCursorManager(collection=self.collection, topic=self.topic,
+                                              full_amount=self.full_amount, name='resume_token')
+        else:
+            resume_cursor = create_cursor_manager(self.cursor_backend, collection=self.collection, topic=self.topic,
+                                                  full_amount=self.full_amount, name='resume_token')
+        # 实时模式下提交间隔缩短为 1 秒，重启时重复发送的变更更少
+        tracker = AckCursorTracker(
+            cursor_manager=resume_cursor,
+            initial_position=resume_cursor.load(),
+            checkpoint_interval=self.batch_size,
+            checkpoint_seconds=1.0,
+            before_commit=self.before_cursor_commit,
+            stats=self.stats,
+        )
+        tailer = ChangeStreamTailer(self, self.mongodb_manager.db[self.collection], pipeline=pipeline,
+                                    batch_size=self.batch_size)
+        try:
+            tailer.run(tracker, stop=stop, max_events=max_events)
+        finally:
+            self._finish_sync(tracker)
+        tracker.raise_for_failures()
+
+    def reconcile_deletes(self) -> Dict[str, int]:
+        """
+        删除对账：按 `_id` 顺序扫描集合并与上次的 id 快照归并比较，为已删除的文档发送 tombstone（见 DeleteReconciler）
+
+        :return: 对账统计 {'scanned', 'previous', 'deleted'}
+        """
+        self.replay_spool()
+        return DeleteReconciler(self, self.mongodb_manager.db[self.collection]).run(flush_timeout=self.flush_timeout)
+
+    def send_batch(self, docs: Sequence[Dict[str, Any]], keys: Sequence[str] = None) -> BatchSendResult:
+        """
+        批量发送，并在投递确认后把文档 `_id` 记入投递日志（transform 前取出，映射模式下消息中没有 `_id`）
+        """
+        if self.id_journal is None:
+            return super().send_batch(docs, keys=keys)
+        ids = [doc.get('_id') for doc in docs]
+        result = super().send_batch(docs, keys=keys)
+        add = self.id_journal.add
+        for oid, future in zip(ids, result.futures):
+            future.add_callback(lambda _, oid=oid: add(oid))
+        return result
+
+    def before_cursor_commit(self) -> None:
+        """
+        游标提交前先持久化投递日志：游标越过的文档都已记入日志
+        """
+        if self.id_journal is not None:
+            self.id_journal.flush()
+        super().before_cursor_commit()
+
+    def flush_and_close(self, timeout: float = 30.0):
+        super().flush_and_close(timeout=timeout)
+        if self.id_journal is not None:
+            self.id_journal.close()
+
+    def _create_tracker(self) -> AckCursorTracker:
+        """
+        游标只推进到最高的连续已确认（或已落盘）位置，并按条数 / 时间间隔写入检查点
+        """
+        return AckCursorTracker(
+            cursor_manager=self.cursor,
+            initial_position=self.mongodb_stream.historical_cursor_position,
+            checkpoint_interval=self.checkpoint_interval,
+            checkpoint_seconds=self.checkpoint_seconds,
+            before_commit=self.before_cursor_commit,
+            stats=self.stats,
+        )
+
+    def _finish_sync(self, tracker: AckCursorTracker) -> None:
+        """
+        同步结束：等待已发送消息全部得到确认后做最终提交，并输出统计
+        """
+        try:
+            self.producer.flush(timeout=self.flush_timeout)
+        except Exception as e:
+            self.logger.error(f"[Kafka] 等待消息确认超时，仅提交已确认游标：{e}")
+        tracker.checkpoint(final=True)
+        self.stats.incr('acked', tracker.acked)
+        self.stats.incr('failed', tracker.failed)
+        summary = self.stats.summary()
+        self.logger.info(f"[Kafka] 同步统计：{summary}")
+        if summary['elapsed']:
+            overhead = summary.get('checkpoint_seconds', 0) / summary['elapsed']
+            self.logger.info(f"[Kafka] 游标检查点：{tracker.checkpoints} 次，"
+                             f"耗时 {summary.get('checkpoint_seconds', 0)} 秒（占运行时间 {overhead:.2%}）")
+        if self.dedup is not None:
+            self.logger.info(f"[Kafka] 去重统计：{self.dedup.report()}")
+        if self.mongodb_stream.docs_read:
+            read_report = self.mongodb_stream.read_report()
+            self.stats.incr('bytes_read', read_report.get('bytes_read', 0))
+            self.logger.info(f"[Kafka] 读取统计（投影后 / 完整文档，抽样估算）：{read_report}")
+        self.logger.info(f"[Kafka] 连接池指标：{KafkaProducerPool.metrics()}")
 
     # ---------- 实现父类抽象方法 ----------
     def transform(self, doc: Dict[str, Any]) -> Dict[str, Any]:
@@ -95,31 +373,40 @@ class InformationtoKafkaProducer(BaseKafkaProducer):
 
         return doc
 
-    def value_serialize(self, message: Dict[str, Any]) -> bytes:
+    def build_payload(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """
-        将消息数据结构化并序列化为 JSON 字节流
+        按 InformationDataStructure 的字段构造消息字典
 
         :param message: 原始消息字典
-        :return: JSON 格式字节流
+        :return: 与数据结构模型字段对应的字典
         """
-        # 创建结构化信息对象
-        info = InformationDataStructure(
-            topic=self.topic,
-            data_type=self.data_type,
-            uid=message.get('uid'),
-            name=message.get('info_name', ''),
-            created_at=message.get('create_time', ''),
-            tag_values=json.dumps(message.get('column_info', [])),
-            link_data=message.get('link_data') or [],
-            data={
+        return {
+            "topic": self.topic,
+            "data_type": self.data_type,
+            "uid": message.get('uid'),
+            "name": message.get('info_name', ''),
+            "created_at": message.get('create_time', ''),
+            "tag_values": json.dumps(message.get('column_info', []), default=json_default),
+            "link_data": message.get('link_data') or [],
+            "data": {
                 "info_date": message.get('info_date', ''),
                 "info_section": message.get('info_section', ''),
                 "info_author": message.get('info_author', ''),
                 'description': message.get('description', ''),
             },
-            metadata={
+            "metadata": {
                 "marc_code": message.get('marc_code') or 'zh',
                 "details_page": message.get('page_url', ''),
             },
-        )
-        return info.to_json()
+        }
+
+    def value_serialize(self, message: Dict[str, Any]) -> bytes:
+        """
+        将消息数据结构化并序列化为 JSON 字节流（校验方式由 serializer_mode 决定）
+
+        :param message: 原始消息字典（字段映射模式下已是消息体）
+        :return: JSON 格式字节流
+        """
+        if self.field_mapping is not None:
+            return self.serializer.serialize(message)
+        return self.serializer.serialize(self.build_payload(message))
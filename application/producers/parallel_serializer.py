@@ -0,0 +1,62 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Sequence
+
+# 工作进程内的生产者副本（不含 KafkaProducer 等运行时资源），由 _init_worker 设置
+_worker_producer = None
+
+
+def _init_worker(producer) -> None:
+    """
+    工作进程初始化：保存一次生产者副本，后续每个分片直接复用其 value_serialize()
+    """
+    global _worker_producer
+    _worker_producer = producer
+
+
+def _serialize_chunk(messages: Sequence[Any]) -> List[bytes]:
+    """
+    在工作进程中序列化一个分片
+    """
+    value_serialize = _worker_producer.value_serialize
+    return [value_serialize(message) for message in messages]
+
+
+class ProcessPoolSerializer:
+    """
+    多进程序列化器：把一批已转换的消息切成分片，分发到进程池中并行执行
+    value_serialize()，并按输入顺序返回字节流。
+
+    生产者实例会在进程池启动时被 pickle 到每个工作进程（见 BaseKafkaProducer.__getstate__），
+    因此 value_serialize() 只能依赖可序列化的实例状态（如 topic、data_type）。
+    """
+
+    def __init__(self, producer, workers: int, chunk_size: int = 200):
+        """
+        :param producer: 提供 value_serialize() 的生产者实例
+        :param workers: 工作进程数
+        :param chunk_size: 每个分片包含的消息条数
+        """
+        self.workers = workers
+        self.chunk_size = max(1, chunk_size)
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(producer,),
+        )
+
+    def serialize(self, messages: Sequence[Any]) -> List[bytes]:
+        """
+        并行序列化，返回值顺序与 messages 一致
+        """
+        chunk_size = self.chunk_size
+        chunks = [messages[i:i + chunk_size] for i in range(0, len(messages), chunk_size)]
+        values = []
+        for part in self.executor.map(_serialize_chunk, chunks):
+            values.extend(part)
+        return values
+
+    def close(self) -> None:
+        """
+        关闭进程池
+        """
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,111 @@
+"""
+消息 key 策略与分区器
+
+key 策略决定每条消息的 Kafka key（同一 key 的消息进入同一分区，保证按实体有序）：
+    uid / info_source / data_type       取消息（或生产者）上的同名字段
+    field:<name>                        取任意字段
+    hash:<field1>,<field2>,...          多个字段拼接后取 md5，适合组合主键
+策略函数的 fields 属性声明它读取的字段，读取文档时并入投影（见 BaseKafkaProducer.read_fields）。
+
+分区器：
+    sticky  无 key 的消息在一个批次内固定发往同一分区、批次间轮转，
+            使每个分区的 batch 尽量填满（配合 linger_ms 微批）；有 key 的消息仍按 murmur2 路由。
+"""
+import hashlib
+from typing import Any, Callable, Dict, List, Optional
+
+from kafka.partitioner import DefaultPartitioner
+
+# key 策略：(producer, message) -> Optional[str]
+KeyStrategy = Callable[[Any, Dict[str, Any]], Optional[str]]
+
+
+def _field_value(producer, message: Dict[str, Any], field: str):
+    """
+    优先取消息字段，其次取生产者属性（如 data_type）
+    """
+    value = message.get(field)
+    if value is None:
+        value = getattr(producer, field, None)
+    return value
+
+
+def key_by_field(field: str) -> KeyStrategy:
+    def strategy(producer, message):
+        value = _field_value(producer, message, field)
+        return None if value is None else str(value)
+    strategy.fields = (field,)
+    return strategy
+
+
+def key_by_hash(fields: List[str]) -> KeyStrategy:
+    def strategy(producer, message):
+        raw = '\x1f'.join(str(_field_value(producer, message, field)) for field in fields)
+        return hashlib.md5(raw.encode('utf-8')).hexdigest()
+    strategy.fields = tuple(fields)
+    return strategy
+
+
+# 预置的 key 策略
+KEY_STRATEGIES: Dict[str, KeyStrategy] = {
+    'uid': key_by_field('uid'),
+    'info_source': key_by_field('info_source'),
+    'data_type': key_by_field('data_type'),
+}
+
+
+def get_key_strategy(spec: Optional[str]) -> Optional[KeyStrategy]:
+    """
+    按描述解析 key 策略
+
+    :param spec: 策略描述，如 'uid'、'field:info_author'、'hash:info_source,data_type'；为空表示不设置 key
+    """
+    if not spec:
+        return None
+    if spec in KEY_STRATEGIES:
+        return KEY_STRATEGIES[spec]
+    kind, _, args = spec.partition(':')
+    if kind == 'field' and args:
+        return key_by_field(args)
+    fields = [field.strip() for field in args.split(',') if field.strip()]
+    if kind == 'hash' and fields:
+        return key_by_hash(fields)
+    raise ValueError(f'不支持的 key 策略：{spec}，可选：{list(KEY_STRATEGIES)} / field:<name> / hash:<f1>,<f2>')
+
+
+class BatchStickyPartitioner:
+    """
+    批次粘滞分区器（KafkaProducer 的 partitioner 配置项）
+
+    无 key 的消息在同一批次内始终发往同一分区，调用 next_batch() 后轮转到下一个可用分区；
+    有 key 的消息交给默认分区器（murmur2），保证按 key 有序。
+    """
+
+    def __init__(self):
+        self._partition = None
+        self._rotations = 0
+        self._rotate = True
+
+    def next_batch(self) -> None:
+        """
+        开始新批次：下一条无 key 消息将切换分区
+        """
+        self._rotate = True
+
+    def __call__(self, key, all_partitions, available):
+        if key is not None:
+            return DefaultPartitioner()(key, all_partitions, available)
+
+        candidates = available or all_partitions
+        if self._rotate or self._partition not in candidates:
+            self._partition = sorted(candidates)[self._rotations % len(candidates)]
+            self._rotations += 1
+            self._rotate = False
+        return self._partition
+
+
+# 分区器注册表：名称 -> 工厂
+PARTITIONERS = {
+    'default': DefaultPartitioner,
+    'sticky': BatchStickyPartitioner,
+}
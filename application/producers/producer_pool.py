@@ -0,0 +1,133 @@
+import hashlib
+import json
+from threading import Lock
+from typing import Any, Callable, Dict
+
+from kafka import KafkaProducer
+
+from application.utils.logger import get_logger
+
+
+def _describe(value: Any):
+    """
+    把配置值转换为可稳定序列化的描述（对象类取类名，如分区器实例）
+    """
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, (list, tuple, set)):
+        return [_describe(item) for item in value]
+    if isinstance(value, dict):
+        return {str(k): _describe(v) for k, v in sorted(value.items())}
+    cls = value if isinstance(value, type) else type(value)
+    return f'{cls.__module__}.{cls.__qualname__}'
+
+
+class _PoolEntry:
+    def __init__(self, fingerprint: str, producer):
+        self.fingerprint = fingerprint
+        self.producer = producer
+        self.refcount = 0
+
+
+class KafkaProducerPool:
+    """
+    进程级 KafkaProducer 连接池
+
+    以配置指纹为键共享 KafkaProducer 实例：同一进程中多个数据类型、多个 topic 的生产者
+    只要配置与生产者工厂都相同就复用同一组连接、缓冲区与 I/O 线程。通过引用计数管理生命周期，
+    release() 只有在最后一个使用者释放时才真正关闭实例。
+    """
+
+    logger = get_logger("producer_pool")
+    _lock = Lock()
+    _entries: Dict[str, _PoolEntry] = {}  # 配置指纹 -> 池条目
+    _owners: Dict[int, str] = {}  # id(producer) -> 配置指纹
+
+    @staticmethod
+    def fingerprint(config: Dict[str, Any], factory: Callable[..., Any] = KafkaProducer) -> str:
+        """
+        配置指纹：规范化后的配置与生产者工厂取 sha1
+        （工厂按名称与对象标识区分，配置相同、工厂不同的生产者不会拿到别的工厂创建的实例）
+        """
+        factory_name = getattr(factory, '__qualname__', type(factory).__qualname__)
+        factory_name = f"{getattr(factory, '__module__', None)}.{factory_name}"
+        canonical = json.dumps({'config': _describe(config), 'factory': [factory_name, id(factory)]},
+                               sort_keys=True, default=str)
+        return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def acquire(cls, config: Dict[str, Any], factory: Callable[..., Any] = None):
+        """
+        获取（或创建）与配置对应的共享生产者，引用计数 +1
+
+        :param config: KafkaProducer 配置
+        :param factory: 生产者工厂，默认 KafkaProducer（测试时可替换为本地替身）
+        """
+        factory = factory or KafkaProducer
+        fingerprint = cls.fingerprint(config, factory)
+        with cls._lock:
+            entry = cls._entries.get(fingerprint)
+            if entry is None:
+                producer = factory(**config)
+                entry = cls._entries[fingerprint] = _PoolEntry(fingerprint, producer)
+                cls._owners[id(producer)] = fingerprint
+                cls.logger.info(f"[Kafka] 创建共享生产者 {fingerprint[:12]}")
+            entry.refcount += 1
+            return entry.producer
+
+    @classmethod
+    def release(cls, producer, timeout: float = None) -> bool:
+        """
+        释放共享生产者，引用计数 -1；计数归零时关闭实例
+
+        :return: 是否真正关闭了实例
+        """
+        with cls._lock:
+            fingerprint = cls._owners.get(id(producer))
+            entry = cls._entries.get(fingerprint)
+            if entry is None or entry.producer is not producer:
+                # 不在池中（如外部直接创建），直接关闭
+                close = True
+            else:
+                entry.refcount -= 1
+                close = entry.refcount <= 0
+                if close:
+                    del cls._entries[fingerprint]
+                    del cls._owners[id(producer)]
+        if close:
+            producer.close(timeout=timeout)
+        return close
+
+    @staticmethod
+    def _buffer_usage(producer) -> Dict[str, Any]:
+        """
+        统计累加器中尚未确认的批次数与字节数（依赖 kafka-python 内部结构，取不到时返回空）
+        """
+        accumulator = getattr(producer, '_accumulator', None)
+        incomplete = getattr(accumulator, '_incomplete', None)
+        if incomplete is None:
+            return {}
+        batches = incomplete.all()
+        try:
+            buffered_bytes = sum(batch.records.size_in_bytes() for batch in batches)
+        except AttributeError:
+            buffered_bytes = None
+        return {'buffered_batches': len(batches), 'buffered_bytes': buffered_bytes}
+
+    @classmethod
+    def metrics(cls) -> Dict[str, Dict[str, Any]]:
+        """
+        连接池级指标：每个共享生产者的引用数、缓冲区占用、在途请求数与发送速率
+        """
+        with cls._lock:
+            entries = list(cls._entries.values())
+        result = {}
+        for entry in entries:
+            producer_metrics = (entry.producer.metrics() or {}).get('producer-metrics', {})
+            result[entry.fingerprint[:12]] = {
+                'refcount': entry.refcount,
+                'requests_in_flight': producer_metrics.get('requests-in-flight'),
+                'record_send_rate': producer_metrics.get('record-send-rate'),
+                **cls._buffer_usage(entry.producer),
+            }
+        return result
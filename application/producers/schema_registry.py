@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+from threading import Lock
+from typing import Dict
+
+from application.config import SCHEMA_REGISTRY_PATH
+
+
+class FileSchemaRegistry:
+    """
+    基于本地文件的 schema 注册表
+
+    每个 schema 保存为 `<root>/<id>.json`，内容包含 id、subject、指纹与 schema 本身。
+    相同指纹（规范化 JSON 的 sha256）的 schema 只注册一次；id 通过独占创建文件分配，
+    多个进程同时注册时不会产生冲突。
+    """
+
+    def __init__(self, root_path: str = None):
+        self.root_path = root_path or SCHEMA_REGISTRY_PATH
+        self._lock = Lock()
+        self._schemas: Dict[int, dict] = {}
+        self._fingerprints: Dict[str, int] = {}
+
+    @staticmethod
+    def fingerprint(schema) -> str:
+        """
+        schema 指纹：规范化（排序键、紧凑分隔符）后的 sha256
+        """
+        canonical = json.dumps(schema, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _path(self, schema_id: int) -> str:
+        return os.path.join(self.root_path, f'{schema_id}.json')
+
+    def _scan(self) -> None:
+        """
+        扫描目录，加载尚未缓存的 schema（调用方需持有锁）
+        """
+        if not os.path.isdir(self.root_path):
+            return
+        for file_name in os.listdir(self.root_path):
+            stem, ext = os.path.splitext(file_name)
+            if ext != '.json' or not stem.isdigit() or int(stem) in self._schemas:
+                continue
+            try:
+                with open(os.path.join(self.root_path, file_name), encoding='utf-8') as f:
+                    record = json.load(f)
+            except ValueError:
+                # 其他进程刚占用 id、尚未写完，下次扫描再加载
+                continue
+            self._schemas[record['id']] = record['schema']
+            self._fingerprints[record['fingerprint']] = record['id']
+
+    def register(self, subject: str, schema) -> int:
+        """
+        注册 schema 并返回其 id；已注册过的 schema 直接返回原 id
+        """
+        fingerprint = self.fingerprint(schema)
+        with self._lock:
+            self._scan()
+            if fingerprint in self._fingerprints:
+                return self._fingerprints[fingerprint]
+
+            os.makedirs(self.root_path, exist_ok=True)
+            schema_id = max(self._schemas, default=0) + 1
+            record = {'id': None, 'subject': subject, 'fingerprint': fingerprint, 'schema': schema}
+            while True:
+                try:
+                    fd = os.open(self._path(schema_id), os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+                    break
+                except FileExistsError:
+                    # 其他进程已占用该 id，重新扫描后确认是否是同一 schema
+                    self._scan()
+                    if fingerprint in self._fingerprints:
+                        return self._fingerprints[fingerprint]
+                    schema_id += 1
+            record['id'] = schema_id
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False, indent=2)
+            self._schemas[schema_id] = schema
+            self._fingerprints[fingerprint] = schema_id
+            return schema_id
+
+    def get(self, schema_id: int):
+        """
+        按 id 获取 schema
+        """
+        with self._lock:
+            if schema_id not in self._schemas:
+                self._scan()
+            if schema_id not in self._schemas:
+                raise KeyError(f'schema 注册表中不存在 id={schema_id}（目录：{self.root_path}）')
+            return self._schemas[schema_id]
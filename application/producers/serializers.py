@@ -0,0 +1,256 @@
+"""
+消息序列化器注册表
+
+BaseKafkaProducer 根据 `serializer_mode` 从注册表中选取序列化器，把子类构造好的
+消息字典（与数据结构模型字段一一对应）转换成 Kafka value 字节流：
+
+- validated：完整的 Pydantic 校验 + model_dump_json（原有行为）
+- sampled：每 N 条做一次完整校验，其余走 trusted 快速路径
+- trusted：不经过 Pydantic，按模型字段顺序直接从字典构造 JSON，输出字节与 validated 完全一致
+- avro：按模型推导的 Avro schema 编码为紧凑二进制，schema id 通过 Kafka header 携带
+"""
+import json
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, List, Optional, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel
+from pydantic_core import PydanticSerializationError
+
+from application.producers.binary_codec import SCHEMA_ID_HEADER, compile_encoder, model_to_schema
+from application.producers.schema_registry import FileSchemaRegistry
+from application.utils.lazy_bson import json_default
+
+# 序列化器注册表：模式名 -> 序列化器类
+SERIALIZERS: Dict[str, Type['BaseSerializer']] = {}
+
+
+def register_serializer(name: str):
+    """
+    类装饰器：把序列化器注册到 SERIALIZERS 中
+    """
+    def decorator(cls):
+        SERIALIZERS[name] = cls
+        cls.mode = name
+        return cls
+
+    return decorator
+
+
+def get_serializer(mode: str, model: Type[BaseModel], **options) -> 'BaseSerializer':
+    """
+    按模式名创建序列化器
+
+    :param mode: 序列化模式，见 SERIALIZERS
+    :param model: 数据结构模型类（如 InformationDataStructure）
+    :param options: 序列化器的额外参数（如 sampled 模式的 sample_rate）
+    """
+    if mode not in SERIALIZERS:
+        raise ValueError(f'不支持的序列化模式：{mode}，可选：{list(SERIALIZERS)}')
+    return SERIALIZERS[mode](model, **options)
+
+
+def _mapping_fallback(value: Any) -> Any:
+    """
+    Pydantic 序列化遇到未知类型时的回退：LazyBSONDocument 等 Mapping 展开为 dict（List[Any] 字段中会原样保留）
+    """
+    if isinstance(value, Mapping):
+        return dict(value.items())
+    raise PydanticSerializationError(f'Unable to serialize unknown type: {type(value)}')
+
+
+class BaseSerializer(ABC):
+    """
+    序列化器基类
+
+    :ivar model: 数据结构模型类
+    :ivar headers: 需要随消息一起发送的 Kafka headers（默认无）
+    """
+    mode = None
+    headers: Optional[List[tuple]] = None
+
+    def __init__(self, model: Type[BaseModel], **options):
+        self.model = model
+        self.options = options
+
+    @abstractmethod
+    def serialize(self, payload: Dict[str, Any]) -> bytes:
+        """
+        把消息字典序列化为字节流
+        """
+        raise NotImplementedError
+
+    def validate_and_serialize(self, payload: Dict[str, Any]) -> bytes:
+        """
+        完整的 Pydantic 校验与序列化（即原有的 value_serialize 行为）
+        """
+        return self.model(**payload).to_json(fallback=_mapping_fallback)
+
+
+@register_serializer('validated')
+class ValidatedSerializer(BaseSerializer):
+    """
+    每条消息都经过 Pydantic 校验
+    """
+
+    def serialize(self, payload: Dict[str, Any]) -> bytes:
+        return self.validate_and_serialize(payload)
+
+
+# ---------------- trusted 快速路径 ----------------
+def _nested_model(annotation) -> tuple:
+    """
+    解析字段注解中的嵌套模型
+
+    :return: (包装方式, 模型类)，包装方式为 None / 'optional' / 'list'；非嵌套模型返回 (None, None)
+    """
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return None, annotation
+    origin, args = get_origin(annotation), get_args(annotation)
+    if origin is Union and len(args) == 2 and type(None) in args:
+        inner = args[0] if args[1] is type(None) else args[1]
+        if isinstance(inner, type) and issubclass(inner, BaseModel):
+            return 'optional', inner
+    if origin in (list, List) and args and isinstance(args[0], type) and issubclass(args[0], BaseModel):
+        return 'list', args[0]
+    return None, None
+
+
+def compile_builder(model: Type[BaseModel]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    根据模型字段生成专用的构造函数：按模型字段顺序取值、补默认值、丢弃多余键，
+    与 model_dump() 的输出结构一致，但不做任何类型校验。
+
+    生成的代码形如：
+        def _build_InformationDataStructure(p):
+            return {'uid': p['uid'], ..., 'data': _build_DataPayload(p['data']), ...}
+    """
+    namespace: Dict[str, Any] = {}
+    sources: List[str] = []
+
+    def generate(current: Type[BaseModel]) -> str:
+        func_name = f'_build_{current.__name__}_{len(sources)}'
+        sources.append('')  # 占位，保证嵌套模型函数名唯一
+        index = len(sources) - 1
+        items = []
+        for name, field in current.model_fields.items():
+            if field.is_required():
+                value = f'p[{name!r}]'
+            elif field.default_factory is not None:
+                factory = f'_factory_{func_name}_{name}'
+                namespace[factory] = field.default_factory
+                value = f'(p[{name!r}] if {name!r} in p else {factory}())'
+            else:
+                default = f'_default_{func_name}_{name}'
+                namespace[default] = field.default
+                value = f'p.get({name!r}, {default})'
+
+            wrapper, sub_model = _nested_model(field.annotation)
+            if sub_model is not None:
+                sub_func = generate(sub_model)
+                if wrapper == 'optional':
+                    value = f'(None if (v := {value}) is None else {sub_func}(v))'
+                elif wrapper == 'list':
+                    value = f'[{sub_func}(x) for x in {value}]'
+                else:
+                    value = f'{sub_func}({value})'
+            items.append(f'{name!r}: {value}')
+        sources[index] = f'def {func_name}(p):\n    return {{{", ".join(items)}}}\n'
+        return func_name
+
+    entry = generate(model)
+    exec(compile('\n'.join(sources), f'<serializer:{model.__name__}>', 'exec'), namespace)
+    return namespace[entry]
+
+
+@register_serializer('trusted')
+class TrustedSerializer(BaseSerializer):
+    """
+    信任上游数据，跳过 Pydantic：用预编译的构造函数整理字段，再用预先创建的
+    JSONEncoder（紧凑分隔符、不转义非 ASCII）编码，输出与 model_dump_json 逐字节一致。
+
+    仅适用于由基础 JSON 类型（str/int/bool/None/list/dict，以及 raw 模式的 LazyBSONDocument 子文档）组成的消息；遇到缺失必填字段、
+    无法直接编码的类型（如 datetime）或 NaN 时，自动回退到完整校验路径。
+    """
+
+    def __init__(self, model: Type[BaseModel], **options):
+        super().__init__(model, **options)
+        self._compile()
+
+    def _compile(self) -> None:
+        self._build = compile_builder(self.model)
+        self._encode = json.JSONEncoder(
+            ensure_ascii=False, separators=(',', ':'), allow_nan=False, check_circular=False, default=json_default,
+        ).encode
+
+    def __getstate__(self):
+        """
+        生成的函数无法 pickle，传到序列化工作进程后重新编译
+        """
+        return {'model': self.model, 'options': self.options}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile()
+
+    def serialize(self, payload: Dict[str, Any]) -> bytes:
+        try:
+            return self._encode(self._build(payload)).encode('utf-8')
+        except (KeyError, TypeError, ValueError):
+            return self.validate_and_serialize(payload)
+
+
+@register_serializer('sampled')
+class SampledSerializer(TrustedSerializer):
+    """
+    抽样校验：每 sample_rate 条消息中第一条走完整校验，其余走 trusted 快速路径
+    """
+
+    def __init__(self, model: Type[BaseModel], sample_rate: int = 100, **options):
+        super().__init__(model, sample_rate=sample_rate, **options)
+        self.sample_rate = max(1, sample_rate)
+        self._count = 0
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.sample_rate = max(1, self.options.get('sample_rate', 100))
+        self._count = 0
+
+    def serialize(self, payload: Dict[str, Any]) -> bytes:
+        count = self._count
+        self._count = count + 1
+        if count % self.sample_rate == 0:
+            return self.validate_and_serialize(payload)
+        return super().serialize(payload)
+
+
+@register_serializer('avro')
+class AvroSerializer(TrustedSerializer):
+    """
+    Avro 二进制编码：schema 由数据结构模型推导并注册到本地 schema 注册表，
+    每条消息通过 `schema_id` header 携带 schema id，消费端用 binary_codec.decode_message() 解码。
+
+    与 trusted 模式一样不做逐条校验；编码失败时先经 Pydantic 校验并转换，再重新编码。
+    """
+
+    def __init__(self, model: Type[BaseModel], registry: FileSchemaRegistry = None, **options):
+        """
+        :param registry: schema 注册表，默认使用 runtime/schemas 下的本地文件注册表
+        """
+        self.schema = model_to_schema(model)
+        self.schema_id = (registry or FileSchemaRegistry()).register(model.__name__, self.schema)
+        super().__init__(model, **options)
+
+    def _compile(self) -> None:
+        self._build = compile_builder(self.model)
+        self._encode = compile_encoder(self.schema)
+        self.headers = [(SCHEMA_ID_HEADER, str(self.schema_id).encode('utf-8'))]
+
+    def __getstate__(self):
+        return {'model': self.model, 'options': self.options, 'schema': self.schema, 'schema_id': self.schema_id}
+
+    def serialize(self, payload: Dict[str, Any]) -> bytes:
+        try:
+            return self._encode(self._build(payload))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return self._encode(self.model(**payload).model_dump(mode='json', fallback=_mapping_fallback))
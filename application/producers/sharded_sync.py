@@ -0,0 +1,275 @@
+"""
+分片并行同步
+
+把 `_id` 键空间切分为 N 个左闭右开区间，每个区间由独立的工作进程同步：
+
+- 切分方式：time（按最小/最大 `_id` 的时间戳等分，ObjectId.from_datetime 生成边界）
+            sample（$sample 采样 `_id` 后取分位点，适合写入速率不均匀的集合）
+- 分片计划保存在 `runtime/cursors/<topic>/<collection>/shards.json`，重启后沿用同一计划，
+  各分片使用独立游标日志 cursor.shard<编号>.log，只续传自己的区间
+- 工作进程以 spawn 方式启动（每个进程独立创建 MongoDB / Kafka 连接），异常退出的分片单独重启；
+  topic 限流配额按分片数均分，所有分片合计不超过 topic 上限
+- 父进程汇总各分片上报的进度并定期输出；全部分片完成后把末分片游标写入主游标，
+  之后的增量同步可直接从该位置继续（since / until 时间窗口同步与分片区间取交集，不写主游标）
+- 只支持以 `_id` 为排序键：分片按 `_id` 区间切分，末分片游标才是全局最大位置；
+  其他排序键（如复合水位线 (update_time, _id)）下各分片的游标互相交错，无法合并为一个主游标
+"""
+import json
+import multiprocessing
+import os
+import queue
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from application.config import CURSOR_FILE_PATH
+from application.cursor_model.backends import create_cursor_manager
+from application.settings import TOPIC_RATE_LIMITS
+from application.utils.logger import get_logger
+
+ShardRange = Tuple[Optional[ObjectId], Optional[ObjectId]]
+
+
+def split_by_time(collection, shards: int) -> List[ObjectId]:
+    """
+    按 `_id` 时间戳等分，返回 shards - 1 个分割点
+    """
+    first = collection.find_one({}, {'_id': 1}, sort=[('_id', 1)])
+    last = collection.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+    if first is None:
+        return []
+    start = first['_id'].generation_time
+    span = last['_id'].generation_time - start
+    points = [ObjectId.from_datetime(start + span * i / shards) for i in range(1, shards)]
+    return sorted(set(point for point in points if point > first['_id']))
+
+
+def split_by_sample(collection, shards: int, sample_size: int = None) -> List[ObjectId]:
+    """
+    采样 `_id` 后按分位点切分，返回 shards - 1 个分割点
+    """
+    sample_size = sample_size or shards * 100
+    ids = sorted(doc['_id'] for doc in collection.aggregate([
+        {'$sample': {'size': sample_size}},
+        {'$project': {'_id': 1}},
+    ]))
+    if not ids:
+        return []
+    return sorted(set(ids[len(ids) * i // shards] for i in range(1, shards)))
+
+
+SPLITTERS = {
+    'time': split_by_time,
+    'sample': split_by_sample,
+}
+
+
+def to_ranges(points: List[ObjectId]) -> List[ShardRange]:
+    """
+    分割点 -> 左闭右开区间列表（首尾区间无界）
+    """
+    bounds = [None] + list(points) + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def split_rate_limit(limits: Optional[dict], shards: int) -> Optional[dict]:
+    """
+    按分片数均分 topic 限流配额：每个分片进程各有一个限流器，均分后总速率不超过 topic 上限
+    （先完成的分片让出的配额不会转给其他分片，总速率只会更保守）
+    """
+    if not limits or shards <= 1:
+        return limits
+    return {name: value / shards if name in ('messages_per_sec', 'bytes_per_sec') and value else value
+            for name, value in limits.items()}
+
+
+def _run_shard(producer_class, producer_kwargs: Dict[str, Any], index: int, attempt: int,
+               shard_range: ShardRange, progress_queue) -> None:
+    """
+    工作进程入口：同步一个分片并上报进度 (分片编号, 第几次运行, 发送条数, 确认条数, 游标位置)
+    """
+    lower, upper = shard_range
+    producer = producer_class(shard={'index': index, 'lower': lower, 'upper': upper}, **producer_kwargs)
+
+    def report(messages: int, acked: int, position) -> None:
+        progress_queue.put((index, attempt, messages, acked, position))
+
+    try:
+        producer.sync(progress=lambda progress: report(progress['messages'], progress['acked'], progress['position']))
+    finally:
+        producer.flush_and_close()
+    report(producer.stats.counters['messages'], producer.stats.counters['acked'],
+           producer.mongodb_stream.historical_cursor_position)
+
+
+class ShardedSync:
+    """
+    分片并行同步调度器（父进程）
+    """
+
+    logger = get_logger("sharded_sync")
+
+    def __init__(self,
+                 producer_class,
+                 topic: str,
+                 shards: int,
+                 split: str = 'time',
+                 full_amount: bool = False,
+                 max_restarts: int = 3,
+                 report_seconds: float = 10.0,
+                 producer_kwargs: Dict[str, Any] = None):
+        """
+        :param producer_class: 生产者类（需支持 shard 参数，如 InformationtoKafkaProducer）
+        :param topic: Kafka 主题名
+        :param shards: 分片数
+        :param split: 切分方式：time / sample
+        :param full_amount: 是否全量同步（重新切分并从各分片起点开始）
+        :param max_restarts: 每个分片异常退出后的最大重启次数
+        :param report_seconds: 汇总进度的输出间隔（秒）
+        :param producer_kwargs: 传给生产者的其他参数（需可 pickle）
+        :raises ValueError: 切分方式不支持，或排序键不是 `_id`
+        """
+        if split not in SPLITTERS:
+            raise ValueError(f'不支持的切分方式：{split}，可选：{list(SPLITTERS)}')
+        sort_key = (producer_kwargs or {}).get('sort_key') or getattr(producer_class, 'sort_key', '_id')
+        if sort_key not in ('_id', ('_id',)):
+            raise ValueError(f'分片同步按 _id 区间切分，只支持以 _id 为排序键，当前为 {sort_key!r}；'
+                             f'复合水位线请使用单进程同步')
+        self.producer_class = producer_class
+        self.topic = topic
+        self.shards = shards
+        self.split = split
+        self.full_amount = full_amount
+        self.max_restarts = max_restarts
+        self.report_seconds = report_seconds
+        self.producer_kwargs = producer_kwargs or {}
+        # 每个分片的限流配额（run() 按实际分片数计算）
+        self.shard_rate_limit = None
+        self.plan_path = os.path.join(CURSOR_FILE_PATH, topic, producer_class.collection, 'shards.json')
+
+    # ---------------- 分片计划 ----------------
+    def plan(self) -> List[ShardRange]:
+        """
+        加载或生成分片计划：非全量同步且已有相同分片数的计划时沿用，保证各分片游标与区间对应
+        """
+        if not self.full_amount and os.path.exists(self.plan_path):
+            with open(self.plan_path, encoding='utf-8') as f:
+                saved = json.load(f)
+            if len(saved['ranges']) == self.shards:
+                return [tuple(ObjectId(bound) if bound else None for bound in pair) for pair in saved['ranges']]
+            self.logger.warning(f"[Shard] 已有计划分片数为 {len(saved['ranges'])}，与本次 {self.shards} 不一致，重新切分")
+
+        collection = self.producer_class.mongodb_manager.db[self.producer_class.collection]
+        ranges = to_ranges(SPLITTERS[self.split](collection, self.shards))
+        os.makedirs(os.path.dirname(self.plan_path), exist_ok=True)
+        with open(self.plan_path, 'w', encoding='utf-8') as f:
+            json.dump({'split': self.split,
+                       'ranges': [[str(bound) if bound else None for bound in pair] for pair in ranges]}, f)
+        if len(ranges) < self.shards:
+            self.logger.warning(f"[Shard] 数据量不足，实际分片数 {len(ranges)}")
+        return ranges
+
+    # ---------------- 调度 ----------------
+    def _start(self, context, index: int, attempt: int, shard_range: ShardRange, progress_queue):
+        # 重启时不再全量（也不再回退游标），从该分片已提交的游标继续
+        kwargs = dict(self.producer_kwargs, topic=self.topic, full_amount=self.full_amount and attempt == 0)
+        if attempt and kwargs.get('rewind') is not None:
+            kwargs['rewind'] = None
+        if self.shard_rate_limit:
+            kwargs['rate_limit'] = self.shard_rate_limit
+        process = context.Process(
+            target=_run_shard,
+            args=(self.producer_class, kwargs, index, attempt, shard_range, progress_queue),
+            name=f'shard-{index}',
+        )
+        process.start()
+        return process
+
+    def run(self) -> Dict[str, Any]:
+        """
+        启动全部分片并等待完成
+
+        :return: 汇总进度；任一分片超过最大重启次数仍失败时抛出 RuntimeError
+        """
+        ranges = self.plan()
+        self.shard_rate_limit = split_rate_limit(
+            self.producer_kwargs.get('rate_limit') or TOPIC_RATE_LIMITS.get(self.topic), len(ranges))
+        context = multiprocessing.get_context('spawn')
+        progress_queue = context.Queue()
+        processes = {index: self._start(context, index, 0, shard_range, progress_queue)
+                     for index, shard_range in enumerate(ranges)}
+        restarts = {index: 0 for index in processes}
+        progress = {index: {'messages': 0, 'acked': 0, 'position': None} for index in processes}
+        # 每次运行（含重启）各自从 0 计数：(分片, 第几次运行) -> (发送条数, 确认条数)
+        attempts = {}
+        finished, failed = set(), set()
+        reported_at = time.monotonic()
+
+        def consume(block: bool) -> bool:
+            try:
+                index, attempt, messages, acked, position = progress_queue.get(timeout=1.0 if block else None,
+                                                                               block=block)
+            except queue.Empty:
+                return False
+            attempts[index, attempt] = (messages, acked)
+            runs = [counts for (shard, _), counts in attempts.items() if shard == index]
+            progress[index].update(messages=sum(run[0] for run in runs), acked=sum(run[1] for run in runs))
+            if position is not None:
+                progress[index]['position'] = position
+            return True
+
+        while len(finished) + len(failed) < len(processes):
+            consume(block=True)
+
+            for index, process in processes.items():
+                if index in finished or index in failed or process.is_alive():
+                    continue
+                if process.exitcode == 0:
+                    finished.add(index)
+                    self.logger.info(f"[Shard] 分片 {index} 完成：{progress[index]}")
+                elif restarts[index] < self.max_restarts:
+                    restarts[index] += 1
+                    self.logger.warning(f"[Shard] 分片 {index} 异常退出（exitcode={process.exitcode}），"
+                                        f"第 {restarts[index]} 次重启，从分片游标续传")
+                    processes[index] = self._start(context, index, restarts[index], ranges[index], progress_queue)
+                else:
+                    failed.add(index)
+                    self.logger.error(f"[Shard] 分片 {index} 超过最大重启次数，放弃")
+
+            if time.monotonic() - reported_at >= self.report_seconds:
+                reported_at = time.monotonic()
+                self.logger.info(f"[Shard] 汇总进度：{self._aggregate(progress, finished, restarts)}")
+
+        # 消费进程退出前残留的进度
+        while consume(block=False):
+            pass
+
+        summary = self._aggregate(progress, finished, restarts)
+        self.logger.info(f"[Shard] 同步结束：{summary}")
+        if failed:
+            raise RuntimeError(f'分片 {sorted(failed)} 同步失败，重新运行将从各分片游标续传')
+
+        # 最后一个有数据的分片游标即全局最大位置，写入主游标供后续增量同步使用
+        last_position = next((progress[index]['position'] for index in reversed(range(len(ranges)))
+                              if progress[index]['position']), None)
+        if self.producer_kwargs.get('since') is not None or self.producer_kwargs.get('until') is not None:
+            # 时间窗口同步只推进窗口游标，主游标保持不变
+            return summary
+        if last_position:
+            cursor = create_cursor_manager(self.producer_kwargs.get('cursor_backend') or 'file',
+                                           collection=self.producer_class.collection, topic=self.topic)
+            cursor.save(last_position)
+            cursor.flush()
+        return summary
+
+    @staticmethod
+    def _aggregate(progress, finished, restarts) -> Dict[str, Any]:
+        return {
+            'messages': sum(item['messages'] for item in progress.values()),
+            'acked': sum(item['acked'] for item in progress.values()),
+            'finished_shards': len(finished),
+            'total_shards': len(progress),
+            'restarts': sum(restarts.values()),
+            'shards': progress,
+        }
@@ -0,0 +1,196 @@
+import os
+import struct
+import time
+import zlib
+from threading import Event, Lock
+from typing import Iterator, List, Optional, Tuple
+
+from kafka.errors import KafkaTimeoutError
+from kafka.future import Future
+
+from application.config import SPOOL_PATH
+from application.utils.logger import get_logger
+
+# 已落盘（尚未发送到 Kafka）的消息对应的投递结果
+SPOOLED = 'spooled'
+
+_RECORD_HEADER = struct.Struct('>II')  # 记录长度、CRC32
+_INT = struct.Struct('>i')
+_SHORT = struct.Struct('>H')
+
+SpoolRecord = Tuple[Optional[bytes], Optional[bytes], Optional[List[tuple]]]  # (key, value, headers)，value 为 None 表示 tombstone
+
+
+class DeliveryFuture(Future):
+    """
+    可阻塞等待的投递结果（与 FutureRecordMetadata 一样提供 get()）
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._event = Event()
+        self.add_both(lambda _: self._event.set())
+
+    def get(self, timeout: float = None):
+        if not self._event.wait(timeout):
+            raise KafkaTimeoutError(f'等待投递结果超时（{timeout} 秒）')
+        if self.failed():
+            raise self.exception
+        return self.value
+
+
+def _encode_record(key: Optional[bytes], value: Optional[bytes], headers: Optional[List[tuple]]) -> bytes:
+    parts = [_INT.pack(-1) if key is None else _INT.pack(len(key)) + key,
+             _INT.pack(-1) if value is None else _INT.pack(len(value)) + value,
+             _SHORT.pack(len(headers or []))]
+    for name, header_value in headers or []:
+        name = name.encode('utf-8')
+        parts.append(_SHORT.pack(len(name)) + name + _INT.pack(len(header_value)) + header_value)
+    payload = b''.join(parts)
+    return _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode_record(payload: bytes) -> SpoolRecord:
+    pos = 0
+
+    def read_bytes(size_struct):
+        nonlocal pos
+        (size,) = size_struct.unpack_from(payload, pos)
+        pos += size_struct.size
+        if size < 0:
+            return None
+        data = payload[pos:pos + size]
+        pos += size
+        return data
+
+    key = read_bytes(_INT)
+    value = read_bytes(_INT)
+    (count,) = _SHORT.unpack_from(payload, pos)
+    pos += _SHORT.size
+    headers = [(read_bytes(_SHORT).decode('utf-8'), read_bytes(_INT)) for _ in range(count)]
+    return key, value, headers or None
+
+
+class DiskSpool:
+    """
+    本地磁盘落盘缓冲（write-ahead spool）
+
+    Kafka 不可用时，把已序列化的消息按顺序追加到 `runtime/spool/<topic>/` 下的分段文件，
+    每条记录带长度与 CRC32，崩溃造成的半条尾记录会在读取时被丢弃。
+    消息落盘并 sync() 之后即可视为"已持久化"，游标可以越过它们；
+    broker 恢复后由 drain() 按分段顺序全速重放，整段确认后删除该分段。
+    """
+
+    logger = get_logger("spool")
+
+    def __init__(self, topic: str, root_path: str = None, segment_bytes: int = 64 * 1024 * 1024):
+        """
+        :param topic: Kafka 主题名
+        :param root_path: 落盘根目录，默认 runtime/spool
+        :param segment_bytes: 单个分段文件的大小上限
+        """
+        self.topic = topic
+        self.directory = os.path.join(root_path or SPOOL_PATH, topic)
+        self.segment_bytes = segment_bytes
+        self._lock = Lock()
+        self._writer = None
+        self._dirty = False
+
+    # ---------------- 写入 ----------------
+    def segments(self) -> List[str]:
+        """
+        按顺序返回所有分段文件路径
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith('.seg'))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def _open_writer(self):
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self.segments()
+        next_index = int(os.path.basename(existing[-1])[:-4]) + 1 if existing else 1
+        return open(os.path.join(self.directory, f'{next_index:020d}.seg'), 'ab')
+
+    def append(self, value: Optional[bytes], key: Optional[bytes] = None, headers: Optional[List[tuple]] = None) -> None:
+        """
+        追加一条记录（线程安全，投递失败回调会在 I/O 线程中调用）
+        """
+        record = _encode_record(key, value, headers)
+        with self._lock:
+            if self._writer is None:
+                self._writer = self._open_writer()
+            self._writer.write(record)
+            self._dirty = True
+            if self._writer.tell() >= self.segment_bytes:
+                self._close_writer()
+
+    def sync(self) -> None:
+        """
+        把已追加的记录刷到磁盘（fsync），在提交游标之前调用
+        """
+        with self._lock:
+            if self._writer is not None and self._dirty:
+                self._writer.flush()
+                os.fsync(self._writer.fileno())
+            self._dirty = False
+
+    def _close_writer(self) -> None:
+        if self._writer is not None:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+            self._writer.close()
+            self._writer = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_writer()
+
+    # ---------------- 读取与重放 ----------------
+    def read_segment(self, path: str) -> Iterator[SpoolRecord]:
+        """
+        顺序读取分段中的记录，遇到不完整或校验失败的尾记录即停止
+        """
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    return
+                size, crc = _RECORD_HEADER.unpack(header)
+                payload = f.read(size)
+                if len(payload) < size or zlib.crc32(payload) != crc:
+                    self.logger.warning(f"[Spool] {path} 存在不完整的尾记录，已忽略")
+                    return
+                yield _decode_record(payload)
+
+    def pending(self) -> bool:
+        """
+        是否存在待重放的记录
+        """
+        return bool(self.segments())
+
+    def drain(self, producer, timeout: float = 60.0) -> int:
+        """
+        把落盘记录全速重放到 Kafka：逐段异步发送，整段确认后删除该分段
+
+        :param producer: KafkaProducer（不经过落盘兜底，避免失败时重复落盘）
+        :param timeout: 每段等待确认的超时时间（秒）
+        :return: 重放的记录条数；任一记录投递失败时抛出异常，未确认的分段保留到下次重放
+
+        只等待重放消息自身的 Future，不调用 producer.flush()：连接池中的 KafkaProducer 可能被其他生产者共享，
+        flush 会一并等待它们的消息。
+        """
+        self.close()
+        replayed = 0
+        for path in self.segments():
+            futures = [
+                producer.send(self.topic, value=value, key=key, headers=headers)
+                for key, value, headers in self.read_segment(path)
+            ]
+            deadline = time.monotonic() + timeout
+            for future in futures:
+                future.get(timeout=max(deadline - time.monotonic(), 0))
+            os.remove(path)
+            replayed += len(futures)
+            self.logger.info(f"[Spool] 已重放分段 {os.path.basename(path)}：{len(futures)} 条")
+        return replayed
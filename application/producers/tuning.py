@@ -0,0 +1,141 @@
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+from application.config import TUNING_LOG_PATH
+from application.utils.logger import get_logger
+
+
+class AdaptiveTuner:
+    """
+    batch_size / linger_ms 自适应调优控制器
+
+    定期读取 KafkaProducer.metrics() 中的记录发送速率、字节速率、平均批大小与请求延迟，
+    按目标计算新的 batch_size / linger_ms：
+
+    - 填满一个批次所需时间 fill_time = batch_size / byte_rate，linger_ms 超过它只是空等
+    - throughput：linger_ms 取 fill_time；批次经常被填满（填充率 > 90%）时加倍 batch_size
+    - latency：linger_ms 取 min(fill_time, 目标延迟 - 请求延迟)；请求延迟本身超标时减半 batch_size
+
+    新旧取值相差超过 `hysteresis` 才会调整，避免来回抖动。每次决策（输入指标、规则参数、
+    新旧配置）以 JSON 行写入 runtime/tuning/<topic>.jsonl，便于复现。
+    """
+
+    logger = get_logger("tuning")
+    objectives = ('latency', 'throughput')
+
+    def __init__(self,
+                 topic: str,
+                 objective: str = 'throughput',
+                 target_latency_ms: float = 200.0,
+                 interval_seconds: float = 30.0,
+                 min_batch_size: int = 16 * 1024,
+                 max_batch_size: int = 1024 * 1024,
+                 min_linger_ms: int = 5,
+                 max_linger_ms: int = 1000,
+                 hysteresis: float = 0.25,
+                 log_path: str = None):
+        """
+        :param topic: Kafka 主题名（用于决策日志文件名）
+        :param objective: 调优目标：latency / throughput
+        :param target_latency_ms: latency 目标下的端到端延迟目标（毫秒）
+        :param interval_seconds: 两次决策之间的最短间隔（秒）
+        :param hysteresis: 相对变化超过该比例才调整
+        :param log_path: 决策日志目录，默认 runtime/tuning
+        """
+        if objective not in self.objectives:
+            raise ValueError(f'不支持的调优目标：{objective}，可选：{self.objectives}')
+        self.topic = topic
+        self.objective = objective
+        self.target_latency_ms = target_latency_ms
+        self.interval_seconds = interval_seconds
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.min_linger_ms = min_linger_ms
+        self.max_linger_ms = max_linger_ms
+        self.hysteresis = hysteresis
+        self.log_file = os.path.join(log_path or TUNING_LOG_PATH, f'{topic}.jsonl')
+        self._last_decision_at = time.monotonic()
+
+    def due(self) -> bool:
+        """
+        距上次决策是否已超过间隔
+        """
+        return time.monotonic() - self._last_decision_at >= self.interval_seconds
+
+    @staticmethod
+    def _clamp(value: float, low: float, high: float) -> int:
+        return int(max(low, min(high, value)))
+
+    def _changed(self, old: float, new: float) -> bool:
+        return old <= 0 or abs(new - old) / old > self.hysteresis
+
+    def observe(self, metrics: Optional[Dict[str, Any]], config: Dict[str, Any]) -> Optional[Dict[str, int]]:
+        """
+        根据当前指标与配置做一次决策
+
+        :param metrics: KafkaProducer.metrics() 的返回值
+        :param config: 当前生产者配置（需包含 batch_size、linger_ms）
+        :return: 需要更新的配置项；无需调整时返回 None
+        """
+        self._last_decision_at = time.monotonic()
+        producer_metrics = (metrics or {}).get('producer-metrics', {})
+        observed = {
+            'record_send_rate': producer_metrics.get('record-send-rate') or 0.0,
+            'byte_rate': producer_metrics.get('byte-rate') or 0.0,
+            'batch_size_avg': producer_metrics.get('batch-size-avg') or 0.0,
+            'record_queue_time_avg': producer_metrics.get('record-queue-time-avg') or 0.0,
+            'request_latency_avg': producer_metrics.get('request-latency-avg') or 0.0,
+        }
+        if observed['byte_rate'] <= 0:
+            # 尚无发送数据，不做决策
+            return None
+
+        batch_size = config['batch_size']
+        linger_ms = config['linger_ms']
+        fill_ratio = observed['batch_size_avg'] / batch_size if batch_size else 0.0
+        fill_time_ms = batch_size / observed['byte_rate'] * 1000
+
+        new_batch_size = batch_size
+        if self.objective == 'throughput':
+            new_linger_ms = fill_time_ms
+            if fill_ratio > 0.9:
+                new_batch_size = batch_size * 2
+        else:
+            budget_ms = self.target_latency_ms - observed['request_latency_avg']
+            new_linger_ms = min(fill_time_ms, budget_ms)
+            if observed['request_latency_avg'] > self.target_latency_ms:
+                new_batch_size = batch_size // 2
+
+        new_linger_ms = self._clamp(new_linger_ms, self.min_linger_ms, self.max_linger_ms)
+        new_batch_size = self._clamp(new_batch_size, self.min_batch_size, self.max_batch_size)
+
+        changes = {}
+        if self._changed(linger_ms, new_linger_ms):
+            changes['linger_ms'] = new_linger_ms
+        if new_batch_size != batch_size:
+            changes['batch_size'] = new_batch_size
+
+        self._log_decision(observed, fill_ratio, fill_time_ms, config, changes)
+        return changes or None
+
+    def _log_decision(self, observed, fill_ratio, fill_time_ms, config, changes) -> None:
+        record = {
+            'time': time.time(),
+            'topic': self.topic,
+            'objective': self.objective,
+            'target_latency_ms': self.target_latency_ms,
+            'hysteresis': self.hysteresis,
+            'observed': observed,
+            'fill_ratio': round(fill_ratio, 4),
+            'fill_time_ms': round(fill_time_ms, 3),
+            'current': {'batch_size': config['batch_size'], 'linger_ms': config['linger_ms']},
+            'changes': changes,
+        }
+        os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        if changes:
+            self.logger.info(f"[Tuning] {self.topic} 调整生产者配置：{record['current']} -> {changes}，"
+                             f"填充率 {fill_ratio:.1%}，填满耗时 {fill_time_ms:.0f}ms")
@@ -71,6 +71,31 @@ PRODUCER_CONFIG = {
     "linger_ms": 1000,
 
 }
+# change stream 实时同步使用的生产者配置：缩短 linger_ms，保证 Mongo 写入到 Kafka 确认在 1 秒以内
+STREAM_PRODUCER_CONFIG = PRODUCER_CONFIG | {
+    "linger_ms": 5,
+}
+# Kafka 游标存储（cursor_backend=kafka）：游标写入该主题，需创建为 cleanup.policy=compact，
+# key 为 <topic>/<collection>/<游标名>，压缩后每个游标只保留最新值；写入等待所有 ISR 副本确认
+CURSOR_TOPIC = "sync_cursors"
+CURSOR_PRODUCER_CONFIG = PRODUCER_CONFIG | {
+    "acks": "all",
+    "linger_ms": 0,
+}
+# 各 topic 的发送限流（令牌桶），未配置的 topic 不限流
+#   messages_per_sec：每秒最多发送的消息条数
+#   bytes_per_sec：每秒最多发送的字节数
+#   burst_seconds：允许突发的时长（桶容量 = 速率 * burst_seconds）
+TOPIC_RATE_LIMITS = {
+    # "temp4": {"messages_per_sec": 5000, "bytes_per_sec": 10 * 1024 * 1024, "burst_seconds": 1.0},
+}
+# 各 topic 的压缩方式（可先用 run_compression_benchmark.py 对比），未配置的 topic 使用 PRODUCER_CONFIG 的 compression_type
+#   codec：gzip / snappy / lz4 / zstd（KafkaProducer 整批压缩）、zstd_dict（应用层字典压缩）、none
+#   dict_id：zstd_dict 模式使用的字典 id（基准命令训练并保存字典后输出）
+#   level：zstd_dict 模式的压缩级别
+TOPIC_COMPRESSION = {
+    # "temp4": {"codec": "zstd_dict", "dict_id": 1234567890, "level": 3},
+}
 # ElasticSearch数据库连接
 ELASTIC_CONNECTION = [
     {
@@ -0,0 +1,252 @@
+import hashlib
+import math
+import os
+import sqlite3
+import struct
+from threading import Lock
+from typing import Dict, List, Optional, Sequence
+
+from application.config import DEDUP_INDEX_PATH
+from application.utils.logger import get_logger
+
+# 内容未变化、被去重跳过的消息对应的投递结果
+SKIPPED = 'skipped'
+
+
+def content_hash(value: bytes) -> bytes:
+    """
+    消息内容指纹（blake2b，16 字节）
+    """
+    return hashlib.blake2b(value, digest_size=16).digest()
+
+
+class BloomFilter:
+    """
+    布隆过滤器：位数组 + 双重哈希（k 个位置由 blake2b 的两段 64 位整数推导）
+
+    判断为"不存在"时一定不存在；判断为"存在"时有 error_rate 的误判概率。
+    """
+
+    _HEADER = struct.Struct('>QQ')  # 位数 m、哈希个数 k
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """
+        :param capacity: 预计容纳的元素个数
+        :param error_rate: 期望误判率
+        """
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: bytes):
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1, h2 = struct.unpack('>QQ', digest)
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, item: bytes) -> None:
+        bits = self.bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: bytes) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def save(self, path: str) -> None:
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self._HEADER.pack(self.size, self.hashes))
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['BloomFilter']:
+        """
+        从文件加载；文件不存在或已损坏时返回 None
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            header = f.read(cls._HEADER.size)
+            if len(header) < cls._HEADER.size:
+                return None
+            size, hashes = cls._HEADER.unpack(header)
+            bits = bytearray(f.read())
+        if len(bits) != (size + 7) // 8:
+            return None
+        bloom = cls.__new__(cls)
+        bloom.size, bloom.hashes, bloom.bits = size, hashes, bits
+        return bloom
+
+
+class DedupIndex:
+    """
+    持久化的内容去重索引：uid -> 已成功投递消息的内容指纹
+
+    - 存储：`runtime/dedup/<topic>/<collection>/index.sqlite`（uid 主键，WITHOUT ROWID）
+    - 前置布隆过滤器：以 uid + 指纹为元素，全部驻留内存，查询默认完全在内存中完成：
+      未命中说明是新文档或内容已变化，需要发送；命中即视为未变化并跳过（有 error_rate 的概率误判，漏发已变化的文档）。
+      verify=True 时命中后再按批查询 SQLite 确认，不会误判，但内容未变化的重复同步中几乎每条文档都命中，
+      每批都要按 uid 查询 SQLite（索引大于页缓存时即为随机磁盘读）。
+    - 布隆过滤器无法删除元素，uid 的指纹被覆盖（内容变化、tombstone）后旧指纹仍会命中：
+      本次运行中被覆盖过的 uid 在内存中保存最新指纹，命中时以最新指纹为准（A→B→A、删除后重新写入都会重新发送）。
+    - 写入：投递确认后调用 record() 暂存，checkpoint 时 commit() 批量落库。
+    - 布隆过滤器在 close() 时落盘；打开时若文件缺失（如上次异常退出）则从 SQLite 重建。
+      本次运行覆盖过指纹时不落盘，下次打开从 SQLite 重建，重建后只包含每个 uid 的最新指纹。
+    """
+
+    logger = get_logger("dedup_index")
+
+    def __init__(self,
+                 topic: str,
+                 collection: str,
+                 root_path: str = None,
+                 capacity: int = 20_000_000,
+                 error_rate: float = 0.001,
+                 verify: bool = False):
+        """
+        :param topic: Kafka 主题名
+        :param collection: 数据源集合名
+        :param root_path: 索引根目录，默认 runtime/dedup
+        :param capacity: 布隆过滤器预计容量（文档数）
+        :param error_rate: 布隆过滤器误判率
+        :param verify: 布隆过滤器命中后是否查询 SQLite 确认（默认关闭，查询完全在内存中完成，
+                       有 error_rate 概率把已变化的文档误判为未变化；开启后不会误判，但命中的文档都要访问磁盘）
+        """
+        self.directory = os.path.join(root_path or DEDUP_INDEX_PATH, topic, collection)
+        os.makedirs(self.directory, exist_ok=True)
+        self.verify = verify
+        self._lock = Lock()
+        self._pending = []
+        # 本次运行中指纹被覆盖过的 uid -> 最新指纹
+        self._latest: Dict[str, bytes] = {}
+
+        self.conn = sqlite3.connect(os.path.join(self.directory, 'index.sqlite'), check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS dedup (uid TEXT PRIMARY KEY, hash BLOB NOT NULL) WITHOUT ROWID')
+
+        self.bloom_path = os.path.join(self.directory, 'bloom.bin')
+        self.bloom = BloomFilter.load(self.bloom_path)
+        if self.bloom is None:
+            self.bloom = BloomFilter(capacity, error_rate)
+            self._rebuild_bloom()
+        else:
+            # 运行期间删除落盘文件，异常退出后下次打开会从 SQLite 重建
+            os.remove(self.bloom_path)
+
+        self.checked = 0
+        self.bloom_hits = 0
+        self.skipped = 0
+        self.false_positives = 0
+
+    @staticmethod
+    def _bloom_item(uid: str, digest: bytes) -> bytes:
+        return uid.encode('utf-8') + b'\x00' + digest
+
+    def _rebuild_bloom(self) -> None:
+        count = 0
+        for uid, digest in self.conn.execute('SELECT uid, hash FROM dedup'):
+            self.bloom.add(self._bloom_item(uid, digest))
+            count += 1
+        if count:
+            self.logger.info(f"[Dedup] 已从索引重建布隆过滤器：{count} 条")
+
+    def unchanged(self, uids: Sequence[Optional[str]], digests: Sequence[bytes]) -> List[bool]:
+        """
+        批量判断文档内容是否与上次投递时一致
+
+        :return: 与输入一一对应的布尔列表，True 表示内容未变化、可跳过发送
+        """
+        bloom = self.bloom
+        bloom_item = self._bloom_item
+        result = [uid is not None and bloom_item(uid, digest) in bloom for uid, digest in zip(uids, digests)]
+        candidates = [i for i, hit in enumerate(result) if hit]
+        self.checked += len(result)
+        self.bloom_hits += len(candidates)
+
+        latest = self._latest
+        if candidates and latest:
+            # 指纹被覆盖过的 uid：布隆过滤器中的旧指纹已失效，按最新指纹判断
+            for i in candidates:
+                current = latest.get(uids[i])
+                if current is not None and current != digests[i]:
+                    result[i] = False
+                    self.false_positives += 1
+            candidates = [i for i in candidates if result[i]]
+
+        if candidates and self.verify:
+            stored = {}
+            for start in range(0, len(candidates), 500):
+                chunk = [uids[i] for i in candidates[start:start + 500]]
+                placeholders = ','.join('?' * len(chunk))
+                stored.update(self.conn.execute(
+                    f'SELECT uid, hash FROM dedup WHERE uid IN ({placeholders})', chunk
+                ).fetchall())
+            for i in candidates:
+                if stored.get(uids[i]) != digests[i]:
+                    result[i] = False
+                    self.false_positives += 1
+
+        self.skipped += sum(result)
+        return result
+
+    def record(self, uid: Optional[str], digest: bytes) -> None:
+        """
+        记录一条已成功投递的消息（在投递回调中调用，线程安全）
+        """
+        if uid is None:
+            return
+        with self._lock:
+            self._pending.append((uid, digest))
+
+    def commit(self) -> None:
+        """
+        把暂存的记录批量写入 SQLite 并加入布隆过滤器
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        latest, replaced = {}, set()
+        for uid, digest in pending:
+            if uid in latest or uid in self._latest:
+                replaced.add(uid)
+            latest[uid] = digest
+        # 已有记录的 uid 会被覆盖，需保存其最新指纹（只查询本批新投递的 uid，跳过的文档不访问磁盘）
+        uids = [uid for uid in latest if uid not in replaced]
+        for start in range(0, len(uids), 500):
+            chunk = uids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            replaced.update(uid for uid, in self.conn.execute(
+                f'SELECT uid FROM dedup WHERE uid IN ({placeholders})', chunk
+            ))
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO dedup (uid, hash) VALUES (?, ?)', latest.items())
+        for uid, digest in latest.items():
+            self.bloom.add(self._bloom_item(uid, digest))
+            if uid in replaced:
+                self._latest[uid] = digest
+
+    def report(self) -> dict:
+        """
+        本次运行的去重统计
+        """
+        checked = self.checked or 1
+        return {
+            'checked': self.checked,
+            'skipped': self.skipped,
+            'skip_ratio': round(self.skipped / checked, 4),
+            'bloom_hit_ratio': round(self.bloom_hits / checked, 4),
+            'false_positives': self.false_positives,
+        }
+
+    def close(self) -> None:
+        self.commit()
+        if self._latest:
+            # 布隆过滤器中有失效的旧指纹：不落盘，下次打开时从 SQLite 重建
+            self.logger.info(f"[Dedup] {len(self._latest)} 个 uid 的指纹已被覆盖，下次打开时重建布隆过滤器")
+        else:
+            self.bloom.save(self.bloom_path)
+        self.conn.close()
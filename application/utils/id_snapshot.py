@@ -0,0 +1,181 @@
+"""
+有序 `_id` 快照文件
+
+按升序保存一个集合的全部 ObjectId，用于删除对账（见 producers.delete_reconciler）。
+ObjectId 视为 96 位无符号整数，文件中保存相邻 id 的差值（LEB128 变长编码）：
+
+    header  b'IDS1' + 条数（>Q，写完后回填）
+    body    varint(id_0 - 0), varint(id_1 - id_0), ...
+
+读写均为顺序流式处理，内存占用与 id 数量无关；写入先落到临时文件，commit() 时原子替换。
+
+两次对账之间投递过的 id 追加到同目录的投递日志（IdJournal，每条 12 字节原始 ObjectId，无序、可重复），
+对账时按块排序去重（read_journal）后与快照归并，写入后又删除的文档同样能发现。
+"""
+import heapq
+import os
+import struct
+import tempfile
+from threading import Lock
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from bson import ObjectId
+
+_MAGIC = b'IDS1'
+_HEADER = struct.Struct('>4sQ')
+_READ_CHUNK = 1 << 20
+_OID_SIZE = 12
+
+
+class IdSnapshotWriter:
+    """
+    顺序写入快照：append() 的 id 必须严格递增
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f'{path}.{os.getpid()}.tmp'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file: Optional[BinaryIO] = open(self.tmp_path, 'wb')
+        self._file.write(_HEADER.pack(_MAGIC, 0))
+        self._previous = -1
+        self.count = 0
+
+    def append(self, oid: ObjectId) -> None:
+        if not isinstance(oid, ObjectId):
+            raise ValueError(f'快照只支持 ObjectId 类型的 _id：{oid!r}')
+        value = int.from_bytes(oid.binary, 'big')
+        if value <= self._previous:
+            raise ValueError(f'快照 id 必须严格递增：{oid}')
+        delta = value - max(self._previous, 0)
+        self._previous = value
+        out = bytearray()
+        while delta > 0x7f:
+            out.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        out.append(delta)
+        self._file.write(out)
+        self.count += 1
+
+    def commit(self) -> None:
+        """
+        回填条数、fsync 并原子替换旧快照
+        """
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(_MAGIC, self.count))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        """
+        放弃本次写入，保留旧快照
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self.tmp_path)
+
+
+def read_snapshot(path: str) -> Iterator[ObjectId]:
+    """
+    按升序流式读取快照；文件不存在时视为空快照，内容不完整时抛出 ValueError
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        magic, count = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f'不是 id 快照文件：{path}')
+        value, delta, shift, read = 0, 0, 0, 0
+        while True:
+            chunk = f.read(_READ_CHUNK)
+            if not chunk:
+                break
+            for byte in chunk:
+                delta |= (byte & 0x7f) << shift
+                if byte & 0x80:
+                    shift += 7
+                    continue
+                value += delta
+                delta, shift = 0, 0
+                read += 1
+                yield ObjectId(value.to_bytes(12, 'big'))
+        if read != count or shift:
+            raise ValueError(f'id 快照不完整：{path}（头部 {count} 条，读取 {read} 条）')
+
+
+class IdJournal:
+    """
+    已投递 `_id` 的追加日志：add() 只写内存缓冲（投递回调在 I/O 线程调用，线程安全），
+    flush() 以一次 O_APPEND 写入追加到文件并 fsync。每次 flush 单独打开文件，
+    对账改名取走日志后，之后的记录写入新文件；多个分片进程可以追加同一个日志。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._buffer = bytearray()
+        self._lock = Lock()
+
+    def add(self, oid) -> None:
+        """
+        记录一个已投递的 id（非 ObjectId 的 id 不参与对账，直接忽略）
+        """
+        if isinstance(oid, ObjectId):
+            with self._lock:
+                self._buffer += oid.binary
+
+    def flush(self) -> None:
+        with self._lock:
+            data, self._buffer = bytes(self._buffer), bytearray()
+        if not data:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    close = flush
+
+
+def read_journal(paths: Iterable[str], chunk_records: int = 1 << 18) -> Iterator[ObjectId]:
+    """
+    按升序、去重流式读取投递日志：每 chunk_records 条排序后写入临时文件，再多路归并，
+    内存占用与日志大小无关。末尾不完整的记录（写入中途崩溃）被忽略。
+    """
+    runs = []
+    try:
+        for path in paths:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(chunk_records * _OID_SIZE)
+                    if not chunk:
+                        break
+                    end = len(chunk) - len(chunk) % _OID_SIZE
+                    run = tempfile.TemporaryFile()
+                    runs.append(run)
+                    # 12 字节大端序的字节串比较与 ObjectId 的顺序一致
+                    run.write(b''.join(sorted({chunk[i:i + _OID_SIZE] for i in range(0, end, _OID_SIZE)})))
+                    run.seek(0)
+        previous = None
+        for raw in heapq.merge(*map(_read_run, runs)):
+            if raw != previous:
+                previous = raw
+                yield ObjectId(raw)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def _read_run(run: BinaryIO) -> Iterator[bytes]:
+    while True:
+        block = run.read(_READ_CHUNK - _READ_CHUNK % _OID_SIZE)
+        if not block:
+            return
+        for i in range(0, len(block), _OID_SIZE):
+            yield block[i:i + _OID_SIZE]
@@ -0,0 +1,184 @@
+"""
+按需解码的 BSON 文档
+
+pymongo 默认把每篇文档完整解码为嵌套的 dict / list（包括很大的 info_section 数组），
+而消息构造只用到其中少数字段。LazyBSONDocument 保留服务器返回的原始 BSON 字节：
+
+1. 首次访问时只扫描顶层元素的偏移（不解码值）
+2. 访问某个字段时只解码该元素（数组整体解码为 list / dict）；嵌入文档不解码，仍以 LazyBSONDocument 返回
+3. 未访问的字段不解码；嵌入文档原样传给编码器，由 json_default() 在编码时用 C 扩展一次展开
+
+transform 会给文档赋值（如 doc['uid']），赋值写入覆盖层，不修改原始字节。
+使用方式见 MongoDBDataStream 的 raw 参数（db.mongo_db.mongo_db_manager）。
+"""
+import struct
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import bson
+from bson.codec_options import CodecOptions
+from bson.errors import InvalidBSON
+from bson.raw_bson import RawBSONDocument
+
+_INT32 = struct.Struct('<i')
+# 定长类型的值字节数：double、undefined、ObjectId、bool、datetime、null、int32、timestamp、int64、decimal128、min/max key
+_FIXED_SIZES = {0x01: 8, 0x06: 0, 0x07: 12, 0x08: 1, 0x09: 8, 0x0A: 0, 0x10: 4, 0x11: 8, 0x12: 8, 0x13: 16,
+                0x7F: 0, 0xFF: 0}
+# 值以 int32 长度开头的类型：string、code、symbol（长度不含自身），binary（另有 1 字节子类型）
+_PREFIXED_SIZES = {0x02: 4, 0x0D: 4, 0x0E: 4, 0x05: 5}
+# 值的 int32 长度包含自身的类型：嵌入文档、数组、code with scope
+_SELF_SIZED = (0x03, 0x04, 0x0F)
+
+
+def _scan(data: bytes) -> Dict[str, Tuple[int, int, int]]:
+    """
+    扫描文档的顶层元素：字段名 -> (元素起始偏移, 值起始偏移, 元素结束偏移)，元素包含类型字节与字段名
+    """
+    offsets = {}
+    pos, end = 4, len(data) - 1
+    while pos < end:
+        kind = data[pos]
+        name_end = data.index(b'\x00', pos + 1)
+        value = name_end + 1
+        if kind in _FIXED_SIZES:
+            size = _FIXED_SIZES[kind]
+        elif kind in _PREFIXED_SIZES:
+            size = _PREFIXED_SIZES[kind] + _INT32.unpack_from(data, value)[0]
+        elif kind in _SELF_SIZED:
+            size = _INT32.unpack_from(data, value)[0]
+        elif kind == 0x0B:
+            # 正则：pattern 与 options 两个 C 字符串
+            size = data.index(b'\x00', data.index(b'\x00', value) + 1) + 1 - value
+        elif kind == 0x0C:
+            # DBPointer：string + ObjectId
+            size = 4 + _INT32.unpack_from(data, value)[0] + 12
+        else:
+            raise InvalidBSON(f'未知的 BSON 类型 0x{kind:02x}')
+        offsets[data[pos + 1:name_end].decode('utf-8')] = (pos, value, value + size)
+        pos = value + size
+    return offsets
+
+
+class LazyBSONDocument(RawBSONDocument):
+    """
+    按字段解码的只读 BSON 文档视图（赋值写入覆盖层）
+
+    继承 RawBSONDocument 的类型标记，作为 CodecOptions.document_class 时 pymongo 直接返回原始字节，
+    不做解码；raw 属性即服务器返回的 BSON 字节。
+    """
+    __slots__ = ('_options', '_offsets', '_cache', '_overrides')
+
+    def __init__(self, bson_bytes: bytes, codec_options: CodecOptions = None):
+        codec_options = codec_options or LAZY_BSON_OPTIONS
+        super().__init__(bson_bytes, codec_options)
+        self._options = codec_options
+        self._offsets: Optional[Dict[str, Tuple[int, int, int]]] = None
+        # 已解码的字段值；赋值覆盖单独保存，展开时覆盖原始字段
+        self._cache: Dict[str, Any] = {}
+        self._overrides: Dict[str, Any] = {}
+
+    def _element_offsets(self) -> Dict[str, Tuple[int, int, int]]:
+        if self._offsets is None:
+            self._offsets = _scan(self.raw)
+        return self._offsets
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._overrides:
+            return self._overrides[key]
+        cache = self._cache
+        if key in cache:
+            return cache[key]
+        start, value_start, end = self._element_offsets()[key]
+        raw = self.raw
+        if raw[start] == 0x03:
+            # 嵌入文档：直接包装原始字节，不解码
+            value = type(self)(raw[value_start:end], self._options)
+        else:
+            # 其他元素包装成只含该字段的文档整体解码（数组按 dict 解码，与默认模式一致）
+            element = raw[start:end]
+            value = bson.decode(_INT32.pack(len(element) + 5) + element + b'\x00',
+                                _plain_options(self._options))[key]
+        cache[key] = value
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._overrides[key] = value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._overrides or key in self._element_offsets()
+
+    def __iter__(self) -> Iterator[str]:
+        offsets = self._element_offsets()
+        yield from offsets
+        for key in self._overrides:
+            if key not in offsets:
+                yield key
+
+    def __len__(self) -> int:
+        offsets = self._element_offsets()
+        return len(offsets) + sum(1 for key in self._overrides if key not in offsets)
+
+    def items(self):
+        return self.to_dict().items()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        整篇展开为 dict（C 扩展一次解码，嵌入文档同样为 dict），再应用赋值覆盖
+        """
+        doc = bson.decode(self.raw, _plain_options(self._options))
+        if self._overrides:
+            doc.update(self._overrides)
+        return doc
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __reduce__(self):
+        # 多进程序列化时传输原始字节与覆盖层
+        return _restore, (type(self), self.raw, self._options, self._overrides)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({len(self.raw)} bytes, decoded={list(self._cache)})'
+
+
+def _restore(cls, raw: bytes, codec_options: CodecOptions, overrides: Dict[str, Any]) -> LazyBSONDocument:
+    doc = cls(raw, codec_options)
+    doc._overrides.update(overrides)
+    return doc
+
+
+# 解码选项 -> 同一选项但 document_class 为 dict；CodecOptions 含不可哈希的 TypeRegistry，按 id 缓存并持有原对象
+_PLAIN_OPTIONS: Dict[int, Tuple[CodecOptions, CodecOptions]] = {}
+
+
+def _plain_options(codec_options: CodecOptions) -> CodecOptions:
+    cached = _PLAIN_OPTIONS.get(id(codec_options))
+    if cached is None or cached[0] is not codec_options:
+        cached = _PLAIN_OPTIONS[id(codec_options)] = (codec_options, codec_options.with_options(document_class=dict))
+    return cached[1]
+
+
+LAZY_BSON_OPTIONS = CodecOptions(document_class=LazyBSONDocument)
+
+
+def lazy_codec_options(codec_options: CodecOptions = None) -> CodecOptions:
+    """
+    在集合原有的解码选项（时区等）基础上，把 document_class 换成 LazyBSONDocument
+    """
+    if codec_options is None:
+        return LAZY_BSON_OPTIONS
+    return codec_options.with_options(document_class=LazyBSONDocument)
+
+
+def json_default(value: Any) -> Any:
+    """
+    JSONEncoder 的 default 钩子：编码到 LazyBSONDocument（或其他 Mapping）时才展开为 dict，
+    输出与 dict 完全一致；其他类型照常抛出 TypeError
+    """
+    if isinstance(value, LazyBSONDocument):
+        return value.to_dict()
+    if isinstance(value, Mapping):
+        return dict(value.items())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
@@ -0,0 +1,65 @@
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from threading import Lock
+from typing import Iterable
+
+
+class RunStats:
+    """
+    运行统计：线程安全的计数器、计时器与直方图。
+
+    Kafka 的投递回调在 I/O 线程中触发，因此所有写操作都需要加锁。
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.counters = Counter()
+        self.timers = defaultdict(float)
+        self.histograms = defaultdict(Counter)
+        self.started_at = time.monotonic()
+
+    def incr(self, name: str, value: int = 1) -> None:
+        """
+        累加计数器
+        """
+        with self._lock:
+            self.counters[name] += value
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """
+        累加耗时（秒）
+        """
+        with self._lock:
+            self.timers[name] += seconds
+
+    def observe(self, name: str, values: Iterable[int]) -> None:
+        """
+        把一组取值计入直方图（按 2 的幂分桶，桶名为上界，如 1024 表示 (512, 1024]）
+        """
+        buckets = Counter(1 << max(int(value) - 1, 0).bit_length() for value in values)
+        with self._lock:
+            self.histograms[name].update(buckets)
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        计时上下文：with stats.timer('send'): ...
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def summary(self) -> dict:
+        """
+        汇总当前统计结果，供运行结束时输出
+        """
+        with self._lock:
+            result = {'elapsed': round(time.monotonic() - self.started_at, 3)}
+            result.update(self.counters)
+            result.update({f'{name}_seconds': round(value, 3) for name, value in self.timers.items()})
+            result.update({f'{name}_histogram': dict(sorted(buckets.items()))
+                           for name, buckets in self.histograms.items()})
+        return result
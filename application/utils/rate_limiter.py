@@ -0,0 +1,90 @@
+import time
+from threading import Lock
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """
+    令牌桶：以 rate 的速度补充令牌，最多积累 burst 个，允许短时突发
+
+    acquire() 允许令牌透支：透支部分按速率换算为等待时间并休眠，长期速率严格不超过 rate。
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        """
+        :param rate: 每秒补充的令牌数
+        :param burst: 桶容量（允许的最大突发量），默认等于 1 秒的令牌数
+        """
+        if rate <= 0:
+            raise ValueError(f'令牌桶速率必须大于 0：{rate}')
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        取走 amount 个令牌，不足时休眠等待
+
+        :return: 本次因限流休眠的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class TopicRateLimiter:
+    """
+    单个 topic 的限流器：条数/秒与字节/秒两个令牌桶，任一达到上限即等待
+
+    同一进程内同一 topic 共用一个限流器（见 for_topic），多个生产者实例共享配额。
+    """
+
+    _lock = Lock()
+    _limiters: Dict[str, 'TopicRateLimiter'] = {}
+
+    def __init__(self,
+                 messages_per_sec: float = None,
+                 bytes_per_sec: float = None,
+                 burst_seconds: float = 1.0):
+        """
+        :param messages_per_sec: 每秒最多发送的消息条数，None 表示不限
+        :param bytes_per_sec: 每秒最多发送的字节数，None 表示不限
+        :param burst_seconds: 允许突发的时长（桶容量 = 速率 * burst_seconds）
+        """
+        self.messages = TokenBucket(messages_per_sec, messages_per_sec * burst_seconds) if messages_per_sec else None
+        self.bytes = TokenBucket(bytes_per_sec, bytes_per_sec * burst_seconds) if bytes_per_sec else None
+
+    @classmethod
+    def for_topic(cls, topic: str, limits: Optional[dict]) -> Optional['TopicRateLimiter']:
+        """
+        获取 topic 对应的共享限流器；limits 为空时返回 None（不限流）
+
+        :param limits: 形如 {'messages_per_sec': 5000, 'bytes_per_sec': 10485760, 'burst_seconds': 1.0}
+        """
+        if not limits or not (limits.get('messages_per_sec') or limits.get('bytes_per_sec')):
+            return None
+        with cls._lock:
+            if topic not in cls._limiters:
+                cls._limiters[topic] = cls(**limits)
+            return cls._limiters[topic]
+
+    def acquire(self, messages: int = 1, size: int = 0) -> float:
+        """
+        申请发送 messages 条、共 size 字节
+
+        :return: 因限流等待的总秒数
+        """
+        waited = 0.0
+        if self.messages is not None:
+            waited += self.messages.acquire(messages)
+        if self.bytes is not None and size:
+            waited += self.bytes.acquire(size)
+        return waited
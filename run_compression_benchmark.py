@@ -0,0 +1,172 @@
+import argparse
+import time
+
+from kafka import codec as kafka_codec
+
+from application.producers.compression import FileDictionaryStore, ZstdDictCodec, decompress_value, train_dictionary
+from application.producers.information_mongo_to_kafka_producer import InformationtoKafkaProducer
+from application.settings import PRODUCER_CONFIG
+from application.utils.decorators import log_execution, monitor_performance
+
+# KafkaProducer 整批压缩方式：名称 -> (是否可用, 压缩函数, 解压函数)
+PRODUCER_CODEC_FUNCTIONS = {
+    'gzip': (kafka_codec.has_gzip, kafka_codec.gzip_encode, kafka_codec.gzip_decode),
+    'snappy': (kafka_codec.has_snappy, kafka_codec.snappy_encode, kafka_codec.snappy_decode),
+    'lz4': (kafka_codec.has_lz4, kafka_codec.lz4_encode, kafka_codec.lz4_decode),
+    'zstd': (kafka_codec.has_zstd, kafka_codec.zstd_encode, kafka_codec.zstd_decode),
+}
+
+
+class OfflineKafkaProducer:
+    """
+    基准测试只用到生产者的 transform / 序列化逻辑，不连接 Kafka
+    """
+
+    def __init__(self, **config):
+        self.config = config
+
+    def flush(self, timeout=None):
+        pass
+
+    def close(self, timeout=None):
+        pass
+
+
+def sample_payloads(producer, sample_size: int):
+    """
+    从集合中随机采样文档，经生产者的 transform / value_serialize 得到真实消息体
+    """
+    collection = producer.mongodb_manager.db[producer.collection]
+    docs = list(collection.aggregate([{'$sample': {'size': sample_size}}]))
+    return producer.serialize_batch(producer.transform_batch(docs))
+
+
+def split_batches(payloads, batch_bytes: int):
+    """
+    按 KafkaProducer 的 batch_size 把消息拼成批次（整批压缩的实际输入）
+    """
+    batches, current, size = [], [], 0
+    for payload in payloads:
+        if current and size + len(payload) > batch_bytes:
+            batches.append(b''.join(current))
+            current, size = [], 0
+        current.append(payload)
+        size += len(payload)
+    if current:
+        batches.append(b''.join(current))
+    return batches
+
+
+def measure(name, inputs, compress, decompress, message_count):
+    started = time.process_time()
+    compressed = [compress(item) for item in inputs]
+    compress_seconds = time.process_time() - started
+    started = time.process_time()
+    for item in compressed:
+        decompress(item)
+    decompress_seconds = time.process_time() - started
+    raw_bytes = sum(len(item) for item in inputs)
+    compressed_bytes = sum(len(item) for item in compressed)
+    return {
+        'codec': name,
+        'ratio': round(raw_bytes / compressed_bytes, 3),
+        'bytes_per_message': round(compressed_bytes / message_count, 1),
+        'compress_us_per_message': round(compress_seconds / message_count * 1e6, 2),
+        'decompress_us_per_message': round(decompress_seconds / message_count * 1e6, 2),
+    }
+
+
+@log_execution
+@monitor_performance
+def benchmark(topic, data_type, **kwargs):
+    """
+    压缩方式基准：采样真实文档，对比整批压缩（KafkaProducer compression_type）与
+    应用层 zstd 字典压缩（各压缩级别）的压缩率与 CPU 耗时
+
+    Args:
+        topic (str): Kafka主题名称
+        data_type (str): 数据类型，目前支持 'information'
+        **kwargs: 其他参数
+            sample_size (int): 采样文档数，默认5000（一半训练字典，一半用于评估）
+            levels (list): zstd_dict 的压缩级别，默认 [1, 3, 6, 9, 19]
+            dict_size (int): 字典大小上限（字节），默认112640
+            serializer_mode (str): 序列化模式，默认validated
+
+    Returns:
+        dict: 字典 id、各压缩方式的结果以及推荐的 TOPIC_COMPRESSION 配置
+    """
+    sample_size = kwargs.get('sample_size') or 5000
+    levels = kwargs.get('levels') or [1, 3, 6, 9, 19]
+    dict_size = kwargs.get('dict_size') or 112640
+    serializer_mode = kwargs.get('serializer_mode') or 'validated'
+
+    match data_type:
+        case 'information':
+            producer_class = InformationtoKafkaProducer
+        case _:
+            raise ValueError(f'不支持的数据源：{topic}')
+
+    offline_class = type(f'Offline{producer_class.__name__}', (producer_class,),
+                         {'producer_factory': OfflineKafkaProducer})
+    producer = offline_class(topic=topic, serializer_mode=serializer_mode)
+    try:
+        payloads = sample_payloads(producer, sample_size)
+    finally:
+        producer.flush_and_close()
+    if len(payloads) < 20:
+        raise ValueError(f'采样文档过少（{len(payloads)} 条），无法训练字典')
+
+    # 训练集与评估集分开，避免字典"记住"评估样本导致压缩率虚高
+    training, evaluation = payloads[::2], payloads[1::2]
+    store = FileDictionaryStore()
+    dict_id = store.save(train_dictionary(training, dict_size=dict_size))
+
+    results = []
+    batches = split_batches(evaluation, PRODUCER_CONFIG.get('batch_size', 16384))
+    for name, (available, compress, decompress) in PRODUCER_CODEC_FUNCTIONS.items():
+        if available():
+            results.append(measure(name, batches, compress, decompress, len(evaluation)))
+    for level in levels:
+        codec = ZstdDictCodec(dict_id, level=level, store=store)
+        results.append(measure(f'zstd_dict:{level}', evaluation, codec.compress,
+                               lambda value: decompress_value(value, codec.headers, store), len(evaluation)))
+
+    # 推荐：CPU 耗时不超过当前压缩方式的前提下压缩率最高的方式
+    current = next((r for r in results if r['codec'] == PRODUCER_CONFIG.get('compression_type')), None)
+    budget = current['compress_us_per_message'] if current else float('inf')
+    affordable = [r for r in results if r['compress_us_per_message'] <= budget] or results
+    best = max(affordable, key=lambda r: r['ratio'])
+    if best['codec'].startswith('zstd_dict:'):
+        recommended = {'codec': 'zstd_dict', 'dict_id': dict_id, 'level': int(best['codec'].split(':')[1])}
+    else:
+        recommended = {'codec': best['codec']}
+
+    print(f'采样 {len(payloads)} 条，平均消息体 {sum(map(len, evaluation)) / len(evaluation):.0f} 字节，字典 id {dict_id}')
+    print(f"{'codec':<14}{'ratio':>8}{'bytes/msg':>12}{'compress µs':>14}{'decompress µs':>16}")
+    for r in sorted(results, key=lambda r: -r['ratio']):
+        print(f"{r['codec']:<14}{r['ratio']:>8.2f}{r['bytes_per_message']:>12.1f}"
+              f"{r['compress_us_per_message']:>14.2f}{r['decompress_us_per_message']:>16.2f}")
+    print(f'推荐配置（settings.TOPIC_COMPRESSION）："{topic}": {recommended}')
+    return {'dict_id': dict_id, 'results': results, 'recommended': recommended}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Kafka消息压缩方式基准工具')
+    parser.add_argument('--topic', required=True, help='Kafka主题名称')
+    parser.add_argument('--data_type', required=True, help='主题下的类型')
+    parser.add_argument('--sample_size', type=int, default=5000, help='采样文档数（默认5000）')
+    parser.add_argument('--levels', type=int, nargs='+', help='zstd_dict 的压缩级别（默认 1 3 6 9 19）')
+    parser.add_argument('--dict_size', type=int, help='字典大小上限（字节，默认112640）')
+    parser.add_argument('--serializer_mode', default='validated', help='序列化模式：validated / sampled / trusted / avro')
+
+    args = parser.parse_args()
+    benchmark(args.topic, args.data_type,
+              sample_size=args.sample_size,
+              levels=args.levels,
+              dict_size=args.dict_size,
+              serializer_mode=args.serializer_mode)
+
+
+if __name__ == "__main__":
+    "--topic temp4 --data_type information --sample_size 5000"
+    main()
@@ -1,7 +1,11 @@
 import argparse
+import asyncio
 import sys
+from datetime import datetime
 
 from application.producers.information_mongo_to_kafka_producer import InformationtoKafkaProducer
+from application.producers.sharded_sync import ShardedSync
+from application.settings import STREAM_PRODUCER_CONFIG
 from application.utils.decorators import log_execution, monitor_performance
 
 
@@ -17,22 +21,143 @@ def full_sync(topic, data_type, **kwargs):
         **kwargs: 其他参数
             full_amount (bool): 是否全量同步，默认False（增量同步）
             debug (bool): 是否开启调试模式，默认False
+            serialize_workers (int): 序列化工作进程数，默认0（主进程序列化）
+            serialize_chunk_size (int): 多进程序列化时每个分片的消息条数，默认200
+            serializer_mode (str): 序列化模式 validated / sampled / trusted / avro，默认validated
+            sample_rate (int): sampled 模式下每多少条校验一次，默认100
+            key_strategy (str): 消息 key 策略 uid / info_source / data_type / hash:<f1>,<f2>，默认不设置 key
+            partitioner (str): 分区器 default / sticky，默认使用 KafkaProducer 自带分区器
+            tuning_objective (str): 自适应调优目标 latency / throughput，默认不开启
+            target_latency_ms (float): latency 目标下的端到端延迟目标（毫秒），默认200
+            max_messages_per_sec (float): 每秒最多发送的消息条数，默认取 TOPIC_RATE_LIMITS 配置
+            max_bytes_per_sec (float): 每秒最多发送的字节数，默认取 TOPIC_RATE_LIMITS 配置
+            spool (bool): 是否开启本地落盘缓冲（Kafka 不可用时写入 runtime/spool），默认False
+            dedup (bool): 是否开启内容去重（内容未变化的文档跳过发送，索引位于 runtime/dedup），默认False
+            dedup_verify (bool): 去重时布隆过滤器命中后再查询 SQLite 确认（不会误判，但命中的文档都要访问磁盘），默认False
+            compression (str): 压缩方式 gzip / snappy / lz4 / zstd / zstd_dict / none，默认取 TOPIC_COMPRESSION 配置
+            zstd_dict_id (int): zstd_dict 模式使用的字典 id
+            compression_level (int): zstd_dict 模式的压缩级别，默认3
+            claim_check_threshold (int): 消息超过该字节数时大字段外置到 runtime/blobs，默认不开启
+            shards (int): 分片数，> 1 时按 _id 区间切分并由多个工作进程并行同步（只支持 _id 排序键），默认1
+            shard_split (str): 分片切分方式 time / sample，默认time
+            engine (str): 同步引擎 sync（逐批串行）/ asyncio（预取、发送、确认并发），默认sync
+            prefetch_batches (int): asyncio 引擎预取的 MongoDB 批次数，默认2
+            max_in_flight_batches (int): asyncio 引擎已发送未确认的批次数上限，默认8
+            sort_key (str): 增量同步排序键，逗号分隔表示复合水位线，如 update_time,_id，默认_id
+            reconcile_deletes (bool): 是否执行删除对账（与上次的 _id 快照比较，为已删除文档发送 tombstone，需要 key_strategy=uid），默认False
+            projection (bool): 是否只读取生产者用到的字段（投影下推），默认True
+            raw_documents (bool): 是否按需解码 MongoDB 文档（只解码访问到的字段），默认False
+            checkpoint_interval (int): 每确认多少条消息写一次游标检查点，默认10000
+            checkpoint_seconds (float): 每隔多少秒写一次游标检查点，默认5
+            cursor_backend (str): 游标存储 file / sqlite / kafka，默认file
+            since (str): 时间窗口起点（ISO 时间，如 2024-09-23T14:00），只同步该时刻及之后创建的文档
+            until (str): 时间窗口终点（ISO 时间），只同步该时刻之前创建的文档，读到该位置即结束
+            rewind (str): 回退游标后再同步：整数表示回退 N 个检查点，ISO 时间（如 2024-09-23T14:00）表示回退到该时刻的游标
+            stream (bool): 是否以 change stream 实时同步（持续运行，传播更新与删除），默认False
+            field_mapping (str): 声明式字段映射规格文件（extend/mapping 下的文件名或路径），默认使用手写 transform
     
     Raises:
         ValueError: 当data_type不被支持时抛出异常
     """
     full_amount = kwargs.get('full_amount', False)
     debug = kwargs.get('debug', False)
+    serialize_workers = kwargs.get('serialize_workers') or 0
+    serialize_chunk_size = kwargs.get('serialize_chunk_size') or 200
+    serializer_mode = kwargs.get('serializer_mode') or 'validated'
+    serializer_options = {'sample_rate': kwargs['sample_rate']} if kwargs.get('sample_rate') else None
+    key_strategy = kwargs.get('key_strategy')
+    partitioner = kwargs.get('partitioner')
+    tuning = {
+        'objective': kwargs['tuning_objective'],
+        'target_latency_ms': kwargs.get('target_latency_ms') or 200.0,
+    } if kwargs.get('tuning_objective') else None
+    rate_limit = {
+        'messages_per_sec': kwargs.get('max_messages_per_sec'),
+        'bytes_per_sec': kwargs.get('max_bytes_per_sec'),
+    } if kwargs.get('max_messages_per_sec') or kwargs.get('max_bytes_per_sec') else None
+    spool = bool(kwargs.get('spool'))
+    dedup = bool(kwargs.get('dedup'))
+    if dedup and kwargs.get('dedup_verify'):
+        dedup = {'verify': True}
+    compression = {
+        'codec': kwargs['compression'],
+        'dict_id': kwargs.get('zstd_dict_id'),
+        'level': kwargs.get('compression_level') or 3,
+    } if kwargs.get('compression') else None
+    claim_check = {
+        'threshold': kwargs['claim_check_threshold'],
+    } if kwargs.get('claim_check_threshold') else None
+    shards = kwargs.get('shards') or 1
+    shard_split = kwargs.get('shard_split') or 'time'
+    engine = kwargs.get('engine') or 'sync'
+    stream = bool(kwargs.get('stream'))
+    reconcile_deletes = bool(kwargs.get('reconcile_deletes'))
+    sort_key = tuple(kwargs['sort_key'].split(',')) if kwargs.get('sort_key') else None
+    checkpoint = {
+        'interval': kwargs.get('checkpoint_interval'),
+        'seconds': kwargs.get('checkpoint_seconds'),
+    } if kwargs.get('checkpoint_interval') or kwargs.get('checkpoint_seconds') else None
+    since = datetime.fromisoformat(kwargs['since']) if kwargs.get('since') else None
+    until = datetime.fromisoformat(kwargs['until']) if kwargs.get('until') else None
+    rewind = kwargs.get('rewind')
+    if rewind:
+        rewind = int(rewind) if rewind.isdigit() else datetime.fromisoformat(rewind)
 
+    producer_kwargs = dict(
+        debug=debug,
+        serialize_workers=serialize_workers,
+        serialize_chunk_size=serialize_chunk_size,
+        serializer_mode=serializer_mode,
+        serializer_options=serializer_options,
+        key_strategy=key_strategy,
+        partitioner=partitioner,
+        tuning=tuning,
+        rate_limit=rate_limit,
+        spool=spool,
+        dedup=dedup,
+        compression=compression,
+        claim_check=claim_check,
+        field_mapping=kwargs.get('field_mapping'),
+        sort_key=sort_key,
+        projection=kwargs.get('projection') not in ('False', 'false', '0'),
+        raw_documents=bool(kwargs.get('raw_documents')),
+        checkpoint=checkpoint,
+        rewind=rewind or None,
+        cursor_backend=kwargs.get('cursor_backend') or 'file',
+        since=since,
+        until=until,
+    )
+    if stream:
+        # 实时同步使用低 linger_ms 配置
+        producer_kwargs['producer_config'] = STREAM_PRODUCER_CONFIG
     match data_type:
         case 'information':
-            producer = InformationtoKafkaProducer(
-                topic=topic, full_amount=full_amount, debug=debug
-            )
-            producer.sync()
+            producer_class = InformationtoKafkaProducer
         case _:
             raise ValueError(f'不支持的数据源：{topic}')
 
+    if shards > 1 and not stream and not reconcile_deletes:
+        # 分片并行同步：每个分片一个工作进程，各自维护分片游标
+        ShardedSync(producer_class, topic, shards, split=shard_split, full_amount=full_amount,
+                    producer_kwargs=producer_kwargs).run()
+        return
+
+    producer = producer_class(topic=topic, full_amount=full_amount, **producer_kwargs)
+    try:
+        if reconcile_deletes:
+            producer.reconcile_deletes()
+        elif stream:
+            producer.tail()
+        elif engine == 'asyncio':
+            asyncio.run(producer.sync_async(
+                prefetch_batches=kwargs.get('prefetch_batches') or 2,
+                max_in_flight_batches=kwargs.get('max_in_flight_batches') or 8,
+            ))
+        else:
+            producer.sync()
+    finally:
+        producer.flush_and_close()
+
 
 def main():
     sys.argv.extend([
@@ -46,6 +171,42 @@ def main():
     parser.add_argument('--data_type', required=True, help='主题下的类型（默认全选）')
     parser.add_argument('--full_amount', help='是否全量同步（默认增量）')
     parser.add_argument('--debug', help='同步检查是否正常生产数据')
+    parser.add_argument('--serialize_workers', type=int, default=0, help='序列化工作进程数（默认0，不启用多进程）')
+    parser.add_argument('--serialize_chunk_size', type=int, default=200, help='多进程序列化时每个分片的消息条数')
+    parser.add_argument('--serializer_mode', default='validated', help='序列化模式：validated / sampled / trusted / avro')
+    parser.add_argument('--sample_rate', type=int, help='sampled 模式下每多少条校验一次（默认100）')
+    parser.add_argument('--key_strategy', help='消息 key 策略：uid / info_source / data_type / hash:<f1>,<f2>')
+    parser.add_argument('--partitioner', help='分区器：default / sticky（批次内粘滞同一分区）')
+    parser.add_argument('--tuning_objective', help='自适应调优目标：latency / throughput（默认不开启）')
+    parser.add_argument('--target_latency_ms', type=float, help='latency 目标下的端到端延迟目标（毫秒，默认200）')
+    parser.add_argument('--max_messages_per_sec', type=float, help='每秒最多发送的消息条数（默认取 TOPIC_RATE_LIMITS）')
+    parser.add_argument('--max_bytes_per_sec', type=float, help='每秒最多发送的字节数（默认取 TOPIC_RATE_LIMITS）')
+    parser.add_argument('--spool', help='Kafka 不可用时把消息落盘到 runtime/spool，恢复后自动重放')
+    parser.add_argument('--dedup', help='按 uid 记录已投递内容的指纹，内容未变化的文档跳过发送')
+    parser.add_argument('--dedup_verify', help='去重时布隆过滤器命中后再查询 SQLite 确认（默认只查内存中的布隆过滤器）')
+    parser.add_argument('--compression', help='压缩方式：gzip / snappy / lz4 / zstd / zstd_dict / none（默认取 TOPIC_COMPRESSION）')
+    parser.add_argument('--zstd_dict_id', type=int, help='zstd_dict 模式使用的字典 id（由 run_compression_benchmark.py 训练）')
+    parser.add_argument('--compression_level', type=int, help='zstd_dict 模式的压缩级别（默认3）')
+    parser.add_argument('--claim_check_threshold', type=int,
+                        help='消息超过该字节数时把 info_section / link_data 外置到 runtime/blobs（默认不开启）')
+    parser.add_argument('--shards', type=int, default=1, help='分片数，> 1 时按 _id 区间多进程并行同步（默认1）')
+    parser.add_argument('--shard_split', default='time', help='分片切分方式：time（按时间戳等分）/ sample（采样分位点）')
+    parser.add_argument('--engine', default='sync', help='同步引擎：sync / asyncio（MongoDB 预取与发送、确认并发）')
+    parser.add_argument('--prefetch_batches', type=int, help='asyncio 引擎预取的 MongoDB 批次数（默认2）')
+    parser.add_argument('--max_in_flight_batches', type=int, help='asyncio 引擎已发送未确认的批次数上限（默认8）')
+    parser.add_argument('--sort_key', help='增量同步排序键，逗号分隔为复合水位线，如 update_time,_id（默认 _id）')
+    parser.add_argument('--reconcile_deletes', help='删除对账：按 _id 顺序扫描并与 runtime/snapshots 下的快照比较，为已删除文档发送 tombstone'
+                                                    '（需要 --key_strategy uid）')
+    parser.add_argument('--projection', help='是否只读取生产者用到的字段（投影下推，默认 True；key 策略用到的字段一并读取）')
+    parser.add_argument('--raw_documents', help='按需解码 MongoDB 文档：保留原始 BSON，只解码访问到的字段（大数组字段不再整体解码）')
+    parser.add_argument('--checkpoint_interval', type=int, help='每确认多少条消息写一次游标检查点（默认10000）')
+    parser.add_argument('--checkpoint_seconds', type=float, help='每隔多少秒写一次游标检查点（默认5）')
+    parser.add_argument('--cursor_backend', help='游标存储：file（本地游标日志，默认）/ sqlite（多进程共享）/ kafka（压缩主题，多主机共享）')
+    parser.add_argument('--since', help='时间窗口起点（ISO 时间，如 2024-09-23T14:00）：按 _id 创建时间只同步之后的文档，使用独立的窗口游标')
+    parser.add_argument('--until', help='时间窗口终点（ISO 时间）：只同步之前创建的文档，读到该位置即结束，用于窗口回填')
+    parser.add_argument('--rewind', help='回退游标后重放：整数为回退 N 个检查点，ISO 时间（如 2024-09-23T14:00）为回退到该时刻的游标')
+    parser.add_argument('--stream', help='监听 change stream 实时同步更新与删除（需要副本集，resume token 保存在游标目录）')
+    parser.add_argument('--field_mapping', help='声明式字段映射规格，如 information.yaml（extend/mapping 下，代替手写 transform）')
 
     args = parser.parse_args()
 
@@ -54,6 +215,40 @@ def main():
     if args:
         kwargs['full_amount'] = args.full_amount
         kwargs['debug'] = args.debug
+        kwargs['serialize_workers'] = args.serialize_workers
+        kwargs['serialize_chunk_size'] = args.serialize_chunk_size
+        kwargs['serializer_mode'] = args.serializer_mode
+        kwargs['sample_rate'] = args.sample_rate
+        kwargs['key_strategy'] = args.key_strategy
+        kwargs['partitioner'] = args.partitioner
+        kwargs['tuning_objective'] = args.tuning_objective
+        kwargs['target_latency_ms'] = args.target_latency_ms
+        kwargs['max_messages_per_sec'] = args.max_messages_per_sec
+        kwargs['max_bytes_per_sec'] = args.max_bytes_per_sec
+        kwargs['spool'] = args.spool
+        kwargs['dedup'] = args.dedup
+        kwargs['dedup_verify'] = args.dedup_verify
+        kwargs['compression'] = args.compression
+        kwargs['zstd_dict_id'] = args.zstd_dict_id
+        kwargs['compression_level'] = args.compression_level
+        kwargs['claim_check_threshold'] = args.claim_check_threshold
+        kwargs['shards'] = args.shards
+        kwargs['shard_split'] = args.shard_split
+        kwargs['engine'] = args.engine
+        kwargs['prefetch_batches'] = args.prefetch_batches
+        kwargs['max_in_flight_batches'] = args.max_in_flight_batches
+        kwargs['sort_key'] = args.sort_key
+        kwargs['reconcile_deletes'] = args.reconcile_deletes
+        kwargs['projection'] = args.projection
+        kwargs['raw_documents'] = args.raw_documents
+        kwargs['checkpoint_interval'] = args.checkpoint_interval
+        kwargs['checkpoint_seconds'] = args.checkpoint_seconds
+        kwargs['since'] = args.since
+        kwargs['until'] = args.until
+        kwargs['rewind'] = args.rewind
+        kwargs['cursor_backend'] = args.cursor_backend
+        kwargs['stream'] = args.stream
+        kwargs['field_mapping'] = args.field_mapping
 
     # 执行同步
     full_sync(args.topic, args.data_type, **kwargs)
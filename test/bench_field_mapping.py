@@ -0,0 +1,63 @@
+"""
+字段映射微基准：对比手写 transform + build_payload 与映射规格编译出的函数的单条文档耗时
+
+运行方式（项目根目录）：PYTHONPATH=. python test/bench_field_mapping.py
+"""
+import datetime
+import timeit
+
+from bson import ObjectId
+
+from application.producers.field_mapping import compile_mapping, load_mapping
+from application.producers.information_mongo_to_kafka_producer import InformationtoKafkaProducer
+
+TOPIC = 'temp4'
+DOC = {
+    '_id': ObjectId('66f1c2a0e4b0a1b2c3d4e5f6'),
+    'info_name': '国家自然科学基金委员会关于2024年项目申请的通告',
+    'create_time': datetime.datetime(2024, 9, 23, 10, 30, 0),
+    'info_date': '来源：2024-09-23 日期',
+    'info_source': '作者： 基金委',
+    'info_section': ['资助项目申请段落内容' * 20] * 8,
+    'info_author': '张三',
+    'description': '关于项目申请的说明',
+    'column_info': ['通知公告', '医学科学部'],
+    'link_data': [{'name': '附件1.pdf', 'url': 'http://x/1.pdf'}],
+    'page_url': 'https://www.nsfc.gov.cn/p/1',
+    'marc_code': 'zh',
+}
+
+
+class HandWritten:
+    topic = TOPIC
+    data_type = InformationtoKafkaProducer.data_type
+    transform = InformationtoKafkaProducer.transform
+    build_payload = InformationtoKafkaProducer.build_payload
+
+
+def bench(number: int = 50000, repeat: int = 5) -> None:
+    producer = HandWritten()
+    mapper = compile_mapping(load_mapping('information.yaml'),
+                             {'topic': TOPIC, 'data_type': producer.data_type}, name='information')
+
+    def hand_written():
+        # transform 会原地修改文档，与真实同步一样每条文档只处理一次
+        return producer.build_payload(producer.transform(dict(DOC)))
+
+    def compiled():
+        return mapper(dict(DOC))
+
+    mapped = compiled()
+    mapped.pop('info_source')
+    assert mapped == hand_written()
+
+    baseline = None
+    for name, func in (('hand_written', hand_written), ('compiled', compiled)):
+        best = min(timeit.repeat(func, number=number, repeat=repeat))
+        per_doc = best / number * 1e6
+        baseline = baseline or per_doc
+        print(f'{name:<13} {per_doc:8.2f} µs/条  相对手写节省 {1 - per_doc / baseline:6.1%}')
+
+
+if __name__ == '__main__':
+    bench()
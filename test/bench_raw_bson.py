@@ -0,0 +1,104 @@
+"""
+按需解码基准：对比 pymongo 默认的完整解码（dict）与 raw 模式（LazyBSONDocument）的解码 CPU 与峰值 RSS
+
+合成集合：每篇文档带较大的 info_section（段落子文档数组）与消息不使用的 raw_html，
+按 batch_size 打包成与服务器返回一致的 BSON 批次，用 bson.decode_all 解码（pymongo 游标的同一解码入口）。
+每种模式在独立子进程中运行，峰值 RSS 互不影响；统计两个场景：
+
+- access：只访问构造消息 key / 游标用到的字段（_id、info_name）
+- serialize：transform + build_payload + trusted 序列化（info_section 在编码时展开）
+
+运行方式（项目根目录）：PYTHONPATH=. python test/bench_raw_bson.py
+"""
+import datetime
+import multiprocessing
+import resource
+import time
+
+import bson
+from bson import ObjectId
+from bson.codec_options import CodecOptions
+
+from application.models.kafka_models.information_data_structure import InformationDataStructure
+from application.producers.information_mongo_to_kafka_producer import InformationtoKafkaProducer
+from application.producers.serializers import get_serializer
+from application.utils.lazy_bson import LAZY_BSON_OPTIONS
+
+DOCS = 20000
+BATCH_SIZE = 1000
+SECTIONS = 60
+
+
+class HandWritten:
+    topic = 'temp4'
+    data_type = InformationtoKafkaProducer.data_type
+    transform = InformationtoKafkaProducer.transform
+    build_payload = InformationtoKafkaProducer.build_payload
+
+
+def _batches():
+    created = datetime.datetime(2024, 9, 23, 10, 30)
+    batch = []
+    for i in range(DOCS):
+        batch.append(bson.encode({
+            '_id': ObjectId(),
+            'info_name': f'国家自然科学基金委员会关于2024年项目申请的通告{i}',
+            'create_time': created,
+            'info_date': '来源：2024-09-23 日期',
+            'info_source': '作者： 基金委',
+            'info_section': [{'type': 'paragraph', 'index': n, 'content': '资助项目申请段落内容' * 8,
+                              'style': {'bold': False, 'size': 14}} for n in range(SECTIONS)],
+            'info_author': '张三',
+            'description': '关于项目申请的说明',
+            'column_info': ['通知公告', '医学科学部'],
+            'link_data': [{'name': '附件1.pdf', 'url': 'http://x/1.pdf'}],
+            'page_url': 'https://www.nsfc.gov.cn/p/1',
+            'marc_code': 'zh',
+            'raw_html': '<p>资助项目申请段落内容</p>' * 200,
+        }))
+        if len(batch) == BATCH_SIZE:
+            yield b''.join(batch)
+            batch = []
+
+
+def _run(mode: str, scenario: str, queue) -> None:
+    batches = list(_batches())
+    options = LAZY_BSON_OPTIONS if mode == 'raw' else CodecOptions()
+    producer = HandWritten()
+    serializer = get_serializer('trusted', InformationDataStructure)
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    started = time.process_time()
+    size = 0
+    for data in batches:
+        # 与 get_batches 一样整批持有文档与消息
+        docs = bson.decode_all(data, options)
+        if scenario == 'access':
+            messages = [(str(doc['_id']), doc['info_name']) for doc in docs]
+        else:
+            messages = [serializer.serialize(producer.build_payload(producer.transform(doc))) for doc in docs]
+            size += sum(len(message) for message in messages)
+        del docs, messages
+    cpu = time.process_time() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss
+    queue.put((cpu, peak, size))
+
+
+def bench() -> None:
+    context = multiprocessing.get_context('spawn')
+    for scenario in ('access', 'serialize'):
+        baseline = None
+        for mode in ('dict', 'raw'):
+            queue = context.Queue()
+            process = context.Process(target=_run, args=(mode, scenario, queue))
+            process.start()
+            cpu, peak, size = queue.get()
+            process.join()
+            baseline = baseline or (cpu, size)
+            assert size == baseline[1], '两种模式的序列化结果大小应一致'
+            print(f'{scenario:<10} {mode:<5} CPU {cpu * 1e6 / DOCS:8.2f} µs/条  相对 dict 节省 {1 - cpu / baseline[0]:6.1%}  '
+                  f'峰值 RSS 增量 {peak / 1024:7.1f} MB')
+
+
+if __name__ == '__main__':
+    bench()
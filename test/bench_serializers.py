@@ -0,0 +1,42 @@
+"""
+序列化器微基准：对比 validated / sampled / trusted 三种模式的单条消息耗时
+
+运行方式（项目根目录）：PYTHONPATH=. python test/bench_serializers.py
+"""
+import timeit
+
+from application.models.kafka_models.information_data_structure import InformationDataStructure
+from application.producers.serializers import SERIALIZERS, get_serializer
+
+PAYLOAD = {
+    'uid': '66f1c2a0e4b0a1b2c3d4e5f6',
+    'topic': 'temp4',
+    'name': '国家自然科学基金委员会关于2024年项目申请的通告',
+    'created_at': '2024-09-23 10:30:00',
+    'data_type': 'information_nsfc',
+    'tag_values': '["\\u901a\\u77e5\\u516c\\u544a"]',
+    'link_data': [{'name': '附件1.pdf', 'url': 'http://x/1.pdf'}],
+    'data': {
+        'info_date': '2024-09-23',
+        'info_section': ['资助项目申请段落内容' * 20] * 8,
+        'info_author': '基金委',
+        'description': '关于项目申请的说明',
+    },
+    'metadata': {'marc_code': 'zh', 'details_page': 'https://www.nsfc.gov.cn/p/1'},
+}
+
+
+def bench(number: int = 20000, repeat: int = 5) -> None:
+    baseline = None
+    for mode in ('validated', 'sampled', 'trusted'):
+        serializer = get_serializer(mode, InformationDataStructure)
+        assert serializer.serialize(PAYLOAD) == InformationDataStructure(**PAYLOAD).to_json()
+        best = min(timeit.repeat(lambda: serializer.serialize(PAYLOAD), number=number, repeat=repeat))
+        per_message = best / number * 1e6
+        baseline = baseline or per_message
+        print(f'{mode:<10} {per_message:8.2f} µs/条  相对 validated 节省 {1 - per_message / baseline:6.1%}')
+
+
+if __name__ == '__main__':
+    assert set(SERIALIZERS) >= {'validated', 'sampled', 'trusted'}
+    bench()
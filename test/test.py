@@ -1,6 +1,9 @@
 import json
 from kafka import KafkaConsumer
 
+from application.producers.binary_codec import decode_message
+from application.producers.claim_check import rehydrate
+
 
 def test_kafka_consumer():
     """
@@ -23,7 +26,12 @@ def test_kafka_consumer():
             print(f"  分区: {message.partition}")
             print(f"  偏移量: {message.offset}")
             print(f"  Key: {message.key}")
-            print(f"  Value: {message.value}")
+            # 带 schema_id header 的二进制消息按 schema 解码，其余按 JSON 解析；外置的大字段按 claim_check header 取回
+            value = decode_message(message.value, message.headers)
+            if value is None:
+                print("  Value: None（tombstone，删除标记）")
+            else:
+                print(f"  Value: {rehydrate(value, message.headers)}")
             print("-" * 50)
     except KeyboardInterrupt:
         print("用户中断监听")
@@ -0,0 +1,104 @@
+import pytest
+from kafka.errors import KafkaTimeoutError
+from kafka.future import Future
+
+from application.cursor_model.ack_tracker import AckCursorTracker
+from application.utils.metrics import RunStats
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.saved = []
+        self.flushes = 0
+
+    def save(self, cursor):
+        self.saved.append(cursor)
+
+    def flush(self):
+        self.flushes += 1
+
+
+@pytest.fixture
+def cursor():
+    return RecordingCursor()
+
+
+def _track(tracker, positions):
+    futures = [Future() for _ in positions]
+    tracker.track_batch(positions, futures)
+    return futures
+
+
+def test_out_of_order_acks_advance_only_the_contiguous_prefix(cursor):
+    tracker = AckCursorTracker(cursor, initial_position=0)
+    futures = _track(tracker, [1, 2, 3, 4])
+
+    futures[2].success(None)
+    futures[1].success(None)
+    # 队首未确认，游标不越过它
+    assert tracker.committed_position == 0 and tracker.in_flight == 4
+
+    futures[0].success(None)
+    assert tracker.committed_position == 3 and tracker.in_flight == 1
+    futures[3].success(None)
+    assert tracker.committed_position == 4 and tracker.acked == 4 and tracker.in_flight == 0
+
+
+def test_failed_ack_stops_the_cursor(cursor):
+    tracker = AckCursorTracker(cursor, initial_position=0)
+    futures = _track(tracker, [1, 2, 3])
+    error = KafkaTimeoutError('投递超时')
+
+    futures[0].success(None)
+    futures[1].failure(error)
+    futures[2].success(None)
+    # 失败位置之后的确认不推进游标
+    assert tracker.committed_position == 1
+    assert (tracker.acked, tracker.failed, tracker.in_flight) == (2, 1, 2)
+
+    assert tracker.checkpoint(final=True)
+    assert cursor.saved == [1] and cursor.flushes == 1
+    with pytest.raises(KafkaTimeoutError):
+        tracker.raise_for_failures()
+
+
+def test_already_completed_futures_are_tracked(cursor):
+    tracker = AckCursorTracker(cursor)
+    tracker.track(1, Future().success(None))
+    assert tracker.committed_position == 1 and tracker.in_flight == 0
+
+
+def test_checkpoint_interval(cursor):
+    commits = []
+    tracker = AckCursorTracker(cursor, checkpoint_interval=3, checkpoint_seconds=3600,
+                               before_commit=lambda: commits.append(list(cursor.saved)))
+    for position in range(1, 6):
+        _track(tracker, [position])[0].success(None)
+        tracker.maybe_checkpoint()
+    # 每确认 3 条写一次，写入前先执行 before_commit
+    assert cursor.saved == [3] and commits == [[]]
+
+    _track(tracker, [6])[0].success(None)
+    assert tracker.maybe_checkpoint() and cursor.saved == [3, 6]
+    # 游标未变化时不重复写入，最终提交只 flush
+    assert not tracker.checkpoint()
+    assert not tracker.checkpoint(final=True)
+    assert cursor.saved == [3, 6] and cursor.flushes == 1 and tracker.checkpoints == 2
+
+
+def test_checkpoint_seconds(cursor, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('application.cursor_model.ack_tracker.time.monotonic', lambda: now[0])
+    stats = RunStats()
+    tracker = AckCursorTracker(cursor, checkpoint_interval=10000, checkpoint_seconds=5.0, stats=stats)
+    _track(tracker, [1])[0].success(None)
+
+    now[0] += 4.9
+    assert not tracker.maybe_checkpoint()
+    now[0] += 0.1
+    assert tracker.maybe_checkpoint() and cursor.saved == [1]
+    assert stats.counters['checkpoints'] == 1
+
+    # 时间到了但游标没有推进
+    now[0] += 5.0
+    assert not tracker.maybe_checkpoint() and cursor.saved == [1]
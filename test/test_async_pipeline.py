@@ -0,0 +1,63 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+from kafka.errors import KafkaTimeoutError
+
+from application.cursor_model.ack_tracker import AckCursorTracker
+from application.producers.async_pipeline import AsyncPipeline, wrap_future
+from application.producers.spool import DeliveryFuture
+from test_spool import EchoProducer, MemoryCursor
+
+
+@pytest.fixture
+def producer():
+    instance = EchoProducer('async_topic', producer_config={'client_id': uuid.uuid4().hex})
+    yield instance
+    instance.flush_and_close()
+
+
+def _slow_batches(count, size, delay=0.0):
+    for start in range(0, count, size):
+        time.sleep(delay)
+        yield [{'_id': i} for i in range(start, min(start + size, count))]
+
+
+def test_pipeline_sends_all_batches_in_order(producer):
+    cursor = MemoryCursor()
+    tracker = AckCursorTracker(cursor)
+    pipeline = AsyncPipeline(producer, prefetch_batches=2, max_in_flight_batches=2)
+    asyncio.run(pipeline.run(_slow_batches(50, 7, delay=0.001), tracker))
+    tracker.checkpoint()
+
+    assert [record[1] for record in producer.producer.records] == [
+        f'{{"_id": {i}}}'.encode() for i in range(50)
+    ]
+    assert tracker.acked == 50
+    assert cursor.saved[-1] == 49
+    assert producer.stats.timers['fetch_wait'] > 0
+
+
+def test_pipeline_propagates_send_errors(producer):
+    def broken_send_batch(docs):
+        raise RuntimeError('序列化失败')
+
+    producer.send_batch = broken_send_batch
+    tracker = AckCursorTracker(MemoryCursor())
+    with pytest.raises(RuntimeError):
+        asyncio.run(AsyncPipeline(producer).run(_slow_batches(10, 5), tracker))
+
+
+def test_wrap_future_resolves_from_other_thread():
+    async def main():
+        loop = asyncio.get_running_loop()
+        ok, failed = DeliveryFuture(), DeliveryFuture()
+        waiters = [wrap_future(ok, loop), wrap_future(failed, loop)]
+        await loop.run_in_executor(None, ok.success, 'metadata')
+        await loop.run_in_executor(None, failed.failure, KafkaTimeoutError('超时'))
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    value, error = asyncio.run(main())
+    assert value == 'metadata'
+    assert isinstance(error, KafkaTimeoutError)
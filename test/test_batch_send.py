@@ -0,0 +1,136 @@
+import json
+import uuid
+from collections import namedtuple
+
+import pytest
+from kafka.errors import KafkaTimeoutError
+from kafka.future import Future
+
+from application.producers.base_producer import BaseKafkaProducer
+
+RecordMetadata = namedtuple('RecordMetadata', 'topic partition offset')
+
+
+class StandInFuture(Future):
+    """
+    与 FutureRecordMetadata 一样提供 get()，结果由替身生产者决定
+    """
+
+    def get(self, timeout=None):
+        if not self.is_done:
+            raise KafkaTimeoutError('尚未得到投递结果')
+        if self.failed():
+            raise self.exception
+        return self.value
+
+
+class RecordingProducer:
+    """
+    KafkaProducer 替身：按调用顺序记录消息，投递结果在 complete()（或 flush()）时给出
+    """
+
+    def __init__(self, **config):
+        self.config = config
+        self.records = []
+        self.futures = []
+
+    def send(self, topic, value=None, key=None, headers=None):
+        future = StandInFuture()
+        self.records.append((key, value))
+        self.futures.append(future)
+        return future
+
+    def complete(self, failed=()):
+        """
+        按偏移量给出投递结果：failed 中的偏移量投递失败，其余成功
+        """
+        for offset, future in enumerate(self.futures):
+            if future.is_done:
+                continue
+            if offset in failed:
+                future.failure(KafkaTimeoutError(f'偏移量 {offset} 投递超时'))
+            else:
+                future.success(RecordMetadata('batch_topic', 0, offset))
+
+    def flush(self, timeout=None):
+        self.complete()
+
+    def close(self, timeout=None):
+        pass
+
+    def metrics(self):
+        return {}
+
+
+class JsonProducer(BaseKafkaProducer):
+    producer_factory = RecordingProducer
+
+    def transform(self, doc):
+        return doc
+
+    def value_serialize(self, message):
+        return json.dumps(message).encode('utf-8')
+
+
+def create_producer(producer_class=JsonProducer, topic='batch_topic', **kwargs):
+    """
+    用替身 KafkaProducer 创建生产者（独立的 client_id 保证不与其他用例共享连接池中的实例）
+    """
+    return producer_class(topic, producer_config={'client_id': uuid.uuid4().hex}, **kwargs)
+
+
+@pytest.fixture
+def producer():
+    instance = create_producer()
+    yield instance
+    instance.flush_and_close()
+
+
+def test_send_batch_keeps_input_order(producer):
+    docs = [{'n': i} for i in range(5)]
+    result = producer.send_batch(docs, keys=[f'k{i}' if i % 2 else None for i in range(5)])
+
+    assert producer.producer.records == [
+        (f'k{i}'.encode('utf-8') if i % 2 else None, json.dumps(doc).encode('utf-8')) for i, doc in enumerate(docs)
+    ]
+    assert result.futures == producer.producer.futures
+    assert not result.is_done()
+
+    # 投递结果乱序到达：get() 仍按输入顺序返回
+    for offset in (3, 0, 4):
+        result.futures[offset].success(RecordMetadata('batch_topic', 0, offset))
+    assert not result.is_done()
+    producer.producer.complete()
+    assert result.is_done()
+    assert [metadata.offset for metadata in result.get(timeout=1)] == list(range(5))
+
+
+def test_send_batch_partial_failure(producer):
+    result = producer.send_batch([{'n': i} for i in range(4)])
+    producer.producer.complete(failed={1, 3})
+
+    # 部分失败时整批仍全部完成；get() 抛出首个失败，其余消息的结果可逐条获取
+    assert result.is_done()
+    with pytest.raises(KafkaTimeoutError, match='偏移量 1'):
+        result.get(timeout=1)
+    assert [future.succeeded() for future in result.futures] == [True, False, True, False]
+    assert result.futures[2].get().offset == 2
+    # 失败不影响已发送条数与字节数的统计
+    assert result.count == 4 and producer.stats.counters['messages'] == 4
+
+
+def test_send_batch_counts(producer):
+    first = producer.send_batch([{'n': 1}, {'name': '标题'}])
+    second = producer.send_batch([{'n': 22}])
+    empty = producer.send_batch([])
+
+    values = [value for _, value in producer.producer.records]
+    assert (first.count, first.bytes) == (2, len(values[0]) + len(values[1]))
+    assert (second.count, second.bytes) == (1, len(values[2]))
+    assert (empty.count, empty.bytes, empty.futures) == (0, 0, [])
+    # 字节数按编码后的消息体计算（中文为多字节）
+    assert first.bytes == len(json.dumps({'n': 1})) + len(json.dumps({'name': '标题'}).encode('utf-8'))
+
+    counters = producer.stats.counters
+    assert (counters['batches'], counters['messages'], counters['bytes']) == (3, 3, first.bytes + second.bytes)
+    assert empty.is_done() and empty.get() == []
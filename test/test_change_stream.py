@@ -0,0 +1,166 @@
+import datetime
+import threading
+import uuid
+
+import pytest
+from bson import ObjectId, Timestamp
+
+from application.cursor_model.ack_tracker import AckCursorTracker
+from application.producers.change_stream import ChangeStreamTailer, decode_resume_token, encode_resume_token
+from application.producers.spool import DiskSpool
+from test_spool import EchoProducer, MemoryCursor
+
+
+class FakeChangeStream:
+    """
+    change stream 替身：按顺序返回预置事件，取完后 try_next() 返回 None
+    """
+
+    def __init__(self, events):
+        self.events = list(events)
+        self.alive = True
+
+    def try_next(self):
+        return self.events.pop(0) if self.events else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.alive = False
+
+
+class FakeCollection:
+    name = 'fake_collection'
+
+    def __init__(self, events):
+        self.events = events
+        self.watch_calls = []
+
+    def watch(self, **kwargs):
+        self.watch_calls.append(kwargs)
+        token = kwargs['resume_after']
+        # 从 resume token 之后的事件开始
+        start = 0 if token is None else next(i for i, e in enumerate(self.events) if e['_id'] == token) + 1
+        return FakeChangeStream(self.events[start:])
+
+
+def _event(seq, operation, doc_id, document=None):
+    event = {
+        '_id': {'_data': f'8266{seq:08d}'},
+        'operationType': operation,
+        'documentKey': {'_id': doc_id},
+        'clusterTime': Timestamp(1727000000, seq),
+        'wallTime': datetime.datetime.utcnow(),
+    }
+    if document is not None:
+        event['fullDocument'] = document
+    return event
+
+
+@pytest.fixture
+def producer():
+    instance = EchoProducer('stream_topic', producer_config={'client_id': uuid.uuid4().hex})
+    yield instance
+    instance.flush_and_close()
+
+
+def test_tail_emits_upserts_and_tombstones_in_order(producer):
+    first, second = ObjectId(), ObjectId()
+    events = [
+        _event(1, 'insert', first, {'name': 'a'}),
+        _event(2, 'update', first, {'name': 'b'}),
+        _event(3, 'delete', first),
+        _event(4, 'replace', second, {'name': 'c'}),
+        # updateLookup 时文档已被删除：fullDocument 为 None，按删除处理
+        _event(5, 'update', second, None),
+    ]
+    collection = FakeCollection(events)
+    cursor = MemoryCursor()
+    tracker = AckCursorTracker(cursor)
+
+    handled = ChangeStreamTailer(producer, collection).run(tracker, max_events=len(events))
+    tracker.checkpoint()
+
+    assert handled == 5
+    assert producer.producer.records == [
+        (str(first).encode(), b'{"name": "a"}', None),
+        (str(first).encode(), b'{"name": "b"}', None),
+        (str(first).encode(), None, None),
+        (str(second).encode(), b'{"name": "c"}', None),
+        (str(second).encode(), None, None),
+    ]
+    assert collection.watch_calls[0]['full_document'] == 'updateLookup'
+    # 全部确认后提交最后一条变更的 resume token
+    assert decode_resume_token(cursor.saved[-1]) == events[-1]['_id']
+    assert producer.stats.counters['tombstones'] == 2
+    assert sum(producer.stats.histograms['ack_latency_ms'].values()) == 5
+
+
+def test_tail_resumes_after_committed_token(producer):
+    events = [_event(seq, 'insert', seq, {'seq': seq}) for seq in range(1, 6)]
+    collection = FakeCollection(events)
+    tracker = AckCursorTracker(MemoryCursor(), initial_position=encode_resume_token(events[2]['_id']))
+
+    ChangeStreamTailer(producer, collection, batch_size=2).run(tracker, max_events=2)
+
+    assert collection.watch_calls[0]['resume_after'] == events[2]['_id']
+    assert [value for _, value, _ in producer.producer.records] == [b'{"seq": 4}', b'{"seq": 5}']
+
+
+def test_tombstones_are_spooled_when_broker_unavailable(producer, tmp_path):
+    producer.spool = DiskSpool('stream_topic', root_path=str(tmp_path))
+    producer.producer.fail_send = True
+    tracker = AckCursorTracker(MemoryCursor())
+    ChangeStreamTailer(producer, FakeCollection([_event(1, 'delete', 'x')])).run(tracker, max_events=1)
+    producer.spool.sync()
+
+    assert tracker.acked == 1
+    (segment,) = producer.spool.segments()
+    assert list(producer.spool.read_segment(segment)) == [(b'x', None, None)]
+
+
+class RecoveringStream(FakeChangeStream):
+    """
+    预置事件取完后模拟 broker 恢复并产生一条新变更，之后停止监听
+    """
+
+    def __init__(self, events, producer, recovered_event, stop):
+        super().__init__(events)
+        self.producer, self.recovered_event, self.stop = producer, recovered_event, stop
+        self.empty_polls = 0
+
+    def try_next(self):
+        if self.events:
+            return self.events.pop(0)
+        self.empty_polls += 1
+        if self.empty_polls == 2:
+            self.producer.producer.fail_send = False
+            self.producer._spool_until = 0.0
+            return self.recovered_event
+        if self.empty_polls > 3:
+            self.stop.set()
+        return None
+
+
+def test_spooled_changes_are_replayed_before_new_events(producer, tmp_path):
+    producer.spool = DiskSpool('stream_topic', root_path=str(tmp_path))
+    producer.producer.fail_send = True
+    doc_id = ObjectId()
+    stop = threading.Event()
+    stream = RecoveringStream([_event(1, 'insert', doc_id, {'v': 1}), _event(2, 'delete', doc_id)], producer,
+                              _event(3, 'insert', doc_id, {'v': 2}), stop)
+    collection = FakeCollection([])
+    collection.watch = lambda **kwargs: stream
+    tracker = AckCursorTracker(MemoryCursor())
+
+    ChangeStreamTailer(producer, collection).run(tracker, stop=stop)
+
+    # 中断期间落盘的 upsert 与 tombstone 在运行中重放，并排在恢复后的新变更之前
+    assert producer.producer.records == [
+        (str(doc_id).encode(), b'{"v": 1}', None),
+        (str(doc_id).encode(), None, None),
+        (str(doc_id).encode(), b'{"v": 2}', None),
+    ]
+    assert not producer.spool.pending()
+    assert tracker.acked == 3
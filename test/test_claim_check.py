@@ -0,0 +1,105 @@
+import json
+import uuid
+
+import pytest
+
+from application.producers.claim_check import CLAIM_CHECK_HEADER, FileBlobStore, rehydrate
+from application.utils.dedup_index import SKIPPED, DedupIndex
+from test_spool import EchoProducer
+
+
+class SectionProducer(EchoProducer):
+    offload_fields = {'sections': 'sections', 'links': 'meta.links'}
+
+    def transform(self, doc):
+        return {'uid': doc['uid'], 'sections': doc['sections'], 'links': doc['links']}
+
+    def value_serialize(self, message):
+        payload = {'uid': message['uid'], 'sections': message['sections'], 'meta': {'links': message['links']}}
+        return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+
+@pytest.fixture
+def producer(tmp_path):
+    instance = SectionProducer('claim_check_topic', producer_config={'client_id': uuid.uuid4().hex},
+                               claim_check={'threshold': 1024})
+    instance.claim_check.store = FileBlobStore(str(tmp_path))
+    yield instance
+    instance.flush_and_close()
+
+
+def test_large_fields_are_offloaded_and_rehydrated(producer):
+    small = {'uid': '1', 'sections': ['短段落'], 'links': []}
+    large = {'uid': '2', 'sections': ['很长的段落' * 100] * 5, 'links': [{'url': 'http://x/1.pdf'}] * 3}
+    producer.send_batch([small, large])
+
+    (_, small_value, small_headers), (_, large_value, large_headers) = producer.producer.records
+    assert small_headers is None
+    assert len(large_value) <= 1024
+
+    # 只外置最大的字段即可满足阈值，header 携带引用与哈希
+    refs = json.loads(dict(large_headers)[CLAIM_CHECK_HEADER])
+    assert [ref['path'] for ref in refs] == ['sections']
+    payload = json.loads(large_value)
+    assert payload['sections'] == []
+
+    restored = rehydrate(payload, large_headers, stores={'file': producer.claim_check.store})
+    assert restored == {'uid': '2', 'sections': large['sections'], 'meta': {'links': large['links']}}
+
+    summary = producer.stats.summary()
+    assert summary['offloaded_messages'] == 1
+    assert sum(summary['message_bytes_histogram'].values()) == 2
+
+
+def test_dedup_runs_before_offload(producer, tmp_path, monkeypatch):
+    producer.dedup = DedupIndex('claim_check_topic', 'docs', root_path=str(tmp_path / 'dedup'), capacity=10_000)
+    puts = []
+    store_put = producer.claim_check.store.put
+
+    def recording_put(digest, data):
+        puts.append(digest)
+        store_put(digest, data)
+    monkeypatch.setattr(producer.claim_check.store, 'put', recording_put)
+    large = {'uid': '2', 'sections': ['很长的段落' * 100] * 5, 'links': []}
+    producer.send_batch([large])
+    producer.before_cursor_commit()
+    assert len(puts) == 1
+
+    # 内容未变化：去重按外置前的消息体判断，跳过的消息不再外置、不写 blob
+    result = producer.send_batch([dict(large), dict(large, uid='3')])
+    assert result.get()[0] == SKIPPED and result.count == 1
+    assert len(puts) == 2 and len(producer.producer.records) == 2
+    assert producer.stats.counters['offloaded_messages'] == 2
+
+
+def test_rehydrate_rejects_corrupted_blob(producer):
+    large = {'uid': '3', 'sections': ['段落' * 1000], 'links': []}
+    producer.send_batch([large])
+    _, value, headers = producer.producer.records[0]
+    ref = json.loads(dict(headers)[CLAIM_CHECK_HEADER])[0]
+    with open(producer.claim_check.store._path(ref['sha256']), 'wb') as f:
+        f.write(b'[]')
+    with pytest.raises(ValueError):
+        rehydrate(json.loads(value), headers, stores={'file': producer.claim_check.store})
+
+
+def test_mapped_producer_offloads_by_payload_path(tmp_path):
+    spec = {'fields': [
+        {'target': 'uid', 'source': 'uid'},
+        {'target': 'sections', 'source': 'sections', 'default': []},
+        {'target': 'meta.links', 'source': 'links', 'default': []},
+    ]}
+    instance = SectionProducer('claim_check_topic', producer_config={'client_id': uuid.uuid4().hex},
+                               claim_check={'threshold': 1024}, field_mapping=spec)
+    instance.value_serialize = lambda message: json.dumps(message, ensure_ascii=False).encode('utf-8')
+    instance.claim_check.store = FileBlobStore(str(tmp_path))
+    try:
+        doc = {'uid': '3', 'sections': ['短段落'], 'links': [{'url': 'http://x/很长的链接.pdf'}] * 50}
+        instance.send_batch([doc])
+        (_, value, headers), = instance.producer.records
+        payload = json.loads(value)
+        assert payload['meta']['links'] == []
+        assert json.loads(dict(headers)[CLAIM_CHECK_HEADER])[0]['path'] == 'meta.links'
+        assert rehydrate(payload, headers, stores={'file': instance.claim_check.store})['meta']['links'] == doc['links']
+    finally:
+        instance.flush_and_close()
@@ -0,0 +1,61 @@
+import json
+import uuid
+
+import pytest
+
+pytest.importorskip('zstandard')
+
+from application.producers import compression
+from application.producers.binary_codec import decode_message
+from application.producers.compression import (ZSTD_DICT_HEADER, FileDictionaryStore, ZstdDictCodec,
+                                               decompress_value, resolve_compression, train_dictionary)
+from test_spool import EchoProducer
+
+SAMPLES = [
+    json.dumps({'uid': str(i), 'name': f'国家自然科学基金委员会关于第{i}批项目申请的通告',
+                'data': {'info_section': ['资助项目申请段落内容'] * (i % 5 + 1), 'info_author': '基金委'}},
+               ensure_ascii=False).encode('utf-8')
+    for i in range(500)
+]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = FileDictionaryStore(str(tmp_path))
+    # 让默认仓库指向临时目录（生产者与 decode_message 使用默认仓库）
+    monkeypatch.setattr(compression, 'COMPRESSION_DICT_PATH', str(tmp_path))
+    monkeypatch.setattr(compression, '_decompressors', {})
+    return store
+
+
+def test_dictionary_round_trip(store):
+    dict_id = store.save(train_dictionary(SAMPLES, dict_size=8192))
+    codec = ZstdDictCodec(dict_id, level=3, store=store)
+    compressed = codec.compress(SAMPLES[7])
+    assert len(compressed) < len(SAMPLES[7]) / 2
+    assert codec.headers == [(ZSTD_DICT_HEADER, str(dict_id).encode())]
+    assert decompress_value(compressed, codec.headers, store) == SAMPLES[7]
+    # 不带字典 header 的消息原样返回
+    assert decompress_value(SAMPLES[7]) == SAMPLES[7]
+
+
+def test_resolve_compression(store):
+    assert resolve_compression({'codec': 'lz4'}) == ('lz4', None)
+    assert resolve_compression({'codec': 'none'}) == (None, None)
+    with pytest.raises(ValueError):
+        resolve_compression({'codec': 'brotli'})
+
+
+def test_producer_compresses_and_consumer_decodes(store):
+    dict_id = store.save(train_dictionary(SAMPLES, dict_size=8192))
+    producer = EchoProducer('compressed_topic', producer_config={'client_id': uuid.uuid4().hex},
+                            compression={'codec': 'zstd_dict', 'dict_id': dict_id, 'level': 3})
+    try:
+        # 应用层已压缩，KafkaProducer 不再整批压缩
+        assert producer.producer.config['compression_type'] is None
+        producer.send_batch([{'uid': '1', 'value': '资助项目'}])
+        key, value, headers = producer.producer.records[0]
+        assert headers == [(ZSTD_DICT_HEADER, str(dict_id).encode())]
+        assert decode_message(value, headers) == {'uid': '1', 'value': '资助项目'}
+    finally:
+        producer.flush_and_close()
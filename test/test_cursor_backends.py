@@ -0,0 +1,203 @@
+import pickle
+import uuid
+import zlib
+from collections import namedtuple
+
+import pytest
+from bson import ObjectId
+from kafka.errors import KafkaTimeoutError
+
+from application.cursor_model.backends import create_cursor_manager
+from application.cursor_model.cursor_log import CursorLogManager
+from application.cursor_model.kafka_cursor import KafkaCursorManager
+from application.cursor_model.sqlite_cursor import CursorConflictError, SqliteCursorManager
+from application.producers.spool import DeliveryFuture
+
+ConsumerRecord = namedtuple('ConsumerRecord', 'key value offset')
+
+
+@pytest.fixture
+def sqlite_cursor(tmp_path):
+    return SqliteCursorManager('c', 't', db_path=str(tmp_path / 'cursors.sqlite3'))
+
+
+def test_sqlite_round_trip_and_pickle(sqlite_cursor):
+    assert sqlite_cursor.load() is None and sqlite_cursor.version == 0
+    position = ObjectId()
+    sqlite_cursor.save(position)
+    assert sqlite_cursor.version == 1
+
+    restored = pickle.loads(pickle.dumps(sqlite_cursor))
+    assert restored.load() == position and restored.version == 1
+    assert SqliteCursorManager('c', 't', full_amount=True, db_path=sqlite_cursor.db_path).load() is None
+    assert SqliteCursorManager('c', 't', shard=1, db_path=sqlite_cursor.db_path).load() is None
+
+
+def test_sqlite_compare_and_set_detects_other_writers(sqlite_cursor):
+    other = SqliteCursorManager('c', 't', db_path=sqlite_cursor.db_path)
+    sqlite_cursor.load()
+    other.load()
+    assert sqlite_cursor.compare_and_set(ObjectId(), 0)
+    # 另一个进程以过期的版本号写入
+    assert not other.compare_and_set(ObjectId(), 0)
+    with pytest.raises(CursorConflictError):
+        other.save(ObjectId())
+
+    newer = ObjectId()
+    sqlite_cursor.save(newer)
+    assert other.load() == newer
+    other.save(ObjectId())
+    assert other.version == 3
+
+
+def test_sqlite_writes_are_coalesced(sqlite_cursor, monkeypatch):
+    monkeypatch.setattr(SqliteCursorManager, 'write_seconds', 3600)
+    positions = [ObjectId() for _ in range(5)]
+    for position in positions:
+        sqlite_cursor.save(position)
+    assert sqlite_cursor.writes == 1 and sqlite_cursor.load() == positions[0]
+
+    sqlite_cursor.flush()
+    sqlite_cursor.flush()
+    assert sqlite_cursor.writes == 2 and sqlite_cursor.load() == positions[-1]
+
+
+class StandInBroker:
+    """
+    进程内的压缩主题替身：按 key 哈希分区，compact() 模拟日志压缩（每个 key 只保留最后一条，偏移量不变）
+    """
+
+    def __init__(self, partitions=3):
+        self.logs = [[] for _ in range(partitions)]
+
+    def append(self, key, value):
+        log = self.logs[zlib.crc32(key) % len(self.logs)]
+        offset = log[-1].offset + 1 if log else 0
+        log.append(ConsumerRecord(key, value, offset))
+
+    def compact(self):
+        for i, log in enumerate(self.logs):
+            latest = {record.key: record.offset for record in log}
+            self.logs[i] = [record for record in log if latest[record.key] == record.offset]
+
+    def end_offset(self, partition):
+        log = self.logs[partition]
+        return log[-1].offset + 1 if log else 0
+
+
+class StandInProducer:
+    def __init__(self, broker, **config):
+        self.broker = broker
+        self.fail_delivery = False
+
+    def send(self, topic, value=None, key=None):
+        future = DeliveryFuture()
+        if self.fail_delivery:
+            return future.failure(KafkaTimeoutError('投递超时'))
+        self.broker.append(key, value)
+        return future.success(None)
+
+    def flush(self, timeout=None):
+        pass
+
+    def close(self, timeout=None):
+        pass
+
+
+class StandInConsumer:
+    """
+    KafkaConsumer 替身：每次 poll() 每个分区最多返回两条记录，验证 load() 会读到分区末尾
+    """
+
+    def __init__(self, broker, **config):
+        self.broker = broker
+        self.positions = {}
+
+    def partitions_for_topic(self, topic):
+        return set(range(len(self.broker.logs)))
+
+    def assign(self, partitions):
+        self.positions = {tp: 0 for tp in partitions}
+
+    def seek_to_beginning(self, *partitions):
+        for tp in partitions:
+            log = self.broker.logs[tp.partition]
+            self.positions[tp] = log[0].offset if log else 0
+
+    def end_offsets(self, partitions):
+        return {tp: self.broker.end_offset(tp.partition) for tp in partitions}
+
+    def position(self, tp):
+        return self.positions[tp]
+
+    def poll(self, timeout_ms=0):
+        result = {}
+        for tp, position in self.positions.items():
+            records = [record for record in self.broker.logs[tp.partition] if record.offset >= position][:2]
+            if records:
+                result[tp] = records
+                self.positions[tp] = records[-1].offset + 1
+        return result
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def kafka_cursor_class(monkeypatch):
+    broker = StandInBroker()
+    monkeypatch.setattr(KafkaCursorManager, 'producer_factory',
+                        staticmethod(lambda **config: StandInProducer(broker, **config)))
+    monkeypatch.setattr(KafkaCursorManager, 'consumer_factory',
+                        staticmethod(lambda **config: StandInConsumer(broker, **config)))
+    # 每个用例使用独立的生产者配置，避免与其他用例共享连接池中的生产者
+    config = {'bootstrap_servers': 'localhost:9092', 'client_id': uuid.uuid4().hex}
+
+    def create(*args, **kwargs):
+        return KafkaCursorManager(*args, producer_config=config, **kwargs)
+
+    create.broker = broker
+    return create
+
+
+def test_kafka_cursor_reads_latest_value_after_compaction(kafka_cursor_class, monkeypatch):
+    monkeypatch.setattr(KafkaCursorManager, 'write_seconds', 0)
+    cursor = kafka_cursor_class('c', 't')
+    other_topic = kafka_cursor_class('c', 't2')
+    assert cursor.load() is None
+
+    positions = [ObjectId() for _ in range(5)]
+    for position in positions:
+        cursor.save(position)
+        other_topic.save(ObjectId())
+    cursor.flush()
+    other_topic.flush()
+    assert cursor.writes == 5
+    assert kafka_cursor_class('c', 't').load() == positions[-1]
+
+    kafka_cursor_class.broker.compact()
+    assert sum(len(log) for log in kafka_cursor_class.broker.logs) == 2
+    assert kafka_cursor_class('c', 't').load() == positions[-1]
+    assert kafka_cursor_class('c', 't', shard=0).load() is None
+
+    restored = pickle.loads(pickle.dumps(cursor))
+    assert restored.load() == positions[-1]
+
+
+def test_kafka_cursor_flush_raises_delivery_failure(kafka_cursor_class, monkeypatch):
+    monkeypatch.setattr(KafkaCursorManager, 'write_seconds', 3600)
+    cursor = kafka_cursor_class('c', 't')
+    cursor.save(ObjectId())
+    cursor.producer.fail_delivery = True
+    cursor.save(ObjectId())
+    assert cursor.writes == 1
+    with pytest.raises(KafkaTimeoutError):
+        cursor.flush()
+
+
+def test_create_cursor_manager(tmp_path):
+    cursor = create_cursor_manager('sqlite', 'c', 't', db_path=str(tmp_path / 'cursors.sqlite3'))
+    assert isinstance(cursor, SqliteCursorManager)
+    assert isinstance(create_cursor_manager('file', 'c', 't', root_file_path=str(tmp_path)), CursorLogManager)
+    with pytest.raises(ValueError):
+        create_cursor_manager('redis', 'c', 't')
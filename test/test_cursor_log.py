@@ -0,0 +1,107 @@
+import os
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from application.cursor_model import cursor_log
+from application.cursor_model.cursor_log import RECORD_SIZE, CursorLogManager
+from application.cursor_model.file_cursor import FileCursorManager
+
+
+@pytest.fixture
+def cursor(tmp_path):
+    return CursorLogManager('c', 't', root_file_path=str(tmp_path))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    可控的保存时间：每次保存前设置 clock.now
+    """
+    state = type('Clock', (), {'now': 1_700_000_000.0})()
+    monkeypatch.setattr(cursor_log.time, 'time', lambda: state.now)
+    return state
+
+
+def test_log_appends_fixed_records(cursor):
+    positions = [ObjectId() for _ in range(5)]
+    for position in positions:
+        cursor.save(position)
+    assert cursor.load() == positions[-1]
+    assert os.path.getsize(cursor.log_path) == 5 * RECORD_SIZE
+    assert [position for _, position in cursor.history()] == positions[::-1]
+    assert [position for _, position in cursor.history(limit=2)] == positions[:2:-1]
+
+    with pytest.raises(ValueError):
+        cursor.save('x' * RECORD_SIZE)
+
+
+def test_torn_or_corrupt_tail_is_skipped(cursor):
+    first, second = ObjectId(), ObjectId()
+    cursor.save(first)
+    cursor.save(second)
+    # 崩溃时写了一半的记录
+    with open(cursor.log_path, 'ab') as f:
+        f.write(b'CL\x00\x01')
+    assert cursor.load() == second
+
+    third = ObjectId()
+    cursor.save(third)
+    assert os.path.getsize(cursor.log_path) == 3 * RECORD_SIZE
+    assert cursor.load() == third
+
+    # 末尾记录内容损坏（校验失败）
+    with open(cursor.log_path, 'r+b') as f:
+        f.seek(2 * RECORD_SIZE + 20)
+        f.write(b'\xff\xff')
+    assert cursor.load() == second
+
+
+def test_empty_log_reads_legacy_cursor_file(tmp_path):
+    legacy = ObjectId()
+    FileCursorManager('c', 't', root_file_path=str(tmp_path)).save(legacy)
+    cursor = CursorLogManager('c', 't', root_file_path=str(tmp_path))
+    assert cursor.load() == legacy
+
+    newer = ObjectId()
+    cursor.save(newer)
+    assert cursor.load() == newer
+
+
+def test_rewind_by_checkpoints_and_time(cursor, clock):
+    positions = [ObjectId() for _ in range(6)]
+    for i, position in enumerate(positions):
+        clock.now = 1_700_000_000.0 + i * 60
+        cursor.save(position)
+
+    assert cursor.position_at(checkpoints=0) == positions[-1]
+    assert cursor.position_at(until=datetime.fromtimestamp(1_700_000_000.0 + 150)) == positions[2]
+    assert cursor.position_at(until=datetime.fromtimestamp(1_600_000_000.0)) is None
+
+    clock.now += 60
+    assert cursor.rewind(checkpoints=2) == positions[3]
+    # 回退作为新记录追加，历史保持完整
+    assert cursor.load() == positions[3]
+    assert len(cursor.history()) == 7
+
+    assert cursor.rewind(until=datetime.fromtimestamp(1_700_000_000.0 + 60)) == positions[1]
+    assert cursor.load() == positions[1]
+    with pytest.raises(ValueError):
+        cursor.rewind(checkpoints=100)
+    with pytest.raises(ValueError):
+        cursor.position_at()
+
+
+def test_log_is_compacted(cursor, monkeypatch):
+    monkeypatch.setattr(CursorLogManager, 'max_records', 10)
+    monkeypatch.setattr(CursorLogManager, 'retain_records', 4)
+    positions = [ObjectId() for _ in range(12)]
+    for position in positions:
+        cursor.save(position)
+
+    # 第 10 条时压缩为 4 条，之后再追加 2 条
+    assert os.path.getsize(cursor.log_path) == 6 * RECORD_SIZE
+    assert [position for _, position in cursor.history()] == positions[:5:-1]
+    assert cursor.compact(keep=1) == 1
+    assert cursor.load() == positions[-1]
@@ -0,0 +1,188 @@
+import uuid
+
+import pytest
+
+from application.cursor_model import file_cursor
+from application.cursor_model.ack_tracker import AckCursorTracker
+from application.producers import information_mongo_to_kafka_producer as information_producer
+from application.producers.information_mongo_to_kafka_producer import InformationtoKafkaProducer
+from application.utils.dedup_index import SKIPPED, BloomFilter, DedupIndex, content_hash
+from test_spool import EchoProducer, MemoryCursor, StandInProducer
+
+
+def _open_index(tmp_path):
+    return DedupIndex('dedup_topic', 'docs', root_path=str(tmp_path), capacity=10_000)
+
+
+def test_bloom_filter_round_trip(tmp_path):
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f'uid-{i}'.encode())
+    assert all(f'uid-{i}'.encode() in bloom for i in range(1000))
+    false_positives = sum(f'other-{i}'.encode() in bloom for i in range(10_000))
+    assert false_positives < 300
+
+    path = str(tmp_path / 'bloom.bin')
+    bloom.save(path)
+    loaded = BloomFilter.load(path)
+    assert loaded.bits == bloom.bits and loaded.hashes == bloom.hashes
+
+
+def test_index_skips_only_unchanged_content(tmp_path):
+    index = _open_index(tmp_path)
+    index.record('a', content_hash(b'v1'))
+    index.record('b', content_hash(b'v1'))
+    index.close()
+
+    # 重新打开：布隆过滤器从文件加载
+    index = _open_index(tmp_path)
+    result = index.unchanged(['a', 'b', 'c', None], [content_hash(b'v1'), content_hash(b'v2'),
+                                                     content_hash(b'v1'), content_hash(b'v1')])
+    assert result == [True, False, False, False]
+    assert index.report()['skipped'] == 1
+    index.close()
+
+
+@pytest.mark.parametrize('history', [[b'A', b'B'], [b'A', b'']], ids=['A-B-A', 'delete-reinsert'])
+def test_only_the_latest_digest_counts(tmp_path, history):
+    index = _open_index(tmp_path)
+    for value in history:
+        # 空内容即 tombstone 记录的空指纹
+        index.record('u1', content_hash(value) if value else b'')
+        index.commit()
+    # 布隆过滤器中仍有 u1 的旧指纹 A，但最新指纹已被覆盖
+    assert index.unchanged(['u1'], [content_hash(b'A')]) == [False]
+
+    index.record('u1', content_hash(b'A'))
+    index.commit()
+    assert index.unchanged(['u1'], [content_hash(b'A')]) == [True]
+    assert index.unchanged(['u1'], [content_hash(history[-1])]) == [False]
+    index.close()
+
+    # 重新打开：布隆过滤器从 SQLite 重建，只包含最新指纹
+    assert not (tmp_path / 'dedup_topic' / 'docs' / 'bloom.bin').exists()
+    index = _open_index(tmp_path)
+    assert index.unchanged(['u1', 'u1'], [content_hash(b'A'), content_hash(b'B')]) == [True, False]
+    index.close()
+
+
+def test_tombstone_forgets_the_deleted_content(producer):
+    doc = {'id': 1, 'uid': 'u1', 'value': 'x'}
+    _sync(producer, [doc])
+    producer.send_tombstone('u1')
+    producer.before_cursor_commit()
+
+    # 删除后以相同内容重新写入：必须重新发送
+    _, result = _sync(producer, [doc])
+    assert result.count == 1 and len(producer.producer.records) == 3
+    _, result = _sync(producer, [doc])
+    assert result.count == 0
+
+
+class AlwaysHit:
+    """
+    总是命中的布隆过滤器替身：模拟误判
+    """
+
+    def __contains__(self, item):
+        return True
+
+    def add(self, item):
+        pass
+
+
+@pytest.mark.parametrize('verify', [False, True])
+def test_sqlite_verification_is_opt_in(tmp_path, monkeypatch, verify):
+    index = DedupIndex('dedup_topic', 'docs', root_path=str(tmp_path), capacity=10_000, verify=verify)
+    index.record('a', content_hash(b'v1'))
+    index.commit()
+    index.bloom = AlwaysHit()
+    queries = []
+    monkeypatch.setattr(index, 'conn', QueryCounter(index.conn, queries))
+
+    result = index.unchanged(['a', 'b'], [content_hash(b'v2'), content_hash(b'v1')])
+    if verify:
+        # 命中后查询 SQLite，误判被纠正
+        assert result == [False, False] and index.false_positives == 2 and len(queries) == 1
+    else:
+        # 默认只查内存：误判直接跳过，不访问 SQLite
+        assert result == [True, True] and queries == []
+
+
+class QueryCounter:
+    def __init__(self, conn, queries):
+        self.conn, self.queries = conn, queries
+
+    def execute(self, sql, *args):
+        self.queries.append(sql)
+        return self.conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def test_bloom_filter_rebuilt_after_crash(tmp_path):
+    index = _open_index(tmp_path)
+    index.record('a', content_hash(b'v1'))
+    index.commit()
+    # 未调用 close()：模拟异常退出，布隆过滤器文件不存在
+    index.conn.close()
+
+    index = _open_index(tmp_path)
+    assert index.unchanged(['a'], [content_hash(b'v1')]) == [True]
+    index.close()
+
+
+@pytest.fixture
+def producer(tmp_path):
+    instance = EchoProducer('dedup_topic', producer_config={'client_id': uuid.uuid4().hex})
+    instance.dedup = _open_index(tmp_path)
+    yield instance
+    instance.flush_and_close()
+
+
+def _sync(producer, docs):
+    cursor = MemoryCursor()
+    tracker = AckCursorTracker(cursor, before_commit=producer.before_cursor_commit)
+    result = producer.send_batch(docs)
+    tracker.track_batch([doc['id'] for doc in docs], result.futures)
+    tracker.checkpoint()
+    return cursor, result
+
+
+def test_unchanged_documents_are_not_resent(producer):
+    docs = [{'id': i, 'uid': str(i), 'value': 'x'} for i in range(5)]
+    _sync(producer, docs)
+    assert len(producer.producer.records) == 5
+
+    docs = [dict(doc) for doc in docs]
+    docs[2]['value'] = 'changed'
+    cursor, result = _sync(producer, docs)
+    # 只有内容变化的文档被重新发送，跳过的文档同样推进游标
+    assert len(producer.producer.records) == 6
+    assert result.count == 1
+    assert result.get().count(SKIPPED) == 4
+    assert cursor.saved == [4]
+    assert producer.stats.counters['dedup_skipped'] == 4
+
+
+class ShardProducer(InformationtoKafkaProducer):
+    producer_factory = StandInProducer
+
+
+def test_shards_use_separate_dedup_indexes(tmp_path, monkeypatch):
+    monkeypatch.setattr(information_producer, 'DEDUP_INDEX_PATH', str(tmp_path / 'dedup'))
+    monkeypatch.setattr(file_cursor, 'CURSOR_FILE_PATH', str(tmp_path / 'cursors'))
+    config = {'client_id': uuid.uuid4().hex}
+    producers = [ShardProducer('dedup_topic', producer_config=config, dedup={'verify': True},
+                               shard={'index': index, 'lower': None, 'upper': None}) for index in range(2)]
+    try:
+        # 各分片的布隆过滤器与 SQLite 索引互不覆盖
+        assert [producer.dedup.directory for producer in producers] == [
+            str(tmp_path / 'dedup' / f'shard{index:03d}' / 'dedup_topic' / InformationtoKafkaProducer.collection)
+            for index in range(2)
+        ]
+        assert all(producer.dedup.verify for producer in producers)
+    finally:
+        for producer in producers:
+            producer.flush_and_close()
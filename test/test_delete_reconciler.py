@@ -0,0 +1,199 @@
+import datetime
+import random
+import uuid
+
+import pytest
+from bson import ObjectId
+
+from application.cursor_model import file_cursor
+from application.producers import delete_reconciler
+from application.producers.delete_reconciler import DeleteReconciler
+from application.producers.information_mongo_to_kafka_producer import InformationtoKafkaProducer
+from application.utils.id_snapshot import IdJournal, IdSnapshotWriter, read_journal, read_snapshot
+from test_spool import EchoProducer, StandInProducer
+
+
+class FakeCursor:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def sort(self, key, direction):
+        self.ids = sorted(self.ids)
+        return self
+
+    def hint(self, index):
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        return iter({'_id': oid} for oid in self.ids)
+
+
+class FakeCollection:
+    name = 'fake_collection'
+
+    def __init__(self, ids):
+        self.ids = list(ids)
+        self.projections = []
+
+    def find(self, query, projection):
+        self.projections.append(projection)
+        return FakeCursor(self.ids)
+
+
+@pytest.fixture
+def producer():
+    instance = EchoProducer('reconcile_topic', producer_config={'client_id': uuid.uuid4().hex}, key_strategy='uid')
+    yield instance
+    instance.flush_and_close()
+
+
+@pytest.mark.parametrize('key_strategy', [None, 'info_source'])
+def test_reconcile_requires_uid_keys(tmp_path, key_strategy):
+    producer = EchoProducer('reconcile_topic', producer_config={'client_id': uuid.uuid4().hex},
+                            key_strategy=key_strategy)
+    try:
+        # upsert 消息的 key 与 tombstone 不一致时拒绝对账
+        with pytest.raises(ValueError, match='key_strategy=uid'):
+            DeleteReconciler(producer, FakeCollection([]), snapshot_path=str(tmp_path / 'ids.snap'))
+    finally:
+        producer.flush_and_close()
+
+
+def test_snapshot_round_trip_is_compact(tmp_path):
+    ids = sorted(ObjectId() for _ in range(1000))
+    path = str(tmp_path / 'ids.snap')
+    writer = IdSnapshotWriter(path)
+    for oid in ids:
+        writer.append(oid)
+    writer.commit()
+
+    assert list(read_snapshot(path)) == ids
+    # 同一进程连续生成的 ObjectId 差值很小，远小于 12 字节/条
+    assert (tmp_path / 'ids.snap').stat().st_size < len(ids) * 4
+
+    writer = IdSnapshotWriter(path)
+    with pytest.raises(ValueError):
+        writer.append(ids[1])
+        writer.append(ids[0])
+    writer.abort()
+    assert list(read_snapshot(path)) == ids
+
+
+def test_reconcile_emits_tombstones_for_deleted_ids(producer, tmp_path):
+    ids = sorted(ObjectId() for _ in range(10))
+    collection = FakeCollection(ids)
+    path = str(tmp_path / 'ids.snap')
+
+    # 首次对账只建立快照
+    assert DeleteReconciler(producer, collection, snapshot_path=path).run() == \
+        {'scanned': 10, 'previous': 0, 'deleted': 0}
+    assert collection.projections == [{'_id': 1}]
+
+    # 删除首、中、尾的文档并新增一篇
+    deleted = [ids[0], ids[4], ids[9]]
+    collection.ids = [oid for oid in ids if oid not in deleted] + [ObjectId()]
+    summary = DeleteReconciler(producer, collection, snapshot_path=path).run()
+
+    assert summary == {'scanned': 8, 'previous': 10, 'deleted': 3}
+    assert producer.producer.records == [(str(oid).encode(), None, None) for oid in deleted]
+    assert list(read_snapshot(path)) == sorted(collection.ids)
+
+
+def test_failed_tombstones_keep_previous_snapshot(producer, tmp_path):
+    ids = sorted(ObjectId() for _ in range(3))
+    path = str(tmp_path / 'ids.snap')
+    DeleteReconciler(producer, FakeCollection(ids), snapshot_path=path).run()
+
+    producer.producer.fail_delivery = True
+    with pytest.raises(RuntimeError):
+        DeleteReconciler(producer, FakeCollection(ids[:1]), snapshot_path=path).run()
+    assert list(read_snapshot(path)) == ids
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_journal_is_read_sorted_and_unique(tmp_path):
+    ids = sorted(ObjectId() for _ in range(100))
+    shuffled = ids + ids[::3]
+    random.shuffle(shuffled)
+    journal = IdJournal(str(tmp_path / 'ids.journal'))
+    for oid in shuffled[:60]:
+        journal.add(oid)
+    journal.add('not-an-object-id')
+    journal.flush()
+    for oid in shuffled[60:]:
+        journal.add(oid)
+    journal.close()
+    # 模拟写入中途崩溃留下的不完整记录
+    with open(tmp_path / 'ids.journal', 'ab') as f:
+        f.write(ObjectId().binary[:5])
+
+    assert list(read_journal([str(tmp_path / 'ids.journal')], chunk_records=7)) == ids
+
+
+def test_ids_delivered_between_reconciles_are_tombstoned(producer, tmp_path):
+    ids = sorted(ObjectId() for _ in range(3))
+    path = str(tmp_path / 'ids.snap')
+    DeleteReconciler(producer, FakeCollection(ids), snapshot_path=path).run()
+
+    # 两次对账之间写入、同步后又删除的文档：不在上次快照中，也不在本次扫描中
+    transient = ObjectId()
+    journal = IdJournal(str(tmp_path / 'ids.journal'))
+    for oid in (ids[1], transient):
+        journal.add(oid)
+    journal.flush()
+
+    summary = DeleteReconciler(producer, FakeCollection(ids), snapshot_path=path).run()
+    assert summary == {'scanned': 3, 'previous': 4, 'deleted': 1}
+    assert producer.producer.records == [(str(transient).encode(), None, None)]
+    # 投递日志已并入快照
+    assert list(tmp_path.iterdir()) == [tmp_path / 'ids.snap']
+    assert DeleteReconciler(producer, FakeCollection(ids), snapshot_path=path).run()['deleted'] == 0
+
+
+def test_journal_is_kept_when_tombstones_fail(producer, tmp_path):
+    path = str(tmp_path / 'ids.snap')
+    DeleteReconciler(producer, FakeCollection([]), snapshot_path=path).run()
+    transient = ObjectId()
+    journal = IdJournal(str(tmp_path / 'ids.journal'))
+    journal.add(transient)
+    journal.flush()
+
+    producer.producer.fail_delivery = True
+    with pytest.raises(RuntimeError):
+        DeleteReconciler(producer, FakeCollection([]), snapshot_path=path).run()
+    producer.producer.fail_delivery = False
+    assert DeleteReconciler(producer, FakeCollection([]), snapshot_path=path).run()['deleted'] == 1
+    assert producer.producer.records[-1] == (str(transient).encode(), None, None)
+    assert not list(tmp_path.glob('ids.journal*'))
+
+
+class JournalProducer(InformationtoKafkaProducer):
+    producer_factory = StandInProducer
+
+
+def test_producer_journals_delivered_ids_once_reconciled(tmp_path, monkeypatch):
+    monkeypatch.setattr(delete_reconciler, 'ID_SNAPSHOT_PATH', str(tmp_path / 'snapshots'))
+    monkeypatch.setattr(file_cursor, 'CURSOR_FILE_PATH', str(tmp_path / 'cursors'))
+    config = {'client_id': uuid.uuid4().hex}
+    docs = [{'_id': ObjectId(), 'info_name': f'标题{i}', 'create_time': datetime.datetime(2024, 9, 1),
+             'info_section': []}
+            for i in range(3)]
+
+    # 未执行过删除对账时不记录
+    producer = JournalProducer('journal_topic', producer_config=config)
+    assert producer.id_journal is None
+    producer.flush_and_close()
+
+    snapshot_path = delete_reconciler.snapshot_path_for('journal_topic', JournalProducer.collection)
+    IdSnapshotWriter(snapshot_path).commit()
+    producer = JournalProducer('journal_topic', producer_config=config)
+    try:
+        producer.send_batch([dict(doc) for doc in docs]).get(timeout=1)
+        producer.before_cursor_commit()
+        journal_path = delete_reconciler.journal_path_for(snapshot_path)
+        assert list(read_journal([journal_path])) == [doc['_id'] for doc in docs]
+    finally:
+        producer.flush_and_close()
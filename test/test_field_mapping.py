@@ -0,0 +1,112 @@
+import datetime
+import json
+import uuid
+
+import pytest
+from bson import ObjectId
+
+from application.models.kafka_models.information_data_structure import InformationDataStructure
+from application.producers.field_mapping import compile_mapping, load_mapping, register_cleaner
+from application.producers.information_mongo_to_kafka_producer import InformationtoKafkaProducer
+from application.producers.serializers import get_serializer
+from test_serializers import DOCS, PRODUCER, _payloads
+from test_spool import EchoProducer
+
+CONTEXT = {'topic': PRODUCER.topic, 'data_type': PRODUCER.data_type}
+
+
+def test_information_mapping_matches_hand_written_transform():
+    mapper = compile_mapping(load_mapping('information.yaml'), CONTEXT, name='information')
+    serializer = get_serializer('trusted', InformationDataStructure)
+    for doc, expected in zip(DOCS, _payloads()):
+        mapped = mapper(dict(doc))
+        assert mapped.pop('info_source') == (
+            None if doc.get('info_source') is None else doc['info_source'].replace('作者：', '').replace(' ', '')
+        )
+        assert mapped == expected
+        assert serializer.serialize(mapped) == serializer.serialize(expected)
+
+
+@pytest.mark.parametrize('doc', [
+    {'_id': ObjectId()},
+    {'_id': ObjectId(), 'info_section': None, 'column_info': None, 'link_data': None, 'info_date': None,
+     'create_time': None, 'info_name': None, 'info_author': None, 'description': None, 'page_url': None,
+     'marc_code': '', 'info_source': None},
+    {'_id': ObjectId(), 'info_section': [], 'column_info': [], 'link_data': [], 'info_date': '', 'marc_code': 'en'},
+    {'_id': ObjectId(), 'info_section': '', 'column_info': {'name': '要闻'}, 'create_time': datetime.datetime(2024, 9, 1),
+     'info_source': 5},
+])
+def test_information_mapping_parity_for_missing_and_none(doc):
+    """
+    字段缺失、为 None 与为空值时，映射规格与手写 transform / build_payload 的输出逐字段一致
+    """
+    mapper = compile_mapping(load_mapping('information.yaml'), CONTEXT, name='information')
+    message = InformationtoKafkaProducer.transform(PRODUCER, dict(doc))
+    expected = InformationtoKafkaProducer.build_payload(PRODUCER, message)
+    mapped = mapper(dict(doc))
+    assert mapped.pop('info_source') == message.get('info_source')
+    assert mapped == expected
+
+
+def test_clean_none():
+    spec = {'fields': [
+        {'target': 'a', 'source': 'a', 'default': '[]', 'default_when': 'missing', 'clean_none': True,
+         'cleaners': ['json']},
+        {'target': 'b', 'source': 'b', 'clean_none': True, 'cleaners': ['json']},
+    ]}
+    mapper = compile_mapping(spec)
+    assert mapper({}) == {'a': '[]', 'b': 'null'}
+    assert mapper({'a': None, 'b': [1]}) == {'a': 'null', 'b': '[1]'}
+
+
+def test_defaults_cleaners_and_nested_paths():
+    mapper = compile_mapping({'fields': [
+        {'target': 'kind', 'value': 'news'},
+        {'target': 'meta.lang', 'source': 'info.lang', 'default': 'zh'},
+        {'target': 'meta.title', 'source': 'title', 'cleaners': ['strip', {'replace': {'旧': '新'}}]},
+        {'target': 'tags', 'source': 'tags', 'default': [], 'default_when': 'empty'},
+        {'target': 'author', 'source': 'author', 'default': '', 'default_when': 'missing'},
+    ]})
+    assert mapper({'info': {'lang': 'en'}, 'title': ' 旧标题 ', 'tags': ['a'], 'author': None}) == {
+        'kind': 'news', 'meta': {'lang': 'en', 'title': '新标题'}, 'tags': ['a'], 'author': None,
+    }
+    first, second = mapper({'info': 'not a dict', 'tags': []}), mapper({})
+    assert first == {'kind': 'news', 'meta': {'lang': 'zh', 'title': None}, 'tags': [], 'author': ''}
+    # 可变默认值每次调用生成新对象
+    assert first['tags'] is not second['tags']
+
+
+def test_custom_cleaner_and_spec_errors():
+    @register_cleaner('digits')
+    def digits(value, arg=None):
+        return ''.join(ch for ch in value if ch.isdigit())[:arg]
+
+    mapper = compile_mapping({'fields': [{'target': 'code', 'source': 'code', 'cleaners': [{'digits': 3}]}]})
+    assert mapper({'code': 'a1b2c3d4'}) == {'code': '123'}
+
+    with pytest.raises(ValueError):
+        compile_mapping({'fields': [{'target': 'x', 'source': 'x', 'cleaners': ['unknown']}]})
+    with pytest.raises(ValueError):
+        compile_mapping({'fields': [{'target': 'x', 'context': 'topic'}]})
+    with pytest.raises(ValueError):
+        compile_mapping({'fields': [{'target': 'a', 'source': 'a'}, {'target': 'a.b', 'source': 'b'}]})
+
+
+def test_producer_uses_compiled_mapping():
+    spec = {'fields': [
+        {'target': 'topic', 'context': 'topic'},
+        {'target': 'uid', 'source': '_id', 'cleaners': ['str']},
+        {'target': 'data.body', 'source': 'body', 'default': ''},
+    ]}
+    producer = EchoProducer('mapping_topic', producer_config={'client_id': uuid.uuid4().hex},
+                            key_strategy='uid', field_mapping=spec)
+    try:
+        producer.send_batch([{'_id': 1, 'body': 'x'}, {'_id': 2}])
+        assert [(key, json.loads(value)) for key, value, _ in producer.producer.records] == [
+            (b'1', {'topic': 'mapping_topic', 'uid': '1', 'data': {'body': 'x'}}),
+            (b'2', {'topic': 'mapping_topic', 'uid': '2', 'data': {'body': ''}}),
+        ]
+        # 生成的函数不随实例 pickle 到序列化工作进程
+        assert 'mapper' not in producer.__getstate__()
+    finally:
+        producer.flush_and_close()
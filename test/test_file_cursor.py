@@ -0,0 +1,85 @@
+import os
+
+import pytest
+from bson import ObjectId
+
+from application.cursor_model.ack_tracker import AckCursorTracker
+from application.cursor_model.file_cursor import FileCursorManager
+from application.producers.spool import DeliveryFuture
+from application.utils.metrics import RunStats
+
+
+@pytest.fixture
+def cursor(tmp_path):
+    return FileCursorManager('c', 't', root_file_path=str(tmp_path))
+
+
+def test_previous_checkpoint_is_kept_with_checksum(cursor):
+    first, second = ObjectId(), ObjectId()
+    cursor.save(first)
+    cursor.save(second)
+    assert cursor.load() == second
+    with open(cursor.file_path) as f:
+        text, checksum = f.read().rstrip('\n').split('\t')
+    assert len(checksum) == 8
+    assert FileCursorManager._read(cursor.prev_path) == first
+
+
+@pytest.mark.parametrize('content', ['', '{"$oid": "66f1c2a0e4b0', '{"$oid": "66f1c2a0e4b0a1b2c3d4e5f6"}\t00000000\n'])
+def test_corrupt_checkpoint_falls_back_to_previous(cursor, content):
+    first = ObjectId()
+    cursor.save(first)
+    cursor.save(ObjectId())
+    with open(cursor.file_path, 'w') as f:
+        f.write(content)
+    assert cursor.load() == first
+
+    with open(cursor.prev_path, 'w') as f:
+        f.write('')
+    with pytest.raises(ValueError):
+        cursor.load()
+
+
+def test_crash_during_save_keeps_a_readable_checkpoint(cursor, monkeypatch):
+    first = ObjectId()
+    cursor.save(first)
+    replace = os.replace
+
+    def crash_after_first_rename(src, dst):
+        replace(src, dst)
+        if dst == cursor.prev_path:
+            raise KeyboardInterrupt
+
+    # 当前检查点已改名为 .prev、新检查点尚未改名时崩溃
+    monkeypatch.setattr(os, 'replace', crash_after_first_rename)
+    with pytest.raises(KeyboardInterrupt):
+        cursor.save(ObjectId())
+    monkeypatch.setattr(os, 'replace', replace)
+    assert not os.path.exists(cursor.file_path)
+    assert cursor.load() == first
+
+
+def test_fsync_is_batched_and_flushed_at_the_end(cursor, monkeypatch):
+    synced = []
+    monkeypatch.setattr(os, 'fsync', synced.append)
+    monkeypatch.setattr(FileCursorManager, 'fsync_seconds', 3600)
+    for _ in range(5):
+        cursor.save(ObjectId())
+    assert cursor.fsyncs == 1
+    cursor.flush()
+    cursor.flush()
+    assert cursor.fsyncs == 2
+
+
+def test_tracker_reports_checkpoint_overhead(cursor):
+    stats = RunStats()
+    tracker = AckCursorTracker(cursor, checkpoint_interval=2, checkpoint_seconds=3600, stats=stats)
+    positions = [ObjectId() for _ in range(5)]
+    tracker.track_batch(positions, [DeliveryFuture().success(None) for _ in positions])
+    assert tracker.maybe_checkpoint()
+    tracker.checkpoint(final=True)
+
+    assert cursor.load() == positions[-1]
+    assert tracker.checkpoints == 1
+    assert stats.counters['checkpoints'] == 1
+    assert 'checkpoint_seconds' in stats.summary()
@@ -0,0 +1,99 @@
+import datetime
+import pickle
+from types import SimpleNamespace
+
+import bson
+import pytest
+from bson import Binary, Decimal128, Int64, ObjectId, Regex
+from bson.codec_options import CodecOptions
+
+from application.db.mongo_db.mongo_db_manager import MongoDBDataStream
+from application.models.kafka_models.information_data_structure import InformationDataStructure
+from application.producers.information_mongo_to_kafka_producer import InformationtoKafkaProducer
+from application.producers.schema_registry import FileSchemaRegistry
+from application.producers.serializers import get_serializer
+from application.utils.lazy_bson import LazyBSONDocument
+from test_watermark import FakeCollection, FakeCursor
+
+
+class RawCollection(FakeCollection):
+    """
+    支持 with_options(codec_options=...) 的集合替身：document_class 为 LazyBSONDocument 时返回原始 BSON
+    """
+    codec_options = CodecOptions()
+
+    def with_options(self, codec_options):
+        raw = RawCollection(self.docs)
+        raw.codec_options = codec_options
+        return raw
+
+    def find(self, filter, projection=None):
+        cursor = super().find(filter, projection)
+        document_class = self.codec_options.document_class
+        if document_class is LazyBSONDocument:
+            cursor = FakeCursor([document_class(bson.encode(doc), self.codec_options) for doc in cursor.docs])
+        return cursor
+
+
+def _document(i=0):
+    return {
+        '_id': ObjectId(), 'info_name': f'标题{i}', 'create_time': datetime.datetime(2024, 9, 1, 8, 30),
+        'info_date': '来源： 2024-09-01', 'info_source': '作者： 新华社', 'info_author': None,
+        'info_section': [{'type': 'text', 'content': '正文' * 50, 'attrs': {'level': 1}}, '段落'],
+        'data': {'summary': '摘要', 'attrs': {'level': 2}},
+        'column_info': [{'name': '要闻'}], 'link_data': [{'url': 'https://example.com/a.pdf', 'size': Int64(12)}],
+        'page_url': 'https://example.com', 'marc_code': None, 'raw_html': '<p>' * 100,
+    }
+
+
+def test_only_accessed_fields_are_decoded():
+    doc = _document()
+    lazy = LazyBSONDocument(bson.encode(doc))
+    assert lazy['info_name'] == '标题0'
+    assert list(lazy._cache) == ['info_name']
+
+    data = lazy['data']
+    assert isinstance(data, LazyBSONDocument) and data._cache == {}
+    assert data['attrs'] == {'level': 2} and isinstance(data['attrs'], LazyBSONDocument)
+    assert lazy['info_section'] == doc['info_section'] and type(lazy['info_section'][0]) is dict
+    assert lazy.get('missing') is None and 'raw_html' in lazy
+    assert list(lazy) == list(doc) and lazy == doc
+
+
+def test_assignment_goes_to_overlay_and_survives_pickle():
+    doc = _document()
+    lazy = LazyBSONDocument(bson.encode(doc))
+    raw = lazy.raw
+    lazy['uid'] = str(doc['_id'])
+    lazy['info_name'] = '新标题'
+    assert lazy.raw == raw
+    assert list(lazy)[-1] == 'uid' and len(lazy) == len(doc) + 1
+
+    restored = pickle.loads(pickle.dumps(lazy))
+    assert restored == lazy and restored['info_name'] == '新标题'
+
+
+def test_all_bson_types_match_full_decode():
+    doc = {'d': 1.5, 'b': Binary(b'\x00\x01', 5), 'n': None, 'r': Regex('^a', 'i'), 'i': 7, 'l': Int64(1 << 40),
+           'm': Decimal128('1.10'), 't': True, 'a': [[1, {'x': 2}], []], 'e': {}}
+    lazy = LazyBSONDocument(bson.encode(doc))
+    assert {key: lazy[key] for key in reversed(list(doc))} == bson.decode(bson.encode(doc))
+
+
+@pytest.mark.parametrize('mode', ['validated', 'trusted', 'avro'])
+def test_raw_stream_serializes_identically(monkeypatch, tmp_path, mode):
+    docs = [_document(i) for i in range(5)]
+    monkeypatch.setattr(MongoDBDataStream, 'mongodb_manager', SimpleNamespace(db={'c': RawCollection(docs)}))
+    producer = SimpleNamespace(topic='t', data_type='information')
+    options = {'registry': FileSchemaRegistry(str(tmp_path))} if mode == 'avro' else {}
+    serializer = get_serializer(mode, InformationDataStructure, **options)
+
+    def serialized(raw):
+        stream = MongoDBDataStream('c', batch_size=2, sort_key='_id', historical_cursor_position=None, raw=raw)
+        return [serializer.serialize(InformationtoKafkaProducer.build_payload(
+            producer, InformationtoKafkaProducer.transform(producer, doc))) for doc in stream.get_all()], stream
+
+    plain, _ = serialized(False)
+    lazy, stream = serialized(True)
+    assert lazy == plain
+    assert stream._sample_bytes == len(bson.encode(docs[0]))
@@ -0,0 +1,48 @@
+import json
+import os
+import time
+
+import pytest
+
+from test_batch_send import JsonProducer, create_producer
+
+
+class SlowFirstChunkProducer(JsonProducer):
+    """
+    前面的消息序列化得更慢，使后面的分片先完成
+    """
+
+    def value_serialize(self, message):
+        time.sleep(max(0.0, 0.02 - message['index'] * 0.001))
+        return json.dumps(dict(message, pid=os.getpid())).encode('utf-8')
+
+
+@pytest.fixture
+def producer():
+    instance = create_producer(SlowFirstChunkProducer, 'serialize_topic', serialize_workers=2, serialize_chunk_size=3)
+    yield instance
+    instance.flush_and_close()
+
+
+def test_pool_output_keeps_input_order(producer):
+    messages = [{'index': i} for i in range(20)]
+    values = [json.loads(value) for value in producer.serialize_batch(messages)]
+
+    assert [value['index'] for value in values] == list(range(20))
+    # 确实在工作进程中执行
+    assert os.getpid() not in {value['pid'] for value in values}
+    assert producer._pool_serializer is not None
+
+
+def test_small_batches_stay_in_process(producer):
+    values = [json.loads(value) for value in producer.serialize_batch([{'index': i} for i in range(3)])]
+    assert [value['index'] for value in values] == [0, 1, 2]
+    assert {value['pid'] for value in values} == {os.getpid()}
+    assert producer._pool_serializer is None
+
+
+def test_send_batch_through_pool_delivers_in_order(producer):
+    result = producer.send_batch([{'index': i} for i in range(10)])
+    producer.producer.complete()
+    assert [metadata.offset for metadata in result.get(timeout=5)] == list(range(10))
+    assert [json.loads(value)['index'] for _, value in producer.producer.records] == list(range(10))
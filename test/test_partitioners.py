@@ -0,0 +1,85 @@
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+from kafka.partitioner import DefaultPartitioner
+
+from application.producers.partitioners import KEY_STRATEGIES, BatchStickyPartitioner, get_key_strategy
+from test_batch_send import create_producer
+
+PRODUCER = SimpleNamespace(topic='temp4', data_type='information_nsfc')
+PARTITIONS = [0, 1, 2]
+
+
+def test_preset_key_strategies():
+    message = {'uid': '66f1c2a0e4b0a1b2c3d4e5f6', 'info_source': '基金委'}
+    assert KEY_STRATEGIES['uid'](PRODUCER, message) == '66f1c2a0e4b0a1b2c3d4e5f6'
+    assert get_key_strategy('info_source')(PRODUCER, message) == '基金委'
+    # 消息中没有的字段取生产者属性
+    assert get_key_strategy('data_type')(PRODUCER, message) == 'information_nsfc'
+    assert get_key_strategy('uid')(PRODUCER, {}) is None
+
+
+def test_field_and_hash_strategies():
+    message = {'info_author': '张三', 'info_source': '基金委', 'rank': 3}
+    assert get_key_strategy('field:rank')(PRODUCER, message) == '3'
+    assert get_key_strategy('field:missing')(PRODUCER, message) is None
+
+    strategy = get_key_strategy('hash: info_source , data_type,')
+    expected = hashlib.md5('基金委\x1finformation_nsfc'.encode('utf-8')).hexdigest()
+    assert strategy(PRODUCER, message) == expected
+    assert strategy(PRODUCER, dict(message, info_author='李四')) == expected
+    assert strategy(PRODUCER, dict(message, info_source='新华社')) != expected
+
+
+@pytest.mark.parametrize('spec', ['', None])
+def test_no_key_strategy(spec):
+    assert get_key_strategy(spec) is None
+
+
+@pytest.mark.parametrize('spec', ['unknown', 'field:', 'hash:', 'hash: , '])
+def test_invalid_key_strategy(spec):
+    with pytest.raises(ValueError):
+        get_key_strategy(spec)
+
+
+def test_sticky_partitioner_sticks_within_a_batch_and_rotates_between_batches():
+    partitioner = BatchStickyPartitioner()
+    batches = []
+    for _ in range(4):
+        partitioner.next_batch()
+        batches.append({partitioner(None, PARTITIONS, PARTITIONS) for _ in range(5)})
+    assert batches == [{0}, {1}, {2}, {0}]
+
+
+def test_sticky_partitioner_leaves_unavailable_partitions():
+    partitioner = BatchStickyPartitioner()
+    partitioner.next_batch()
+    assert partitioner(None, PARTITIONS, PARTITIONS) == 0
+    # 当前分区不可用时批次内也会切换
+    assert partitioner(None, PARTITIONS, [1, 2]) in (1, 2)
+    # 没有可用分区时退回全部分区
+    partitioner.next_batch()
+    assert partitioner(None, PARTITIONS, []) in PARTITIONS
+
+
+def test_keyed_messages_use_murmur2():
+    partitioner = BatchStickyPartitioner()
+    for key in (b'a', b'uid-1', '基金委'.encode('utf-8')):
+        assert partitioner(key, PARTITIONS, PARTITIONS) == DefaultPartitioner()(key, PARTITIONS, PARTITIONS)
+
+
+def test_send_batch_rotates_sticky_partition():
+    producer = create_producer(topic='sticky_topic', partitioner='sticky')
+    try:
+        assert isinstance(producer.partitioner, BatchStickyPartitioner)
+        partitions = []
+        for _ in range(3):
+            producer.send_batch([{'n': 1}])
+            partitions.append(producer.partitioner(None, PARTITIONS, PARTITIONS))
+        assert partitions == [0, 1, 2]
+    finally:
+        producer.flush_and_close()
+
+    with pytest.raises(ValueError):
+        create_producer(topic='sticky_topic', partitioner='random')
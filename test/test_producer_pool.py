@@ -0,0 +1,76 @@
+import uuid
+
+from application.producers.partitioners import BatchStickyPartitioner
+from application.producers.producer_pool import KafkaProducerPool
+from test_batch_send import RecordingProducer
+
+
+class OtherRecordingProducer(RecordingProducer):
+    pass
+
+
+class ClosingProducer(RecordingProducer):
+    def __init__(self, **config):
+        super().__init__(**config)
+        self.closed = []
+
+    def close(self, timeout=None):
+        self.closed.append(timeout)
+
+
+def _config(**extra):
+    # 独立的 client_id 保证不与其他用例共享池条目
+    return dict({'bootstrap_servers': 'localhost:9092', 'client_id': uuid.uuid4().hex}, **extra)
+
+
+def test_factory_is_part_of_the_pool_key():
+    config = _config()
+    first = KafkaProducerPool.acquire(config, factory=RecordingProducer)
+    other = KafkaProducerPool.acquire(config, factory=OtherRecordingProducer)
+    try:
+        assert type(first) is RecordingProducer and type(other) is OtherRecordingProducer
+        assert KafkaProducerPool.acquire(config, factory=RecordingProducer) is first
+        assert KafkaProducerPool.release(first) is False
+        assert KafkaProducerPool.fingerprint(config, RecordingProducer) != \
+            KafkaProducerPool.fingerprint(config, OtherRecordingProducer)
+        assert KafkaProducerPool.fingerprint(config, RecordingProducer) == \
+            KafkaProducerPool.fingerprint(dict(config), RecordingProducer)
+    finally:
+        KafkaProducerPool.release(first)
+        KafkaProducerPool.release(other)
+
+
+def test_shared_instance_is_closed_by_the_last_release():
+    config = _config()
+    producer = KafkaProducerPool.acquire(config, factory=ClosingProducer)
+    assert KafkaProducerPool.acquire(dict(config), factory=ClosingProducer) is producer
+    fingerprint = KafkaProducerPool.fingerprint(config, ClosingProducer)[:12]
+    assert KafkaProducerPool.metrics()[fingerprint]['refcount'] == 2
+
+    assert KafkaProducerPool.release(producer, timeout=5) is False
+    assert producer.closed == [] and KafkaProducerPool.metrics()[fingerprint]['refcount'] == 1
+    assert KafkaProducerPool.release(producer, timeout=5) is True
+    assert producer.closed == [5] and fingerprint not in KafkaProducerPool.metrics()
+
+    # 全部释放后再次获取会创建新实例
+    renewed = KafkaProducerPool.acquire(config, factory=ClosingProducer)
+    assert renewed is not producer
+    KafkaProducerPool.release(renewed)
+
+
+def test_unpooled_producer_is_closed_on_release():
+    producer = ClosingProducer()
+    assert KafkaProducerPool.release(producer, timeout=1) is True
+    assert producer.closed == [1]
+
+
+def test_partitioner_instances_are_fingerprinted_by_class():
+    config = _config()
+    first = KafkaProducerPool.acquire(dict(config, partitioner=BatchStickyPartitioner()), factory=RecordingProducer)
+    second = KafkaProducerPool.acquire(dict(config, partitioner=BatchStickyPartitioner()), factory=RecordingProducer)
+    unpartitioned = KafkaProducerPool.acquire(config, factory=RecordingProducer)
+    try:
+        assert first is second and unpartitioned is not first
+    finally:
+        for producer in (first, second, unpartitioned):
+            KafkaProducerPool.release(producer)
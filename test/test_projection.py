@@ -0,0 +1,98 @@
+import hashlib
+import uuid
+from types import SimpleNamespace
+
+import bson
+import pytest
+from bson import ObjectId
+
+from application.db.mongo_db.mongo_db_manager import MongoDBDataStream, build_projection
+from application.producers.field_mapping import load_mapping, mapping_sources
+from application.producers.information_mongo_to_kafka_producer import InformationtoKafkaProducer
+from test_spool import EchoProducer
+from test_watermark import FakeCollection
+
+
+class SizedCollection(FakeCollection):
+    """
+    支持 $bsonSize 汇总的集合替身（只实现 read_report 用到的聚合）
+    """
+
+    def aggregate(self, pipeline):
+        ids = set(pipeline[0]['$match']['_id']['$in'])
+        return [{'_id': None, 'bytes': sum(len(bson.encode(doc)) for doc in self.docs if doc['_id'] in ids)}]
+
+
+def test_build_projection_drops_covered_paths():
+    assert build_projection(['data.a', 'data', '_id', 'name', 'data.b', 'name']) == {'_id': 1, 'data': 1, 'name': 1}
+
+
+def test_mapping_sources_match_hand_written_fields():
+    # 映射规格推导出的字段与手写生产者声明的字段一致
+    assert set(mapping_sources(load_mapping('information.yaml'))) == set(InformationtoKafkaProducer.source_fields)
+
+
+def test_projection_is_pushed_down_and_reported(monkeypatch):
+    docs = [{'_id': ObjectId(), 'info_name': f'标题{i}', 'info_section': ['正文' * 200], 'raw_html': '<p>' * 500}
+            for i in range(250)]
+    collection = SizedCollection(docs)
+    monkeypatch.setattr(MongoDBDataStream, 'mongodb_manager', SimpleNamespace(db={'c': collection}))
+    stream = MongoDBDataStream('c', batch_size=100, sort_key='_id', historical_cursor_position=None,
+                               projection=['info_name', 'info_section'])
+
+    read = [doc for batch in stream.get_batches() for doc in batch]
+    assert stream.projection == {'_id': 1, 'info_name': 1, 'info_section': 1}
+    assert all('raw_html' not in doc for doc in read)
+
+    report = stream.read_report()
+    assert report['docs_read'] == 250
+    assert report['bytes_read'] < report['full_bytes']
+    assert report['projection_saving'] == pytest.approx(
+        1 - sum(len(bson.encode(doc)) for doc in read) / sum(len(bson.encode(doc)) for doc in docs), abs=0.01)
+
+
+class ProjectedProducer(EchoProducer):
+    source_fields = ('_id', 'info_name')
+
+    def transform(self, doc):
+        return {key: str(value) for key, value in doc.items()}
+
+
+@pytest.mark.parametrize('key_strategy, fields', [
+    (None, ['_id', 'info_name']),
+    ('uid', ['_id', 'info_name', 'uid']),
+    ('field:info_author', ['_id', 'info_name', 'info_author']),
+    ('hash:info_source,info_name', ['_id', 'info_name', 'info_source']),
+])
+def test_key_strategy_fields_are_projected(key_strategy, fields):
+    producer = ProjectedProducer('projection_topic', producer_config={'client_id': uuid.uuid4().hex},
+                                 key_strategy=key_strategy)
+    try:
+        assert producer.read_fields() == fields
+    finally:
+        producer.flush_and_close()
+
+
+def test_projected_documents_keep_key_values(monkeypatch):
+    docs = [{'_id': ObjectId(), 'info_name': f'标题{i}', 'info_source': f'来源{i % 2}', 'raw_html': '<p>'}
+            for i in range(4)]
+    monkeypatch.setattr(MongoDBDataStream, 'mongodb_manager', SimpleNamespace(db={'c': FakeCollection(docs)}))
+    producer = ProjectedProducer('projection_topic', producer_config={'client_id': uuid.uuid4().hex},
+                                 key_strategy='hash:info_source')
+    try:
+        stream = MongoDBDataStream('c', batch_size=10, sort_key='_id', historical_cursor_position=None,
+                                   projection=producer.read_fields())
+        producer.send_batch(stream.get_all())
+        keys = [key for key, _, _ in producer.producer.records]
+    finally:
+        producer.flush_and_close()
+    assert keys == [hashlib.md5(doc['info_source'].encode('utf-8')).hexdigest().encode() for doc in docs]
+
+
+def test_custom_key_strategy_without_fields_reads_whole_document():
+    producer = ProjectedProducer('projection_topic', producer_config={'client_id': uuid.uuid4().hex})
+    try:
+        producer.key_strategy = lambda _, message: message.get('anything')
+        assert producer.read_fields() is None
+    finally:
+        producer.flush_and_close()
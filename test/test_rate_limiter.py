@@ -0,0 +1,95 @@
+import uuid
+
+import pytest
+
+from application.utils import rate_limiter
+from application.utils.rate_limiter import TokenBucket, TopicRateLimiter
+from test_batch_send import create_producer
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    假时钟：sleep() 直接推进 monotonic()，并记录每次休眠
+    """
+    class Clock:
+        now = 1000.0
+        sleeps = []
+
+        def monotonic(self):
+            return self.now
+
+        def sleep(self, seconds):
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+    fake = Clock()
+    fake.sleeps = []
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', fake.monotonic)
+    monkeypatch.setattr(rate_limiter.time, 'sleep', fake.sleep)
+    return fake
+
+
+def test_bucket_allows_burst_then_paces(clock):
+    bucket = TokenBucket(rate=10, burst=5)
+    assert [bucket.acquire() for _ in range(5)] == [0.0] * 5
+    # 透支 1 个令牌：按速率等待 0.1 秒
+    assert bucket.acquire() == pytest.approx(0.1)
+    assert bucket.acquire(2) == pytest.approx(0.2)
+    assert clock.sleeps == [pytest.approx(0.1), pytest.approx(0.2)]
+
+
+def test_bucket_refills_up_to_burst(clock):
+    bucket = TokenBucket(rate=10)
+    assert bucket.acquire(10) == 0.0
+    clock.now += 0.5
+    assert bucket.acquire(5) == 0.0
+    # 空闲再久也只积累 burst 个令牌
+    clock.now += 60
+    assert bucket.acquire(10) == 0.0
+    assert bucket.acquire(1) == pytest.approx(0.1)
+
+
+def test_bucket_long_run_rate(clock):
+    bucket = TokenBucket(rate=100, burst=10)
+    started = clock.now
+    for _ in range(1010):
+        bucket.acquire()
+    # 除去初始突发，1000 条恰好用 10 秒
+    assert clock.now - started == pytest.approx(10.0)
+
+
+def test_bucket_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_topic_limiter_waits_for_both_buckets(clock):
+    limiter = TopicRateLimiter(messages_per_sec=100, bytes_per_sec=1000, burst_seconds=0.1)
+    assert limiter.acquire(10, 100) == 0.0
+    # 条数桶与字节桶都已透支：先等条数桶 0.01 秒，期间字节桶也在补充，总等待取决于更慢的字节桶
+    assert limiter.acquire(1, 100) == pytest.approx(0.1)
+    assert clock.sleeps == [pytest.approx(0.01), pytest.approx(0.09)]
+    # 条数不限时只看字节
+    limiter = TopicRateLimiter(bytes_per_sec=1000)
+    assert limiter.messages is None and limiter.acquire(1000, 0) == 0.0
+
+
+def test_for_topic_shares_limiter_per_topic():
+    topic = f'limited_{uuid.uuid4().hex}'
+    limiter = TopicRateLimiter.for_topic(topic, {'messages_per_sec': 10})
+    assert TopicRateLimiter.for_topic(topic, {'messages_per_sec': 10}) is limiter
+    assert TopicRateLimiter.for_topic(f'other_{uuid.uuid4().hex}', {'messages_per_sec': 10}) is not limiter
+    assert TopicRateLimiter.for_topic(topic, None) is None
+    assert TopicRateLimiter.for_topic(topic, {'messages_per_sec': 0, 'bytes_per_sec': None}) is None
+
+
+def test_send_batch_reports_throttled_time_separately(clock):
+    producer = create_producer(topic=f'limited_{uuid.uuid4().hex}',
+                               rate_limit={'messages_per_sec': 10, 'burst_seconds': 0.5})
+    try:
+        producer.send_batch([{'n': i} for i in range(8)])
+    finally:
+        producer.flush_and_close()
+    # 突发 5 条，之后每条等待 0.1 秒
+    assert producer.stats.summary()['throttled_seconds'] == pytest.approx(0.3)
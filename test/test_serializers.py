@@ -0,0 +1,129 @@
+import datetime
+import json
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from application.models.kafka_models.information_data_structure import InformationDataStructure
+from application.producers.information_mongo_to_kafka_producer import InformationtoKafkaProducer
+from application.producers.binary_codec import decode_message
+from application.producers.schema_registry import FileSchemaRegistry
+from application.producers.serializers import get_serializer
+
+# build_payload / transform 只依赖 topic 与 data_type，无需真正连接 Kafka
+PRODUCER = SimpleNamespace(topic='temp4', data_type=InformationtoKafkaProducer.data_type)
+
+DOCS = [
+    {
+        '_id': ObjectId('66f1c2a0e4b0a1b2c3d4e5f6'),
+        'info_name': '国家自然科学基金委员会关于2024年项目申请的通告',
+        'create_time': datetime.datetime(2024, 9, 23, 10, 30, 0),
+        'info_date': '来源：2024-09-23 日期',
+        'info_source': '作者： 基金委',
+        'info_section': ['第一段\n含换行', '第二段\t"引号"\\反斜杠', {'img': 'a.png', 'w': 100}],
+        'info_author': '张三',
+        'description': 'emoji 🤣 与控制字符 \x01\x1f',
+        'column_info': ['通知公告', '医学科学部'],
+        'link_data': [{'name': '附件1.pdf', 'url': 'http://x/1.pdf', 'size': 1024, 'ok': True, 'extra': None}],
+        'page_url': 'https://www.nsfc.gov.cn/p/1',
+        'marc_code': 'zh',
+    },
+    {
+        # 可选字段缺失、None 与空值
+        '_id': ObjectId('66f1c2a0e4b0a1b2c3d4e5f7'),
+        'info_name': '',
+        'info_date': None,
+        'info_section': [],
+        'link_data': None,
+        'marc_code': None,
+    },
+    {
+        '_id': ObjectId('66f1c2a0e4b0a1b2c3d4e5f8'),
+        'info_name': 'English title',
+        'info_section': [1, 2.5, -3, [True, False, None]],
+        'info_author': None,
+        'column_info': [],
+        'page_url': '',
+    },
+]
+
+
+def _payloads():
+    return [
+        InformationtoKafkaProducer.build_payload(PRODUCER, InformationtoKafkaProducer.transform(PRODUCER, dict(doc)))
+        for doc in DOCS
+    ]
+
+
+@pytest.mark.parametrize('mode', ['validated', 'sampled', 'trusted'])
+def test_serializer_byte_parity(mode):
+    """
+    所有序列化模式的输出必须与原有 Pydantic 路径逐字节一致
+    """
+    serializer = get_serializer(mode, InformationDataStructure)
+    for payload in _payloads():
+        expected = InformationDataStructure(**payload).to_json()
+        assert serializer.serialize(payload) == expected
+
+
+def test_trusted_falls_back_to_validation():
+    """
+    trusted 模式遇到无法直接编码的类型时回退到完整校验路径
+    """
+    serializer = get_serializer('trusted', InformationDataStructure)
+    payload = _payloads()[0]
+    payload['link_data'] = [{'uploaded_at': datetime.datetime(2024, 1, 1)}]
+    assert serializer.serialize(payload) == InformationDataStructure(**payload).to_json()
+
+    del payload['uid']
+    with pytest.raises(ValueError):
+        serializer.serialize(payload)
+
+
+def test_sampled_validates_one_in_n():
+    serializer = get_serializer('sampled', InformationDataStructure, sample_rate=3)
+    payload = _payloads()[0]
+    invalid = dict(payload, name=None)
+    # 第 1 条走校验，应当报错；第 2、3 条走 trusted，不校验
+    with pytest.raises(ValueError):
+        serializer.serialize(invalid)
+    serializer.serialize(invalid)
+    serializer.serialize(invalid)
+    with pytest.raises(ValueError):
+        serializer.serialize(invalid)
+
+
+def test_trusted_serializer_is_picklable():
+    import pickle
+
+    serializer = pickle.loads(pickle.dumps(get_serializer('trusted', InformationDataStructure)))
+    payload = _payloads()[0]
+    assert serializer.serialize(payload) == InformationDataStructure(**payload).to_json()
+
+
+def test_avro_round_trip(tmp_path):
+    """
+    avro 模式：header 携带 schema id，解码结果与 JSON 消息内容一致
+    """
+    registry = FileSchemaRegistry(str(tmp_path))
+    serializer = get_serializer('avro', InformationDataStructure, registry=registry)
+    assert serializer.headers == [('schema_id', str(serializer.schema_id).encode())]
+    # 同一 schema 重复注册得到相同 id
+    assert FileSchemaRegistry(str(tmp_path)).register('x', serializer.schema) == serializer.schema_id
+
+    for payload in _payloads():
+        value = serializer.serialize(payload)
+        expected = json.loads(InformationDataStructure(**payload).to_json())
+        assert decode_message(value, serializer.headers, registry=registry) == expected
+        assert len(value) < len(InformationDataStructure(**payload).to_json())
+
+
+def test_tombstone_decodes_to_none(tmp_path):
+    """
+    tombstone 的 value 为 None：无论是否带 schema_id header 都解码为 None
+    """
+    registry = FileSchemaRegistry(str(tmp_path))
+    serializer = get_serializer('avro', InformationDataStructure, registry=registry)
+    assert decode_message(None) is None
+    assert decode_message(None, serializer.headers, registry=registry) is None
@@ -0,0 +1,110 @@
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from application.cursor_model import file_cursor
+from application.cursor_model.cursor_log import CursorLogManager
+from application.producers.sharded_sync import ShardedSync, split_by_time, split_rate_limit, to_ranges
+
+
+class FakeCollection:
+    def __init__(self, ids):
+        self.ids = sorted(ids)
+
+    def find_one(self, query, projection, sort):
+        return {'_id': self.ids[0] if sort[0][1] == 1 else self.ids[-1]} if self.ids else None
+
+
+class FakeShardProducer:
+    """
+    工作进程中使用的生产者替身：分片 1 第一次运行时异常退出，用于验证单独重启
+    """
+    collection = 'fake_collection'
+
+    def __init__(self, topic, full_amount, shard, marker_dir):
+        self.index = shard['index']
+        self.marker = os.path.join(marker_dir, f'shard{self.index}')
+        self.stats = SimpleNamespace(counters=Counter())
+        self.mongodb_stream = SimpleNamespace(historical_cursor_position=None)
+
+    def sync(self, progress=None):
+        if self.index == 1 and not os.path.exists(self.marker):
+            open(self.marker, 'w').close()
+            os._exit(3)
+        position = f'{self.index:024x}'
+        self.stats.counters.update(messages=10, acked=10)
+        self.mongodb_stream.historical_cursor_position = position
+        progress({'messages': 10, 'acked': 10, 'position': position})
+
+    def flush_and_close(self):
+        pass
+
+
+def test_split_by_time_and_ranges():
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    collection = FakeCollection([ObjectId.from_datetime(start), ObjectId.from_datetime(start + timedelta(days=4))])
+    points = split_by_time(collection, 4)
+    assert [point.generation_time for point in points] == [start + timedelta(days=day) for day in (1, 2, 3)]
+
+    ranges = to_ranges(points)
+    assert ranges[0] == (None, points[0]) and ranges[-1] == (points[-1], None)
+    assert len(ranges) == 4
+
+
+def test_failed_shard_restarts_independently(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_cursor, 'CURSOR_FILE_PATH', str(tmp_path))
+    sharded = ShardedSync(FakeShardProducer, 'shard_topic', shards=3, report_seconds=0.5,
+                          producer_kwargs={'marker_dir': str(tmp_path)})
+    # 预先写入分片计划，避免访问 MongoDB
+    sharded.plan_path = str(tmp_path / 'shards.json')
+    bounds = [str(ObjectId.from_datetime(datetime(2024, 1, day, tzinfo=timezone.utc))) for day in (2, 3)]
+    with open(sharded.plan_path, 'w') as f:
+        json.dump({'split': 'time', 'ranges': [[None, bounds[0]], bounds, [bounds[1], None]]}, f)
+
+    summary = sharded.run()
+    assert summary['finished_shards'] == 3
+    assert summary['restarts'] == 1
+    assert summary['messages'] == 30
+    # 末分片游标写入主游标，供后续增量同步使用
+    main_cursor = CursorLogManager(collection='fake_collection', topic='shard_topic')
+    assert main_cursor.load() == f'{2:024x}'
+
+
+class RecordingContext:
+    """
+    multiprocessing 上下文替身：只记录传给工作进程的参数
+    """
+
+    def __init__(self):
+        self.kwargs = []
+
+    def Process(self, target, args, name):
+        self.kwargs.append(args[1])
+        return SimpleNamespace(start=lambda: None)
+
+
+def test_rate_limit_is_split_across_shards():
+    limits = {'messages_per_sec': 6000, 'bytes_per_sec': None, 'burst_seconds': 2.0}
+    assert split_rate_limit(limits, 3) == {'messages_per_sec': 2000, 'bytes_per_sec': None, 'burst_seconds': 2.0}
+    assert split_rate_limit(limits, 1) is limits and split_rate_limit(None, 3) is None
+
+    sharded = ShardedSync(FakeShardProducer, 'shard_topic', shards=4, producer_kwargs={'rate_limit': limits})
+    sharded.shard_rate_limit = split_rate_limit(limits, 4)
+    context = RecordingContext()
+    for attempt in (0, 1):
+        sharded._start(context, 0, attempt, (None, None), None)
+    assert [kwargs['rate_limit']['messages_per_sec'] for kwargs in context.kwargs] == [1500, 1500]
+    assert sharded.producer_kwargs['rate_limit'] is limits
+
+
+@pytest.mark.parametrize('sort_key', [('update_time', '_id'), 'update_time'])
+def test_only_id_sort_key_can_be_sharded(sort_key):
+    # 其他排序键下各分片游标互相交错，末分片游标不是全局最大位置
+    with pytest.raises(ValueError, match='_id'):
+        ShardedSync(FakeShardProducer, 'shard_topic', shards=2, producer_kwargs={'sort_key': sort_key})
+    assert ShardedSync(FakeShardProducer, 'shard_topic', shards=2, producer_kwargs={'sort_key': ('_id',)}).shards == 2
@@ -0,0 +1,209 @@
+import json
+import uuid
+from collections import namedtuple
+
+import pytest
+from kafka.errors import KafkaTimeoutError
+
+from application.cursor_model.ack_tracker import AckCursorTracker
+from application.producers.base_producer import BaseKafkaProducer
+from application.producers.spool import DeliveryFuture, DiskSpool
+
+RecordMetadata = namedtuple('RecordMetadata', 'topic partition offset')
+
+
+class StandInProducer:
+    """
+    本地 KafkaProducer 替身：fail_send 时 send() 直接抛出异常，fail_delivery 时投递结果为失败
+    """
+
+    def __init__(self, **config):
+        self.config = config
+        self.records = []
+        self.fail_send = False
+        self.fail_delivery = False
+
+    def send(self, topic, value=None, key=None, headers=None):
+        if self.fail_send:
+            raise KafkaTimeoutError('broker 不可达')
+        future = DeliveryFuture()
+        if self.fail_delivery:
+            future.failure(KafkaTimeoutError('投递超时'))
+        else:
+            self.records.append((key, value, headers))
+            future.success(RecordMetadata(topic, 0, len(self.records) - 1))
+        return future
+
+    def flush(self, timeout=None):
+        pass
+
+    def close(self, timeout=None):
+        pass
+
+    def metrics(self):
+        return {}
+
+
+class EchoProducer(BaseKafkaProducer):
+    producer_factory = StandInProducer
+
+    def transform(self, doc):
+        return doc
+
+    def value_serialize(self, message):
+        return json.dumps(message).encode('utf-8')
+
+
+class MemoryCursor:
+    def __init__(self):
+        self.saved = []
+
+    def save(self, cursor):
+        self.saved.append(cursor)
+
+
+@pytest.fixture
+def producer(tmp_path):
+    # 独立的 client_id 保证连接池为每个用例创建新的替身实例
+    instance = EchoProducer('spool_topic', producer_config={'client_id': uuid.uuid4().hex}, spool=True)
+    instance.spool = DiskSpool('spool_topic', root_path=str(tmp_path))
+    yield instance
+    instance.flush_and_close()
+
+
+def _sync_batch(producer, docs):
+    cursor = MemoryCursor()
+    tracker = AckCursorTracker(cursor, before_commit=producer.spool.sync)
+    result = producer.send_batch(docs)
+    tracker.track_batch([doc['id'] for doc in docs], result.futures)
+    tracker.checkpoint()
+    return cursor, tracker
+
+
+@pytest.mark.parametrize('failure', ['fail_send', 'fail_delivery'])
+def test_failed_messages_are_spooled_and_replayed_in_order(producer, failure):
+    docs = [{'id': i} for i in range(5)]
+    setattr(producer.producer, failure, True)
+
+    cursor, tracker = _sync_batch(producer, docs)
+    # 已落盘的消息视为已持久化，游标越过它们，且没有投递失败
+    assert cursor.saved == [4]
+    assert tracker.failed == 0
+    assert producer.stats.counters['spooled'] == 5
+    assert producer.producer.records == []
+
+    # broker 恢复后全速重放，顺序不变，落盘分段被清理
+    setattr(producer.producer, failure, False)
+    producer._spool_until = 0.0
+    assert producer.replay_spool() == 5
+    assert [json.loads(value)['id'] for _, value, _ in producer.producer.records] == [0, 1, 2, 3, 4]
+    assert not producer.spool.pending()
+
+
+def test_replay_keeps_spool_while_broker_is_down(producer):
+    producer.producer.fail_send = True
+    _sync_batch(producer, [{'id': 1}])
+    assert producer.replay_spool() == 0
+    assert producer.spool.pending()
+
+
+@pytest.mark.parametrize('failure', ['fail_send', 'fail_delivery'])
+def test_spool_is_drained_before_direct_sends_resume(producer, failure):
+    setattr(producer.producer, failure, True)
+    _sync_batch(producer, [{'id': i} for i in range(3)])
+
+    # 运行中 broker 恢复、熔断到期：先按顺序重放落盘的旧消息，再直接发送新消息
+    setattr(producer.producer, failure, False)
+    producer._spool_until = 0.0
+    cursor, tracker = _sync_batch(producer, [{'id': i} for i in range(3, 6)])
+
+    assert [json.loads(value)['id'] for _, value, _ in producer.producer.records] == [0, 1, 2, 3, 4, 5]
+    assert producer.stats.counters['replayed'] == 3
+    assert not producer.spool.pending()
+    assert cursor.saved == [5]
+
+
+def test_spool_keeps_order_while_replay_fails(producer):
+    producer.producer.fail_send = True
+    _sync_batch(producer, [{'id': 0}])
+    # 熔断到期但 broker 仍不可用：重放失败，新消息追加到落盘缓冲之后，并重新进入熔断
+    producer._spool_until = 0.0
+    _sync_batch(producer, [{'id': 1}])
+    assert producer.producer.records == []
+    assert producer.stats.counters['spooled'] == 2
+
+    producer.producer.fail_send = False
+    producer._spool_until = 0.0
+    _sync_batch(producer, [{'id': 2}])
+    assert [json.loads(value)['id'] for _, value, _ in producer.producer.records] == [0, 1, 2]
+
+
+def test_send_failure_opens_circuit(producer):
+    calls = []
+    original_send = producer.producer.send
+
+    def counting_send(*args, **kwargs):
+        calls.append(1)
+        return original_send(*args, **kwargs)
+
+    producer.producer.send = counting_send
+    producer.producer.fail_send = True
+    producer.send_batch([{'id': i} for i in range(10)])
+    # 第一次失败后 spool_retry_seconds 内不再尝试发送，避免每条消息都阻塞
+    assert len(calls) == 1
+
+
+class SharedProducer(StandInProducer):
+    """
+    被其他生产者共享的实例：flush 会等待别人的消息，重放时不应调用
+    """
+
+    def flush(self, timeout=None):
+        raise AssertionError('重放时 flush 了共享的生产者')
+
+
+def test_drain_waits_only_for_replayed_futures(tmp_path):
+    spool = DiskSpool('drain_topic', root_path=str(tmp_path))
+    for i in range(3):
+        spool.append(str(i).encode())
+    shared = SharedProducer()
+    assert spool.drain(shared, timeout=1) == 3
+    assert [value for _, value, _ in shared.records] == [b'0', b'1', b'2'] and not spool.pending()
+
+    # 投递失败：分段保留到下次重放
+    spool.append(b'3')
+    shared.fail_delivery = True
+    with pytest.raises(KafkaTimeoutError):
+        spool.drain(shared, timeout=1)
+    assert spool.pending()
+
+
+def test_torn_tail_record_is_ignored(tmp_path):
+    spool = DiskSpool('torn', root_path=str(tmp_path))
+    spool.append(b'first', key=b'k1', headers=[('schema_id', b'1')])
+    spool.append(b'second')
+    spool.close()
+    segment = spool.segments()[-1]
+    with open(segment, 'ab') as f:
+        f.write(b'\x00\x00\x00\x10partial')
+
+    assert list(spool.read_segment(segment)) == [
+        (b'k1', b'first', [('schema_id', b'1')]),
+        (None, b'second', None),
+    ]
+
+
+def test_without_spool_delivery_failure_stops_cursor(tmp_path):
+    instance = EchoProducer('no_spool_topic', producer_config={'client_id': uuid.uuid4().hex})
+    try:
+        instance.producer.fail_delivery = True
+        cursor = MemoryCursor()
+        tracker = AckCursorTracker(cursor)
+        result = instance.send_batch([{'id': 1}])
+        tracker.track_batch([1], result.futures)
+        tracker.checkpoint()
+        assert cursor.saved == []
+        with pytest.raises(KafkaTimeoutError):
+            tracker.raise_for_failures()
+    finally:
+        instance.flush_and_close()
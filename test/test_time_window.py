@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from bson import ObjectId
+
+from application.cursor_model.backends import window_cursor_name
+from application.db.mongo_db.mongo_db_manager import MongoDBDataStream, object_id_at
+from test_watermark import FakeCollection
+
+START = datetime(2024, 9, 23, 12, tzinfo=timezone.utc)
+
+
+def _docs(hours):
+    return [{'_id': ObjectId.from_datetime(START + timedelta(hours=hour, minutes=30)), 'hour': hour}
+            for hour in range(hours)]
+
+
+def _stream(docs, monkeypatch, position=None, **kwargs):
+    monkeypatch.setattr(MongoDBDataStream, 'mongodb_manager', SimpleNamespace(db={'c': FakeCollection(docs)}))
+    return MongoDBDataStream('c', batch_size=2, sort_key='_id', historical_cursor_position=position, **kwargs)
+
+
+def test_object_id_at():
+    assert object_id_at(START).generation_time == START
+    # naive 时间按本地时间换算
+    assert object_id_at(START.astimezone().replace(tzinfo=None)) == object_id_at(START)
+    assert object_id_at(START + timedelta(microseconds=1)) == object_id_at(START)
+    assert object_id_at(START + timedelta(microseconds=1), round_up=True) == object_id_at(START + timedelta(seconds=1))
+
+
+def test_since_and_until_bound_the_id_range(monkeypatch):
+    docs = _docs(6)
+    stream = _stream(docs, monkeypatch, since=START + timedelta(hours=2), until=START + timedelta(hours=4))
+    assert stream.cursor_query == {'_id': {'$gte': object_id_at(START + timedelta(hours=2)),
+                                           '$lt': object_id_at(START + timedelta(hours=4))}}
+    assert [doc['hour'] for doc in stream.get_all()] == [2, 3]
+
+    # 只指定 since 时读到集合末尾
+    assert [doc['hour'] for doc in _stream(docs, monkeypatch, since=START + timedelta(hours=4)).get_all()] == [4, 5]
+
+
+def test_window_is_intersected_with_shard_range_and_cursor(monkeypatch):
+    docs = _docs(6)
+    lower, upper = docs[1]['_id'], docs[5]['_id']
+    stream = _stream(docs, monkeypatch, lower_bound=lower, upper_bound=upper,
+                     since=START, until=START + timedelta(hours=3))
+    assert (stream.lower_bound, stream.upper_bound) == (lower, object_id_at(START + timedelta(hours=3)))
+    assert [doc['hour'] for doc in stream.get_all()] == [1, 2]
+
+    # 窗口游标续传：从游标之后读到窗口终点
+    stream = _stream(docs, monkeypatch, position=docs[2]['_id'], since=START, until=START + timedelta(hours=5))
+    assert [doc['hour'] for doc in stream.get_all()] == [3, 4]
+
+
+def test_window_cursor_name():
+    assert window_cursor_name(datetime(2024, 9, 23, 14), None) == 'window.20240923T140000-end'
+    assert window_cursor_name(None, datetime(2024, 9, 8)) == 'window.start-20240908T000000'
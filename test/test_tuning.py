@@ -0,0 +1,148 @@
+import json
+import uuid
+
+import pytest
+from kafka.errors import NoBrokersAvailable
+
+from application.producers.tuning import AdaptiveTuner
+from test_spool import EchoProducer, StandInProducer
+
+
+def _metrics(byte_rate, batch_size_avg=0.0, request_latency_avg=0.0):
+    return {'producer-metrics': {'record-send-rate': byte_rate / 100, 'byte-rate': byte_rate,
+                                 'batch-size-avg': batch_size_avg, 'request-latency-avg': request_latency_avg}}
+
+
+def _tuner(tmp_path, **kwargs):
+    return AdaptiveTuner('tuning_topic', log_path=str(tmp_path), **kwargs)
+
+
+def _decisions(tmp_path):
+    with open(tmp_path / 'tuning_topic.jsonl', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_no_traffic_no_decision(tmp_path):
+    tuner = _tuner(tmp_path)
+    assert tuner.observe(None, {'batch_size': 16384, 'linger_ms': 5}) is None
+    assert tuner.observe(_metrics(0), {'batch_size': 16384, 'linger_ms': 5}) is None
+    assert not (tmp_path / 'tuning_topic.jsonl').exists()
+
+
+def test_throughput_lingers_for_fill_time_and_grows_full_batches(tmp_path):
+    tuner = _tuner(tmp_path)
+    # 每秒 10 个批次的数据量：填满一个批次需要 100ms
+    config = {'batch_size': 16384, 'linger_ms': 5}
+    assert tuner.observe(_metrics(163840, batch_size_avg=16000), config) == {'linger_ms': 100, 'batch_size': 32768}
+
+    # 批次未填满时只调整 linger_ms
+    assert tuner.observe(_metrics(163840, batch_size_avg=8000), config) == {'linger_ms': 100}
+
+    decision = _decisions(tmp_path)[0]
+    assert decision['fill_time_ms'] == 100.0 and decision['fill_ratio'] == round(16000 / 16384, 4)
+    assert decision['current'] == config and decision['changes'] == {'linger_ms': 100, 'batch_size': 32768}
+
+
+def test_hysteresis_suppresses_small_changes(tmp_path):
+    tuner = _tuner(tmp_path, hysteresis=0.25)
+    assert tuner.observe(_metrics(163840, batch_size_avg=8000), {'batch_size': 16384, 'linger_ms': 90}) is None
+    assert tuner.observe(_metrics(163840, batch_size_avg=8000), {'batch_size': 16384, 'linger_ms': 70}) == \
+        {'linger_ms': 100}
+    # 不调整的决策同样写入日志
+    assert [decision['changes'] for decision in _decisions(tmp_path)] == [{}, {'linger_ms': 100}]
+
+
+def test_latency_objective_caps_linger_by_budget(tmp_path):
+    tuner = _tuner(tmp_path, objective='latency', target_latency_ms=200)
+    config = {'batch_size': 65536, 'linger_ms': 500}
+    # 填满需要 1000ms，但延迟预算只剩 200 - 50 = 150ms
+    assert tuner.observe(_metrics(65536, request_latency_avg=50), config) == {'linger_ms': 150}
+
+    # 请求延迟本身超标：减半 batch_size，linger_ms 取下限
+    assert tuner.observe(_metrics(65536, request_latency_avg=250), config) == {'linger_ms': 5, 'batch_size': 32768}
+
+
+def test_limits_are_clamped(tmp_path):
+    tuner = _tuner(tmp_path, max_batch_size=1024 * 1024, max_linger_ms=1000)
+    config = {'batch_size': 1024 * 1024, 'linger_ms': 1000}
+    # 已达上限：batch_size 不再加倍，linger_ms 不超过 max_linger_ms
+    assert tuner.observe(_metrics(1024, batch_size_avg=1024 * 1024), config) is None
+
+    tuner = _tuner(tmp_path, objective='latency', min_batch_size=16384)
+    assert tuner.observe(_metrics(16384 * 100, request_latency_avg=500), {'batch_size': 16384, 'linger_ms': 5}) is None
+
+
+def test_due_and_objective_validation(tmp_path, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('application.producers.tuning.time.monotonic', lambda: now[0])
+    tuner = _tuner(tmp_path, interval_seconds=30)
+    assert not tuner.due()
+    now[0] += 30
+    assert tuner.due()
+    tuner.observe(None, {'batch_size': 16384, 'linger_ms': 5})
+    assert not tuner.due()
+
+    with pytest.raises(ValueError):
+        _tuner(tmp_path, objective='cost')
+
+
+class RotatingProducer(StandInProducer):
+    """
+    记录 flush / close 的替身；slow_close 时模拟关闭超时
+    """
+
+    def __init__(self, **config):
+        if config.get('linger_ms') == -1:
+            raise NoBrokersAvailable()
+        super().__init__(**config)
+        self.flushes = 0
+        self.closed = []
+        self.slow_close = False
+
+    def flush(self, timeout=None):
+        self.flushes += 1
+
+    def close(self, timeout=None):
+        self.closed.append(timeout)
+        if self.slow_close:
+            raise TimeoutError('关闭超时')
+
+
+class RotatingEchoProducer(EchoProducer):
+    producer_factory = RotatingProducer
+    rotate_timeout = 2.5
+
+
+def test_rotation_releases_shared_producer_without_flushing_it():
+    config = {'client_id': uuid.uuid4().hex, 'batch_size': 16384, 'linger_ms': 5}
+    rotating = RotatingEchoProducer('rotate_topic', producer_config=config)
+    other = RotatingEchoProducer('rotate_topic', producer_config=config)
+    shared = rotating.producer
+    assert other.producer is shared
+    try:
+        rotating._rotate_producer({'linger_ms': 100})
+        # 共享实例仍被 other 使用：既不 flush 也不关闭
+        assert shared.flushes == 0 and shared.closed == []
+        assert rotating.producer is not shared and rotating.producer.config['linger_ms'] == 100
+        assert other.producer_config['linger_ms'] == 5 and rotating.stats.counters['producer_rotations'] == 1
+
+        # 最后一个引用释放时按 rotate_timeout 关闭，关闭失败只记录日志
+        shared.slow_close = True
+        other._rotate_producer({'linger_ms': 100})
+        assert shared.closed == [2.5] and other.producer is rotating.producer
+    finally:
+        rotating.flush_and_close()
+        other.flush_and_close()
+
+
+def test_rotation_keeps_current_producer_when_acquire_fails():
+    producer = RotatingEchoProducer('rotate_topic', producer_config={'client_id': uuid.uuid4().hex, 'linger_ms': 5})
+    current = producer.producer
+    try:
+        producer._rotate_producer({'linger_ms': -1})
+        assert producer.producer is current and producer.producer_config['linger_ms'] == 5
+        assert 'producer_rotations' not in producer.stats.counters
+    finally:
+        producer.flush_and_close()
+    # 引用计数未被轮换改动：关闭时正常释放
+    assert current.closed == [30.0]
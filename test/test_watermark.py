@@ -0,0 +1,144 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from application.cursor_model.file_cursor import FileCursorManager
+from application.cursor_model.positions import decode_position, encode_position
+from application.db.mongo_db.mongo_db_manager import MongoDBDataStream, document_position, seek_query
+
+OPERATORS = {'$gt': lambda a, b: a > b, '$gte': lambda a, b: a >= b, '$lt': lambda a, b: a < b}
+
+
+def _compare(op, a, b):
+    """
+    与 MongoDB 一致：$ne 按值比较；比较运算只在同类型间进行，null（含字段缺失）只满足 {'$gte': None}
+    """
+    if op == '$ne':
+        return a != b
+    if a is None or b is None:
+        return op == '$gte' and a is None and b is None
+    return OPERATORS[op](a, b)
+
+
+def _matches(doc, query):
+    """
+    测试用的查询条件求值（只支持游标条件用到的 $gt / $gte / $lt / $ne / $or / $and / 等值）
+    """
+    for key, condition in query.items():
+        if key == '$or':
+            if not any(_matches(doc, branch) for branch in condition):
+                return False
+        elif key == '$and':
+            if not all(_matches(doc, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict):
+            if not all(_compare(op, doc.get(key), value) for op, value in condition.items()):
+                return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        # null 排在所有值之前
+        self.docs = sorted(self.docs, key=lambda doc: tuple((doc.get(key) is not None, doc.get(key)) for key, _ in keys))
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, filter, projection=None):
+        docs = [doc for doc in self.docs if _matches(doc, filter)]
+        if projection:
+            docs = [{key: value for key, value in doc.items() if key in projection or key == '_id'} for doc in docs]
+        return FakeCursor(docs)
+
+
+def _stream(docs, position, monkeypatch, **kwargs):
+    monkeypatch.setattr(MongoDBDataStream, 'mongodb_manager', SimpleNamespace(db={'c': FakeCollection(docs)}))
+    return MongoDBDataStream('c', batch_size=2, sort_key=('update_time', '_id'),
+                             historical_cursor_position=position, **kwargs)
+
+
+def test_seek_query_is_lexicographic():
+    assert seek_query(('a', 'b'), (1, 2)) == {'a': {'$gte': 1}, '$or': [{'a': {'$gt': 1}}, {'a': 1, 'b': {'$gt': 2}}]}
+    assert seek_query(('_id',), (5,)) == {'_id': {'$gt': 5}}
+
+
+def test_null_sort_key_does_not_stall(monkeypatch):
+    assert seek_query(('a', 'b'), (None, 2)) == {'$or': [{'a': {'$ne': None}}, {'a': None, 'b': {'$gt': 2}}]}
+    assert seek_query(('a',), (None,)) == {'a': {'$ne': None}}
+
+    t0 = datetime.datetime(2024, 9, 1)
+    docs = [{'_id': 0, 'update_time': None}, {'_id': 1}, {'_id': 2, 'update_time': t0},
+            {'_id': 3, 'update_time': None}, {'_id': 4, 'update_time': t0 + datetime.timedelta(days=1)}]
+    first_run = [doc['_id'] for doc in _stream(docs, None, monkeypatch).get_all()]
+    assert first_run == [0, 1, 3, 2, 4]
+
+    # 停在 update_time 为 null（或缺失）的文档上：继续读取其后的 null 文档，再读取有值的文档
+    assert [doc['_id'] for doc in _stream(docs, (None, 1), monkeypatch).get_all()] == [3, 2, 4]
+    assert [doc['_id'] for doc in _stream(docs, (None, 3), monkeypatch).get_all()] == [2, 4]
+
+
+def test_compound_watermark_picks_up_modified_documents(monkeypatch):
+    t0 = datetime.datetime(2024, 9, 1)
+    docs = [{'_id': i, 'update_time': t0 + datetime.timedelta(days=i % 3)} for i in range(6)]
+    first_run = [doc for batch in _stream(docs, None, monkeypatch).get_batches() for doc in batch]
+    assert [doc['_id'] for doc in first_run] == [0, 3, 1, 4, 2, 5]
+
+    # 同一 update_time 内中断：从 (t0+1天, 1) 继续，只读取之后的文档
+    position = document_position(first_run[2], ('update_time', '_id'))
+    assert [doc['_id'] for doc in _stream(docs, position, monkeypatch).get_all()] == [4, 2, 5]
+
+    # 修改文档 0 后增量同步只读取它
+    docs[0]['update_time'] = t0 + datetime.timedelta(days=7)
+    last = document_position(first_run[-1], ('update_time', '_id'))
+    assert [doc['_id'] for doc in _stream(docs, last, monkeypatch).get_all()] == [0]
+
+
+def test_shard_bounds_and_query_are_combined(monkeypatch):
+    stream = _stream([], (datetime.datetime(2024, 9, 1), 3), monkeypatch, lower_bound=1, upper_bound=9)
+    assert stream.cursor_query['_id'] == {'$gte': 1, '$lt': 9}
+    assert '$or' in stream.cursor_query
+
+    with pytest.raises(ValueError):
+        _stream([], ObjectId(), monkeypatch)
+
+
+def test_legacy_object_id_cursor_is_still_supported(tmp_path):
+    oid = ObjectId('66f1c2a0e4b0a1b2c3d4e5f6')
+    cursor = FileCursorManager('c', 't', root_file_path=str(tmp_path))
+    cursor.save(oid)
+    with open(cursor.file_path, 'w') as f:
+        f.write(str(oid))  # 旧版游标文件
+    assert cursor.load() == oid
+
+    stream = MongoDBDataStream('c', batch_size=10, sort_key='_id', historical_cursor_position=str(oid))
+    assert stream.cursor_query == {'_id': {'$gt': oid}}
+
+
+@pytest.mark.parametrize('position', [
+    ObjectId('66f1c2a0e4b0a1b2c3d4e5f6'),
+    (datetime.datetime(2024, 9, 23, 10, 30), ObjectId('66f1c2a0e4b0a1b2c3d4e5f6')),
+    (12345, 'custom-key'),
+    'plain-string-key',
+])
+def test_positions_round_trip(tmp_path, position):
+    assert decode_position(encode_position(position)) == position
+    cursor = FileCursorManager('c', 't', root_file_path=str(tmp_path))
+    cursor.save(position)
+    assert cursor.load() == position